@@ -9,7 +9,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
-from .models import Clientes, Productos, Ventas, VentaItem
+from .models import Clientes, HuellaConsulta, PlanConsulta, Productos, Ventas, VentaItem, Store
 
 # Personalizaciones del Admin
 # Cambiar el texto mostrado en el admin y la URL del enlace "Ver sitio"
@@ -25,6 +25,58 @@ admin.site.register(Ventas)
 admin.site.register(VentaItem)
 
 
+@admin.register(Store)
+class StoreAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'api_url', 'owner', 'creado_en')
+    search_fields = ('name', 'slug')
+
+
+class PlanConsultaInline(admin.StackedInline):
+    model = PlanConsulta
+    extra = 0
+    can_delete = False
+    fields = ('capturado_en', 'vista', 'alias', 'alias_explain', 'duracion_ms', 'params', 'plan', 'error')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(HuellaConsulta)
+class HuellaConsultaAdmin(admin.ModelAdmin):
+    """Consultas lentas por tiempo total: las primeras son las que piden índice."""
+    list_display = ('huella', 'sql_corto', 'vista_principal', 'llamadas', 'total_ms', 'medio_ms',
+                    'max_ms', 'ultima_vez')
+    ordering = ('-tiempo_total_ms',)
+    search_fields = ('huella', 'sql_normalizado')
+    readonly_fields = ('huella', 'sql_normalizado', 'llamadas', 'tiempo_total_ms', 'tiempo_max_ms',
+                       'vistas', 'alias', 'primera_vez', 'ultima_vez')
+    inlines = [PlanConsultaInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='SQL')
+    def sql_corto(self, obj):
+        return obj.sql_normalizado[:120]
+
+    @admin.display(description='Vista')
+    def vista_principal(self, obj):
+        return max(obj.vistas, key=obj.vistas.get) if obj.vistas else ''
+
+    @admin.display(description='Total (ms)', ordering='tiempo_total_ms')
+    def total_ms(self, obj):
+        return round(obj.tiempo_total_ms)
+
+    @admin.display(description='Medio (ms)')
+    def medio_ms(self, obj):
+        return round(obj.tiempo_medio_ms, 1)
+
+    @admin.display(description='Máx. (ms)', ordering='tiempo_max_ms')
+    def max_ms(self, obj):
+        return round(obj.tiempo_max_ms)
+
+
 # Desregistrar User para reemplazarlo
 try:
     admin.site.unregister(User)
@@ -4,3 +4,24 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Dashboard'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from . import instrumentation, invalidation, slow_queries
+        from .models import Clientes, Productos, Store, Tasa, Ventas, VentaItem
+        from .stores import store_changed, store_invalidated
+        from .sync import record_deletion
+        post_save.connect(store_changed, sender=Store)
+        post_delete.connect(store_changed, sender=Store)
+        for model in (Clientes, Productos, Ventas, VentaItem):
+            post_delete.connect(record_deletion, sender=model)
+        # Bus de invalidación entre workers (ver invalidation.py)
+        for model in (Ventas, VentaItem, Productos, Clientes, Tasa, Store):
+            post_save.connect(invalidation.model_changed, sender=model)
+            post_delete.connect(invalidation.model_changed, sender=model)
+        invalidation.subscribe(store_invalidated)
+        # Conteo de consultas por petición (ver instrumentation.py)
+        connection_created.connect(instrumentation.install)
+        # Log de consultas lentas con EXPLAIN (ver slow_queries.py)
+        connection_created.connect(slow_queries.install)
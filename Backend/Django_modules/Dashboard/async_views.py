@@ -0,0 +1,243 @@
+"""Vistas async (ASGI) de los endpoints limitados por E/S.
+
+Bajo uvicorn/daphne estas vistas no retienen un hilo mientras esperan a
+Postgres o a Gemini: el worker sigue atendiendo a otros usuarios. El alias de
+la tienda viaja en el ContextVar de `db_router`, que sigue a la corrutina y a
+las llamadas sync_to_async / del pool de hilos.
+
+- AsyncAIRecommendationsView: cliente async de Gemini.
+- AsyncTopProductsView, AsyncRevenueByCategoryView: ORM async (mismas
+  consultas que las vistas síncronas).
+- AsyncMetricsBundleView: varias métricas del dashboard en una petición,
+  ejecutadas en paralelo con una conexión por métrica.
+- LiveEventsView: stream SSE de cambios y métricas del día (ver live.py).
+
+Bajo WSGI también funcionan (Django las ejecuta en un event loop propio),
+pero sin la ventaja de concurrencia. LiveEventsView es solo ASGI: bajo WSGI
+cada stream abierto retendría un hilo del worker, así que responde 501.
+"""
+
+import asyncio
+import copy
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import live, stores, views
+from .services import cross_store
+from .services.gemini_client import GeminiError, agenerate_ai_recommendation
+
+_jwt = JWTAuthentication()
+
+
+async def _authenticate(request):
+    """Usuario del JWT (como REST_FRAMEWORK) o AnonymousUser; None si el token es inválido."""
+    try:
+        result = await sync_to_async(_jwt.authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result is not None else AnonymousUser()
+
+
+class AsyncAPIView(View):
+    """Base de las vistas async: autenticación JWT y respuestas JSON."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Igual que APIView: la autenticación es por token, no por cookie
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await _authenticate(request)
+        if user is None:
+            return JsonResponse({'detail': 'Token inválido o expirado.'}, status=401)
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncAIRecommendationsView(AsyncAPIView):
+    """Versión async de AIRecommendationsView (mismo body y respuestas)."""
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'detail': 'JSON inválido.'}, status=400)
+        product_ids, category, limit = views._ai_recommendation_params(
+            data if isinstance(data, dict) else {})
+
+        # Permisos: solo superuser y Gerente pueden generar recomendaciones
+        user = request.user
+        if not (getattr(user, 'is_superuser', False)
+                or await sync_to_async(views._user_in_group)(user, 'Gerente')):
+            return JsonResponse({'detail': 'No tiene permiso para generar recomendaciones IA.'}, status=403)
+
+        try:
+            result = await agenerate_ai_recommendation(
+                product_ids=product_ids, category=category, limit=limit)
+            return JsonResponse(result)
+        except GeminiError as ge:
+            return JsonResponse({'error': str(ge)}, status=400)
+        except Exception as exc:
+            return JsonResponse({'error': f'Error al generar recomendación: {exc}'}, status=500)
+
+
+class AsyncTopProductsView(AsyncAPIView):
+    """Versión async de TopProductsView (?limit=5&sort=units&year=2024)."""
+
+    async def get(self, request):
+        qs = views._top_products_query(request.GET)
+        if isinstance(qs, list):
+            return JsonResponse(qs, safe=False)
+        rows = [row async for row in qs]
+        names = {pid: nombre async for pid, nombre in views._top_products_names(rows)}
+        return JsonResponse(views._top_products_rows(rows, names), safe=False)
+
+
+class AsyncRevenueByCategoryView(AsyncAPIView):
+    """Versión async de RevenueByCategoryView (?days=30 o ?year=2024).
+
+    A diferencia de la síncrona, un days/year inválido es un 400 y un error de
+    la BD o del código llega como 500: no se confunde con "sin ingresos".
+    """
+
+    # Rangos aceptados: timedelta y datetime no desbordan
+    PARAM_RANGES = {'days': (1, 36500), 'year': (1, 9998)}
+
+    async def get(self, request):
+        for name, (low, high) in self.PARAM_RANGES.items():
+            raw = request.GET.get(name)
+            if raw is None:
+                continue
+            try:
+                value = int(raw)
+            except ValueError:
+                value = None
+            if value is None or not low <= value <= high:
+                return JsonResponse({'detail': f'{name} debe ser un entero entre {low} y {high}.'},
+                                    status=400)
+        agg = views._revenue_by_category_query(request.GET)
+        if not isinstance(agg, list):
+            agg = [row async for row in agg]
+        return JsonResponse(views._revenue_by_category_rows(agg), safe=False)
+
+
+class AsyncMetricsBundleView(AsyncAPIView):
+    """Varias métricas del dashboard en una sola petición, en paralelo.
+
+    Cada métrica corre en un hilo del pool de cross_store con su propia
+    conexión y `statement_timeout`; la respuesta tarda lo que la más lenta.
+
+    Query params:
+        - metrics: nombres separados por comas (default: DEFAULT_METRICS)
+        - timeout: segundos máximos por métrica (default CROSS_STORE_TIMEOUT)
+        - el resto se pasa tal cual a cada métrica (year, days, limit...)
+    Respuesta: {metrics: {nombre: {status: ok|timeout|error, data?, elapsed_ms?, detail?}}, partial}
+    """
+    METRICS = {
+        'sales-monthly': views.SalesMonthlyView,
+        'sales-yearly': views.SalesYearlyView,
+        'revenue-by-category': views.RevenueByCategoryView,
+        'top-products': views.TopProductsView,
+        'customers-monthly': views.CustomersMonthlyView,
+        'top-customers-monthly': views.TopCustomersMonthlyView,
+        'top-categories-monthly': views.TopCategoriesMonthlyView,
+        'sales-heatmap': views.SalesHeatmapView,
+        'returning-customers-rate': views.ReturningCustomersRateView,
+        'products-growth': views.ProductsGrowthView,
+    }
+    # Lo que pinta la primera pantalla del dashboard
+    DEFAULT_METRICS = ('sales-monthly', 'revenue-by-category', 'top-products',
+                       'customers-monthly', 'returning-customers-rate')
+
+    async def get(self, request):
+        names = request.GET.get('metrics')
+        names = ([n.strip() for n in names.split(',') if n.strip()]
+                 if names else list(self.DEFAULT_METRICS))
+        unknown = [n for n in names if n not in self.METRICS]
+        if unknown:
+            return JsonResponse({'detail': f"Métricas desconocidas: {', '.join(unknown)}. "
+                                           f"Opciones: {', '.join(self.METRICS)}"}, status=400)
+        try:
+            timeout = float(request.GET.get(
+                'timeout', getattr(settings, 'CROSS_STORE_TIMEOUT', 5)))
+        except ValueError:
+            timeout = getattr(settings, 'CROSS_STORE_TIMEOUT', 5)
+        timeout = min(max(timeout, 0.1), 60)
+
+        store = getattr(request, 'store', None)
+        alias = store.alias if store is not None else DEFAULT_DB_ALIAS
+        tasks = {name: (alias, self._runner(request, self.METRICS[name]))
+                 for name in dict.fromkeys(names)}
+        results = await cross_store.afan_out(tasks, timeout)
+        return JsonResponse({
+            'metrics': results,
+            'partial': any(r['status'] != 'ok' for r in results.values()),
+        })
+
+    @staticmethod
+    def _runner(request, view_class):
+        view = view_class.as_view()
+        user = request.user
+
+        def run():
+            # Copia de la petición por métrica: la vista DRF la envuelve de nuevo
+            sub = copy.copy(request)
+            sub._force_auth_user = user
+            response = view(sub)
+            if response.status_code >= 400:
+                raise RuntimeError(f'HTTP {response.status_code}')
+            return response.data
+        return run
+
+
+class LiveEventsView(AsyncAPIView):
+    """Stream SSE (text/event-stream) de la tienda de la URL.
+
+    Eventos: `change` (venta nueva, cambio de estado, item, stock), `metrics`
+    (métricas del día con su delta) y `resync` (el cliente se atrasó: recargar).
+    Un comentario cada LIVE_HEARTBEAT segundos mantiene viva la conexión.
+    Requiere usuario autenticado (JWT) y servir el proyecto con asgi.py.
+    """
+
+    async def get(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'No se proporcionaron credenciales de autenticación.'},
+                                status=401)
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'detail': 'Eventos en vivo solo disponibles bajo ASGI.'}, status=501)
+        entry = getattr(request, 'store', None) or stores.store_for_alias(DEFAULT_DB_ALIAS)
+        if (not getattr(settings, 'LIVE_EVENTS', True)
+                or connections[entry.alias].vendor != 'postgresql'):
+            return JsonResponse({'detail': 'Eventos en vivo no disponibles.'}, status=503)
+        heartbeat = getattr(settings, 'LIVE_HEARTBEAT', 15)
+
+        async def stream():
+            hub = live.hub()
+            queue = hub.subscribe(entry)
+            try:
+                yield 'retry: 3000\n\n'
+                while True:
+                    try:
+                        message = await asyncio.wait_for(queue.get(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield ': ping\n\n'
+                        continue
+                    yield live.sse_message(message)
+            finally:
+                hub.unsubscribe(entry, queue)
+
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx: no acumular el stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,343 @@
+"""Benchmark de endpoints sobre datos sintéticos deterministas (`manage.py bench`).
+
+- seed(): puebla una BD con N ventas generadas con random.Random(seed). Con la
+  misma semilla y la misma fecha ancla salen las mismas filas (y, tras
+  TRUNCATE ... RESTART IDENTITY, los mismos ids). Las fechas se cuentan hacia
+  atrás desde el ancla para que las ventanas de las métricas ("últimos 30
+  días", "últimos 6 meses") tengan datos.
+- ENDPOINTS: métricas (sync y async), structured-*, listados y exportaciones.
+- run_endpoint(): p50/p95 de la latencia, consultas, tiempo SQL, pico de
+  memoria Python de una petición (tracemalloc, en una pasada aparte para no
+  inflar los tiempos) y el pico de RSS del proceso tras el endpoint.
+- compare(): diferencias contra un reporte base.
+
+Las peticiones pasan por toda la cadena de middlewares contra la tienda
+`bench` (/api/s/bench/...), una BD aparte (settings.BENCH_DATABASE) que el
+comando crea y migra: nunca se siembran las BDs de las tiendas reales.
+"""
+
+import logging
+import math
+import random
+import re
+import resource
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import display_ids, invalidation, stores
+from .models import Clientes, Productos, RegistroEliminado, VentaItem, Ventas
+
+SLUG = 'bench'
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+BATCH = 5_000
+REPORT_VERSION = 1
+
+CATEGORIES = ('alimentos', 'belleza', 'hogar', 'electronica', 'deporte', 'moda')
+CITIES = ('Caracas', 'Maracaibo', 'Valencia', 'Barquisimeto', 'Maracay', 'Mérida')
+STATES = ((Ventas.ESTADO_COMPLETADA, 85), (Ventas.ESTADO_PENDIENTE, 7),
+          (Ventas.ESTADO_CANCELADA, 5), (Ventas.ESTADO_REEMBOLSADA, 3))
+METHODS = [m for m, _label in Ventas.METODO_CHOICES]
+DAYS_BACK = 730
+SQL_TIMING_RE = re.compile(r'(?:^|,\s*)sql;dur=([\d.]+)')
+
+
+def _month(anchor):
+    return {'month': anchor.strftime('%Y-%m')}
+
+
+def _last_30_days(anchor):
+    return {'tipo': 'ventas', 'date_from': (anchor - timedelta(days=30)).date().isoformat(),
+            'date_to': anchor.date().isoformat()}
+
+
+# (nombre, url name, query params o función(ancla) -> params, tipo)
+ENDPOINTS = [
+    ('sales-monthly', 'sales-monthly', {'months': '6'}, 'metrics'),
+    ('sales-yearly', 'sales-yearly', {'years': '5'}, 'metrics'),
+    ('revenue-by-category', 'revenue-by-category', {'days': '30'}, 'metrics'),
+    ('top-products', 'top-products', {'limit': '5'}, 'metrics'),
+    ('customers-monthly', 'customers-monthly', {'months': '7'}, 'metrics'),
+    ('top-customers-monthly', 'top-customers-monthly', {'months': '12'}, 'metrics'),
+    ('top-categories-monthly', 'top-categories-monthly', {'months': '12'}, 'metrics'),
+    ('sales-heatmap', 'sales-heatmap', _month, 'metrics'),
+    ('returning-customers-rate', 'returning-customers-rate', {}, 'metrics'),
+    ('products-growth', 'products-growth', {'days': '30'}, 'metrics'),
+    ('async-top-products', 'async-top-products', {'limit': '5'}, 'metrics'),
+    ('async-revenue-by-category', 'async-revenue-by-category', {'days': '30'}, 'metrics'),
+    ('async-metrics-bundle', 'async-metrics-bundle', {}, 'metrics'),
+    ('structured-monthly', 'structured-monthly', {'n_months': '6'}, 'structured'),
+    ('structured-by-product', 'structured-by-product', {'days': '30'}, 'structured'),
+    ('structured-by-category', 'structured-by-category', {'days': '30'}, 'structured'),
+    ('clientes-list', 'clientes-list', {}, 'list'),
+    ('productos-list', 'productos-list', {}, 'list'),
+    ('ventas-list', 'ventas-list', {}, 'list'),
+    ('export-csv-ventas', 'export-csv', _last_30_days, 'export'),
+    ('export-csv-productos', 'export-csv', {'tipo': 'productos', 'count': 'all'}, 'export'),
+    ('export-pdf-productos', 'export-pdf', {'tipo': 'productos', 'count': '100'}, 'export'),
+]
+
+
+def store_path(url_name, slug=SLUG):
+    """Ruta del endpoint en la tienda `slug` (/api/s/<slug>/...)."""
+    path = reverse(url_name)
+    return f'/api/s/{slug}/' + path[len('/api/'):]
+
+
+def endpoint_params(params, anchor):
+    return params(anchor) if callable(params) else dict(params)
+
+
+# Datos
+
+def day_anchor(anchor=None):
+    """Inicio del día (UTC) de `anchor` o de hoy: las fechas del dataset cuentan desde ahí."""
+    return (anchor or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def dataset_sizes(sales):
+    """(clientes, productos) para `sales` ventas."""
+    return max(50, sales // 10), max(20, min(2_000, sales // 100))
+
+
+def signature(sales, seed, anchor):
+    return f'bench seed={seed} sales={sales} anchor={anchor.date().isoformat()}'
+
+
+def stored_signature(using):
+    """Firma del dataset guardada como comentario de la tabla de ventas (o None)."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT obj_description(%s::regclass)',
+                       [connection.ops.quote_name(Ventas._meta.db_table)])
+        return cursor.fetchone()[0]
+
+
+def clear(using):
+    tables = [m._meta.db_table for m in (VentaItem, Ventas, Productos, Clientes, RegistroEliminado)]
+    qn = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(qn(t) for t in tables)} RESTART IDENTITY CASCADE")
+
+
+def seed(using, sales, seed=0, anchor=None, sizes=None):
+    """Inserta `sales` ventas deterministas (con sus clientes, productos e items).
+
+    La BD debe estar vacía (clear()); en PostgreSQL se guarda la firma del
+    dataset para reutilizarlo. `sizes` = (clientes, productos) sustituye a
+    dataset_sizes() (al menos 4 productos). Devuelve el número de items creados.
+    """
+    rng = random.Random(seed)
+    anchor = day_anchor(anchor)
+    n_clientes, n_productos = sizes or dataset_sizes(sales)
+
+    productos = []
+    for i in range(n_productos):
+        precio = round(rng.uniform(1, 200), 2)
+        productos.append(Productos(
+            nombre=f'Producto {i + 1}', categoria=CATEGORIES[i % len(CATEGORIES)], precio=precio,
+            costo=Decimal(str(round(precio * rng.uniform(0.4, 0.8), 2))),
+            stock=rng.randint(0, 500), vendidos=0, tendencias=Productos.TENDENCIA_MEDIA,
+            estado=Productos.ESTADO_DISPONIBLE))
+    productos = Productos.objects.using(using).bulk_create(productos, batch_size=BATCH)
+
+    clientes = [
+        Clientes(nombre=f'Cliente{i + 1}', apellido='Bench', cedula=str(10_000_000 + i),
+                 ciudad=CITIES[i % len(CITIES)], correo=f'cliente{i + 1}@bench.test',
+                 telefono=f'0414{i:07d}', display_id=display_ids.START + i,
+                 fecha_registro=(anchor - timedelta(days=rng.randint(0, DAYS_BACK))).date(),
+                 cantidad_compras=0)
+        for i in range(n_clientes)
+    ]
+    clientes = Clientes.objects.using(using).bulk_create(clientes, batch_size=BATCH)
+    display_ids.sync_display_id_sequence(using)
+
+    states, weights = zip(*STATES)
+    items_total = 0
+    for start in range(0, sales, BATCH):
+        ventas, lines = [], []
+        for _ in range(min(BATCH, sales - start)):
+            fecha = anchor - timedelta(seconds=rng.randrange(DAYS_BACK * 86_400))
+            estado = rng.choices(states, weights)[0]
+            items = []
+            for producto in rng.sample(productos, rng.randint(1, 4)):
+                cantidad = rng.randint(1, 5)
+                precio = Decimal(str(producto.precio))
+                items.append(VentaItem(
+                    producto=producto, cantidad=cantidad, precio_unitario=precio,
+                    precio_total=precio * cantidad, venta_fecha=fecha, venta_estado=estado,
+                    categoria=producto.categoria, costo_unitario=producto.costo))
+            ventas.append(Ventas(
+                fecha=fecha, cliente=clientes[rng.randrange(n_clientes)], estado=estado,
+                metodo_compra=rng.choice(METHODS), precio_total=sum(i.precio_total for i in items)))
+            lines.append(items)
+        with transaction.atomic(using=using):
+            Ventas.objects.using(using).bulk_create(ventas, batch_size=BATCH)
+            for venta, items in zip(ventas, lines):
+                for item in items:
+                    item.venta = venta
+            batch_items = [item for items in lines for item in items]
+            VentaItem.objects.using(using).bulk_create(batch_items, batch_size=BATCH)
+        items_total += len(batch_items)
+
+    # Contadores derivados, como los mantiene la app al vender
+    sold = (VentaItem.objects.using(using)
+            .filter(producto=OuterRef('pk'), venta_estado=Ventas.ESTADO_COMPLETADA)
+            .values('producto').annotate(total=Sum('cantidad')).values('total'))
+    Productos.objects.using(using).update(vendidos=Coalesce(Subquery(sold), 0))
+    purchases = (Ventas.objects.using(using).filter(cliente=OuterRef('pk'))
+                 .values('cliente').annotate(total=Count('id')).values('total'))
+    Clientes.objects.using(using).update(cantidad_compras=Coalesce(Subquery(purchases), 0))
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"COMMENT ON TABLE {connection.ops.quote_name(Ventas._meta.db_table)} "
+                           f"IS '{signature(sales, seed, anchor)}'")
+            cursor.execute('ANALYZE')
+    for model in (Clientes, Productos, Ventas, VentaItem):
+        invalidation.publish(using, model)
+    return items_total
+
+
+# BD de trabajo
+
+def scratch_database_settings():
+    default = connections.settings[DEFAULT_DB_ALIAS]
+    conf = dict(getattr(settings, 'BENCH_DATABASE', None) or {})
+    conf.setdefault('NAME', f"{default['NAME']}_bench")
+    in_use = {db.get('NAME') for alias, db in connections.settings.items()}
+    if conf['NAME'] in in_use:
+        raise ValueError(f"BENCH_DATABASE apunta a una BD configurada ({conf['NAME']})")
+    return conf
+
+
+def ensure_scratch_store():
+    """Crea (si hace falta) la BD de trabajo, la registra como tienda `bench` y devuelve su alias."""
+    conf = scratch_database_settings()
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'postgresql':
+        raise ValueError("El benchmark requiere PostgreSQL")
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_database WHERE datname = %s', [conf['NAME']])
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE DATABASE {connection.ops.quote_name(conf['NAME'])}")
+    stores.register(SLUG, {'alias': f'store_{SLUG}', 'database': conf})
+    return stores.activate(SLUG)
+
+
+# Medición
+
+def percentile(values, pct):
+    """Percentil por rango más cercano (sin interpolar)."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB, macOS en bytes
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _request(client, path, params):
+    response = client.get(path, params)
+    size = (sum(len(chunk) for chunk in response.streaming_content)
+            if response.streaming else len(response.content))
+    return response, size
+
+
+def _sql(response):
+    """(consultas, ms de SQL) de las cabeceras de instrumentation.py (también
+    cuenta las consultas de otros hilos, p. ej. el bundle async)."""
+    queries = response.get('X-Query-Count')
+    match = SQL_TIMING_RE.search(response.get('Server-Timing', ''))
+    return (int(queries) if queries is not None else None,
+            float(match.group(1)) if match else None)
+
+
+def run_endpoint(client, path, params, repetitions):
+    """Mide un endpoint: una petición de calentamiento, `repetitions` medidas y una con tracemalloc."""
+    timings, sql_ms = [], []
+    queries = status = size = None
+    logger = logging.getLogger('Dashboard.timing')
+    previous = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        # Las vistas de métricas construyen límites de mes naive: el aviso no aporta aquí
+        with warnings.catch_warnings(), override_settings(REQUEST_TIMING=True, REQUEST_TIMING_FLAG=None):
+            warnings.filterwarnings('ignore', message='.*received a naive datetime', category=RuntimeWarning)
+            _request(client, path, params)
+            for _ in range(repetitions):
+                started = time.perf_counter()
+                response, size = _request(client, path, params)
+                timings.append((time.perf_counter() - started) * 1000)
+                status = response.status_code
+                queries, ms = _sql(response)
+                if ms is not None:
+                    sql_ms.append(ms)
+
+            tracemalloc.start()
+            try:
+                _request(client, path, params)
+                _current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    finally:
+        logger.setLevel(previous)
+    return {
+        'status': status,
+        'runs': repetitions,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'mean_ms': round(sum(timings) / len(timings), 2),
+        'queries': queries,
+        'sql_ms': round(percentile(sql_ms, 50), 2) if sql_ms else None,
+        'bytes': size,
+        'py_peak_mb': round(peak / (1024 * 1024), 2),
+        'max_rss_mb': max_rss_mb(),
+    }
+
+
+# Comparación
+
+def compare(report, baseline, tolerance=0.2):
+    """Filas (escala, endpoint, métrica, base, actual, cambio, empeora) de las diferencias.
+
+    Empeora: p50/p95 más de `tolerance` (fracción) por encima de la base o
+    cualquier consulta de más.
+    """
+    rows = []
+    for scale, current in report.get('scales', {}).items():
+        base_scale = baseline.get('scales', {}).get(scale)
+        if not base_scale:
+            continue
+        for name, cur in current['endpoints'].items():
+            base = base_scale['endpoints'].get(name)
+            if not base:
+                continue
+            for metric in ('p50_ms', 'p95_ms', 'queries'):
+                before, after = base.get(metric), cur.get(metric)
+                if before is None or after is None:
+                    continue
+                change = (after - before) / before if before else (0.0 if after == before else math.inf)
+                if metric == 'queries':
+                    worse = after > before
+                else:
+                    worse = change > tolerance
+                rows.append((scale, name, metric, before, after, change, worse))
+    return rows
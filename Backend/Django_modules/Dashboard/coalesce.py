@@ -0,0 +1,160 @@
+"""Single-flight y stale-while-revalidate para las métricas agregadas.
+
+Al abrir el dashboard varios componentes piden la misma métrica con los
+mismos parámetros a la vez. `AggregateCache` hace que:
+
+- Single-flight: peticiones concurrentes con la misma clave (alias de tienda,
+  vista y query params) comparten un solo cálculo; las demás esperan el
+  resultado del primero. Es por proceso: cada worker calcula a lo sumo una vez.
+- Stale-while-revalidate: un resultado más viejo que AGGREGATE_SOFT_TTL se
+  sirve igual y se recalcula en segundo plano (uno por clave). Pasado
+  AGGREGATE_HARD_TTL ya no se sirve: se recalcula en la petición.
+- Las escrituras avisadas por el bus de invalidación (invalidation.py)
+  invalidan las entradas del alias que dependen del modelo: la próxima
+  petición recalcula (single-flight) sin esperar al TTL ni servir el valor
+  anterior; stale-while-revalidate es solo para las que caducan por edad.
+  Si el bus no escucha ese alias (tests, comandos, INVALIDATION_BUS=0) no se
+  guarda nada y solo queda el single-flight.
+
+La cabecera X-Cache de la respuesta indica miss, hit, stale o coalesced.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import invalidation, prometheus
+from .db_router import StoreAwareExecutor, get_db_for_request
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Ejecuta fn una sola vez por clave entre llamadas concurrentes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """(valor, compartido): compartido=True si se esperó el cálculo de otro hilo."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            value = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+            return value, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class _Entry:
+    __slots__ = ('value', 'computed_at', 'alias', 'models', 'generation')
+
+    def __init__(self, value, alias, models, generation):
+        self.value = value
+        self.computed_at = time.monotonic()
+        self.alias = alias
+        self.models = models
+        # Generación de los modelos al empezar el cálculo (invalidation.py)
+        self.generation = generation
+
+    def changed(self):
+        return invalidation.generation(self.alias, self.models) != self.generation
+
+
+class AggregateCache:
+    """Resultados por clave con single-flight y stale-while-revalidate."""
+
+    def __init__(self, refresh_workers=2):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._executor = StoreAwareExecutor(
+            max_workers=refresh_workers, thread_name_prefix='aggregate-refresh')
+
+    def get(self, key, compute, models=()):
+        """(valor, estado) con estado en miss|hit|stale|coalesced.
+
+        `key` identifica el cálculo dentro de la tienda actual; `models` son
+        los modelos cuyos cambios vuelven vieja la entrada.
+        """
+        value, state = self._get(key, compute, models)
+        prometheus.cache_result('aggregates', state)
+        return value, state
+
+    def _get(self, key, compute, models):
+        soft = float(getattr(settings, 'AGGREGATE_SOFT_TTL', 30))
+        hard = max(soft, float(getattr(settings, 'AGGREGATE_HARD_TTL', 300)))
+        alias = get_db_for_request() or DEFAULT_DB_ALIAS
+        key = (alias, key)
+        with self._lock:
+            entry = self._entries.get(key)
+        # Una entrada con escrituras avisadas no se sirve ni vieja: se recalcula
+        if entry is not None and not entry.changed():
+            age = time.monotonic() - entry.computed_at
+            if age < soft:
+                return entry.value, 'hit'
+            if age < hard:
+                self._revalidate(key, compute, models)
+                return entry.value, 'stale'
+        value, shared = self._flight.do(key, lambda: self._compute(key, compute, models))
+        return value, 'coalesced' if shared else 'miss'
+
+    def _compute(self, key, compute, models):
+        alias = key[0]
+        generation = invalidation.generation(alias, models)
+        value = compute()
+        if not invalidation.listening(alias):
+            # Sin el bus no se sabría de las escrituras de otros workers
+            return value
+        entry = _Entry(value, alias, tuple(models), generation)
+        with self._lock:
+            limit = int(getattr(settings, 'AGGREGATE_CACHE_ENTRIES', 500))
+            self._entries.pop(key, None)
+            while self._entries and len(self._entries) >= limit:
+                # La más antigua (orden de inserción)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = entry
+        return value
+
+    def _revalidate(self, key, compute, models):
+        if self._flight.in_flight(key):
+            return
+
+        def refresh():
+            try:
+                self._flight.do(key, lambda: self._compute(key, compute, models))
+            except Exception:
+                logger.exception("Revalidación de %r falló", key)
+            finally:
+                # Hilo fuera del ciclo de petición: devolver las conexiones
+                connections.close_all()
+        # StoreAwareExecutor: el recálculo usa el alias de la petición
+        self._executor.submit(refresh)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Instancia del proceso (CoalescedMetricMixin en views.py)
+aggregates = AggregateCache()
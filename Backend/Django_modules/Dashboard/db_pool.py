@@ -0,0 +1,49 @@
+"""Utilidades para los pools de conexiones de cada alias de BD.
+
+Los pools los crea Django (OPTIONS['pool'] en settings.DATABASES) de forma
+perezosa; aquí se exponen el calentamiento al iniciar el worker y las
+métricas de psycopg_pool (tiempo de espera por conexión, uso, errores).
+"""
+
+import logging
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _pools(aliases=None):
+    for alias in aliases or connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            yield alias, pool
+
+
+def warm_up(aliases=None, timeout=10.0):
+    """Abre los pools y espera a que tengan sus conexiones mínimas.
+
+    Un alias que no responde no impide el arranque: se registra y se sigue.
+    """
+    ready = []
+    for alias, pool in _pools(aliases):
+        try:
+            pool.open(wait=True, timeout=timeout)
+            ready.append(alias)
+        except Exception as exc:
+            logger.warning("No se pudo calentar el pool de %s: %s", alias, exc)
+    return ready
+
+
+def pool_stats(aliases=None):
+    """Métricas por alias. Los contadores de psycopg_pool son acumulados desde
+    el arranque del worker; `avg_wait_ms` es el promedio por petición de conexión.
+    """
+    out = {}
+    for alias, pool in _pools(aliases):
+        stats = pool.get_stats()
+        requests = stats.get('requests_num', 0)
+        wait_ms = stats.get('requests_wait_ms', 0)
+        stats['avg_wait_ms'] = round(wait_ms / requests, 3) if requests else 0.0
+        stats['closed'] = pool.closed
+        out[alias] = stats
+    return out
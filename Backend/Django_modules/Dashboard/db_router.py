@@ -1,72 +1,174 @@
-import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Optional
 
-_state = threading.local()
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import DEFAULT_DB_ALIAS
+from django.http import JsonResponse
+
+# Alias de BD de la petición/tarea actual. Un ContextVar (y no threading.local)
+# sigue a la petición en código async y en tareas lanzadas con
+# contextvars.copy_context(), y no se filtra entre corrutinas del mismo hilo.
+_current_db = contextvars.ContextVar('dashboard_db_alias', default=None)
 
 
 def set_db_for_request(db_alias: Optional[str]):
-    if db_alias:
-        _state.db = db_alias
-    else:
-        if hasattr(_state, 'db'):
-            delattr(_state, 'db')
+    """Fija el alias del contexto actual. Devuelve el token para reset_db()."""
+    return _current_db.set(db_alias or None)
+
+
+def reset_db(token):
+    _current_db.reset(token)
 
 
 def get_db_for_request() -> Optional[str]:
-    return getattr(_state, 'db', None)
+    return _current_db.get()
 
 
-class RequestDBRouterMiddleware:
-    """Middleware ligero que asigna un alias de BD en base al prefijo de la URL.
+@contextmanager
+def using_store(db_alias: Optional[str]):
+    """Enruta las consultas del bloque al alias dado ('default' o None: default).
+
+    Las tareas enviadas a un StoreAwareExecutor dentro del bloque heredan el alias.
+    """
+    token = set_db_for_request(
+        None if db_alias == DEFAULT_DB_ALIAS else db_alias)
+    try:
+        yield db_alias or DEFAULT_DB_ALIAS
+    finally:
+        reset_db(token)
+
+
+class StoreAwareExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor que ejecuta cada tarea en una copia del contexto de
+    quien la envía, de modo que el alias de `using_store()` se propaga.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        ctx = contextvars.copy_context()
+        return super().submit(ctx.run, fn, *args, **kwargs)
 
-    - /api/  -> None (usa default)
-    - /api2/ -> 'store_b'
-    - /api3/ -> 'store_c'
+
+class RequestDBRouterMiddleware:
+    """Middleware ligero que asigna el alias de BD de la tienda de la petición.
+
+    La tienda se resuelve con el registro de `Dashboard.stores`:
+    - /api/s/<slug>/...  -> tienda <slug> (path_info se reescribe a /api/...;
+      request.path conserva la URL pedida para redirecciones, Location y
+      build_absolute_uri())
+    - /api2/, /api3/     -> store_b, store_c (prefijos heredados)
+    - cabecera X-Store   -> tienda indicada
+    - en otro caso       -> None (usa default)
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
+        from . import invalidation, stores
+        self.stores = stores
+        self.invalidation = invalidation
         self.get_response = get_response
+        # Bajo ASGI la cadena es async: no forzar un hilo por petición
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _prepare(self, request, store, new_path):
+        # Solo path_info (lo que resuelve las URLs): los enlaces y redirecciones
+        # que salen de request.path siguen apuntando a la misma tienda
+        request.path_info = new_path
+        request.store = store
+
+    def _unknown(self, exc):
+        return JsonResponse({'detail': f'Tienda desconocida: {exc}'}, status=404)
 
     def __call__(self, request):
-        path = request.path or ''
-        if path.startswith('/api2/'):
-            set_db_for_request('store_b')
-        elif path.startswith('/api3/'):
-            set_db_for_request('store_c')
-        else:
-            set_db_for_request(None)
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            store, new_path = self.stores.resolve_path(
+                request.path_info or '', request.headers.get(self.stores.STORE_HEADER))
+        except self.stores.UnknownStore as exc:
+            return self._unknown(exc)
+
+        self._prepare(request, store, new_path)
+        from .replicas import request_scope
+        self.stores.acquire(store)
+        try:
+            self.invalidation.ensure_listening(store)
+            with using_store(store.alias), request_scope(request) as scope:
+                response = self.get_response(request)
+                scope.remember(response)
+                return response
+        finally:
+            self.stores.release(store)
 
+    async def __acall__(self, request):
+        args = (request.path_info or '', request.headers.get(self.stores.STORE_HEADER))
         try:
-            response = self.get_response(request)
-            return response
+            try:
+                store, new_path = self.stores.resolve_path(*args, lookup=False)
+            except self.stores.StoreLookupRequired:
+                # Tienda aún no cargada: la búsqueda en la tabla Store va a un hilo
+                store, new_path = await sync_to_async(self.stores.resolve_path)(*args)
+        except self.stores.UnknownStore as exc:
+            return self._unknown(exc)
+
+        self._prepare(request, store, new_path)
+        from .replicas import request_scope
+        if store.dynamic:
+            # Registrar el alias puede desalojar otro y cerrar su pool (E/S)
+            await sync_to_async(self.stores.acquire)(store)
+        try:
+            self.invalidation.ensure_listening(store)
+            # El ContextVar del alias sigue a la corrutina y a sus sync_to_async
+            with using_store(store.alias), request_scope(request) as scope:
+                response = await self.get_response(request)
+                scope.remember(response)
+                return response
         finally:
-            # limpiar estado para evitar fugas entre requests
-            set_db_for_request(None)
+            self.stores.release(store)
 
 
 class PathRouter:
-    """Database router que enruta lecturas/escrituras según el alias establecido
-    por la middleware (get_db_for_request()). Si no hay alias, devuelve None
+    """Database router que enruta lecturas/escrituras según el alias del contexto
+    actual (middleware o using_store(); get_db_for_request()). Si no hay alias, devuelve None
     para permitir que el comportamiento por defecto (default) se aplique.
     """
 
     def db_for_read(self, model, **hints):
+        from . import replicas
         alias = get_db_for_request()
-        return alias
+        # Métricas/exportaciones/IA pueden leer de la réplica de la tienda
+        return replicas.read_alias(model, alias)
 
     def db_for_write(self, model, **hints):
+        from . import replicas
         alias = get_db_for_request()
+        if alias is None:
+            # Un objeto leído de una réplica se guarda en su primario
+            instance = hints.get('instance')
+            db = getattr(getattr(instance, '_state', None), 'db', None)
+            if db is not None and replicas.primary_of(db) != db:
+                alias = replicas.primary_of(db)
+        replicas.note_write(alias or DEFAULT_DB_ALIAS)
         return alias
 
     def allow_relation(self, obj1, obj2, **hints):
-        # Permitir relaciones solo si ambos objetos están en la misma conexión
+        from . import replicas
+        # Permitir relaciones solo si ambos objetos están en la misma BD
+        # (una réplica cuenta como su primario)
         db_obj1 = getattr(obj1._state, 'db', None)
         db_obj2 = getattr(obj2._state, 'db', None)
         if db_obj1 and db_obj2:
-            return db_obj1 == db_obj2
+            return replicas.primary_of(db_obj1) == replicas.primary_of(db_obj2)
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
+        from . import replicas
         # Permitir migraciones en todas las conexiones configuradas para crear
         # tablas en las DBs adicionales (el desarrollador puede limitar esto).
-        return True
+        # Las réplicas reciben el esquema del primario por replicación.
+        return replicas.primary_of(db) == db
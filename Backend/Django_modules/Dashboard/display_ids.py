@@ -0,0 +1,62 @@
+"""Asignación de Clientes.display_id con una secuencia de PostgreSQL.
+
+Cada BD (alias de tienda) tiene su propia secuencia, creada por la migración
+0023 a partir del máximo display_id existente. `nextval` no toma bloqueos ni
+se revierte con la transacción, así que inserciones concurrentes nunca chocan
+(a cambio pueden quedar huecos si una inserción falla).
+
+- next_display_id(using): un id (lo usa Clientes.save()).
+- reserve_display_ids(n, using): n ids en una sola consulta, para
+  bulk_create e importaciones.
+- sync_display_id_sequence(using): adelanta la secuencia al máximo de la
+  tabla tras cargar filas con display_id explícito.
+"""
+
+from typing import List
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+
+SEQUENCE_NAME = 'dashboard_clientes_display_id_seq'
+START = 1000
+
+
+def _clientes():
+    from .models import Clientes
+    return Clientes
+
+
+def reserve_display_ids(count: int, using: str = DEFAULT_DB_ALIAS) -> List[int]:
+    """Reserva `count` display_id en la BD `using` (ordenados, no necesariamente contiguos)."""
+    if count <= 0:
+        return []
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        # Sin secuencias: máximo + 1 (no seguro ante inserciones concurrentes)
+        max_id = (_clientes().objects.using(using)
+                  .aggregate(m=Max('display_id'))['m'] or START - 1)
+        start = max(max_id + 1, START)
+        return list(range(start, start + count))
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)',
+                       [SEQUENCE_NAME, count])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def next_display_id(using: str = DEFAULT_DB_ALIAS) -> int:
+    return reserve_display_ids(1, using)[0]
+
+
+def sync_display_id_sequence(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Adelanta la secuencia por encima del mayor display_id de la tabla (nunca la retrocede)."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT setval(%s, GREATEST("
+            f"(SELECT COALESCE(MAX(display_id) + 1, %s) FROM {qn(_clientes()._meta.db_table)}), "
+            f"(SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM {qn(SEQUENCE_NAME)})"
+            f"), false)",
+            [SEQUENCE_NAME, START])
@@ -0,0 +1,46 @@
+"""EXPLAIN de consultas capturadas (perfilado `?_profile=sql` y log de consultas lentas).
+
+EXPLAIN ANALYZE ejecuta la consulta, así que se lanza dentro de una
+transacción que siempre se deshace. Eso no deshace todo: pg_notify se
+entregaría si se confirmara, pero nextval/setval avanzan la secuencia aunque
+se haga rollback. Las consultas que llaman a esas funciones (los avisos de
+live.py e invalidation.py, la reserva de display_ids.py) se explican sin
+ANALYZE: plan estimado, sin ejecutarlas.
+"""
+
+import re
+
+from django.db import connections, transaction
+
+# Funciones con efectos fuera de la transacción o que no deben repetirse
+VOLATILE_RE = re.compile(r'\b(pg_notify|nextval|setval|pg_advisory_\w*)\s*\(', re.IGNORECASE)
+
+
+def explainable(sql):
+    """Solo SELECT/WITH de lectura (sin FOR UPDATE)."""
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    return head in ('SELECT', 'WITH') and ' FOR UPDATE' not in sql.upper()
+
+
+def analyzable(sql):
+    return VOLATILE_RE.search(sql) is None
+
+
+def explain(alias, sql, params, timeout_ms=None):
+    """Plan de `sql` en `alias` como texto; ValueError fuera de PostgreSQL.
+
+    EXPLAIN (ANALYZE, BUFFERS) si `analyzable(sql)`, si no EXPLAIN a secas.
+    Con `timeout_ms` se limita con statement_timeout.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        raise ValueError(f'EXPLAIN ANALYZE solo en PostgreSQL ({connection.vendor})')
+    prefix = 'EXPLAIN (ANALYZE, BUFFERS)' if analyzable(sql) else 'EXPLAIN'
+    with transaction.atomic(using=alias):
+        with connection.cursor() as cursor:
+            if timeout_ms:
+                cursor.execute(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+            cursor.execute(f'{prefix} {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        transaction.set_rollback(True, using=alias)
+    return plan
@@ -0,0 +1,285 @@
+"""Lectura rápida para los listados de Clientes, Productos y Ventas.
+
+Los ModelSerializer pasan cada valor por la maquinaria de campos de DRF (y los
+SerializerMethodField por getattr sobre la instancia), lo que domina la CPU
+en listas grandes. Estos lectores piden solo las columnas necesarias con
+.values() y arman los dicts directamente, con los campos derivados (estado,
+segmento, cliente_nombre, producto_nombre) calculados en el mismo recorrido.
+
+La salida es la misma que la de los serializers (claves, orden y formato de
+decimales y fechas); solo se usan para lectura (list) y no validan nada.
+Medición: `python manage.py medir_serializadores`.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Ventas, VentaItem
+
+_CENT = Decimal('0.01')
+
+
+# Campos derivados (compartidos con serializer.py)
+
+def estado_cliente(ultima_compra, hoy=None):
+    """'activo' si la última compra fue hace un año o menos."""
+    if not ultima_compra:
+        return 'inactivo'
+    try:
+        ultima_date = ultima_compra.date() if hasattr(ultima_compra, 'date') else ultima_compra
+    except Exception:
+        return 'inactivo'
+    hoy = hoy or timezone.now().date()
+    return 'activo' if (hoy - ultima_date) <= timedelta(days=365) else 'inactivo'
+
+
+def segmento_cliente(cantidad_compras):
+    try:
+        compras = int(cantidad_compras or 0)
+    except Exception:
+        compras = 0
+    if compras <= 5:
+        return 'nuevo'
+    if compras > 50:
+        return 'vip'
+    return 'frecuente'
+
+
+def estado_producto(stock):
+    try:
+        stock = int(stock or 0)
+    except Exception:
+        stock = 0
+    if stock == 0:
+        return 'agotado'
+    if stock < 50:
+        return 'bajo-stock'
+    return 'activo'
+
+
+# Formato de DRF para decimales y fechas
+
+def _decimal(value):
+    # DecimalField(decimal_places=2) con COERCE_DECIMAL_TO_STRING
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return '{:f}'.format(value.quantize(_CENT, rounding=ROUND_HALF_UP))
+
+
+def _datetime_formatter():
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def fmt(value):
+        if value is None:
+            return None
+        if tz is not None and timezone.is_aware(value):
+            value = value.astimezone(tz)
+        out = value.isoformat()
+        return out[:-6] + 'Z' if out.endswith('+00:00') else out
+    return fmt
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+class ValuesReader(ABC):
+    """Convierte un queryset del ViewSet en la lista que devolvería su serializer.
+
+    Admite un subconjunto de claves (`?fields=`, `?include=`): solo se piden a
+    la BD las columnas y anotaciones que esas claves necesitan, y las
+    relaciones (items) solo si se incluyen.
+    """
+    # Anotaciones del listado (las usa también get_queryset() del ViewSet)
+    annotations = {}
+    # clave de salida -> columnas/anotaciones que necesita (por defecto, la clave)
+    sources = {}
+    # Claves opcionales que ?include= activa o desactiva
+    includes = ()
+
+    @abstractmethod
+    def builders(self):
+        """{clave de salida: función(fila de .values())}, en el orden del serializer."""
+
+    @property
+    def keys(self):
+        return tuple(self.builders())
+
+    def select(self, params):
+        """Claves a devolver según ?fields= y ?include= (None: todas).
+
+        - fields: claves separadas por comas, en cualquier orden (la salida
+          mantiene el orden del serializer).
+        - include: activa claves opcionales (`includes`, p. ej. items). Si se
+          envía, esas claves salen solo cuando se piden aquí.
+        Lanza ValueError con las opciones válidas si algo no existe.
+        """
+        keys = self.keys
+        raw = params.get('fields')
+        chosen = None
+        if raw:
+            chosen = {f.strip() for f in raw.split(',') if f.strip()}
+            unknown = chosen - set(keys)
+            if unknown:
+                raise ValueError(
+                    f"Campos desconocidos: {', '.join(sorted(unknown))}. Opciones: {', '.join(keys)}")
+        raw = params.get('include')
+        if raw is not None:
+            wanted = {i.strip() for i in raw.split(',') if i.strip()}
+            unknown = wanted - set(self.includes)
+            if unknown:
+                raise ValueError(f"include desconocido: {', '.join(sorted(unknown))}. "
+                                 f"Opciones: {', '.join(self.includes) or 'ninguna'}")
+            chosen = (set(keys) if chosen is None else chosen) - set(self.includes) | wanted
+        if chosen is None:
+            return None
+        return tuple(k for k in keys if k in chosen)
+
+    def values(self, queryset, fields=None):
+        columns = {}
+        for key in fields or self.keys:
+            for col in self.sources.get(key, (key,)):
+                columns[col] = None
+        annotations = {c: self.annotations[c] for c in columns if c in self.annotations}
+        plain = [c for c in columns if c not in annotations]
+        # prefetch_related no aplica a .values(); select_related se ignora
+        return (queryset.prefetch_related(None)
+                .annotate(**annotations).values(*plain, *annotations))
+
+    def rows(self, rows, fields=None):
+        return self._build(self.builders(), rows, fields)
+
+    @staticmethod
+    def _build(builders, rows, fields):
+        selected = [(key, builders[key]) for key in (fields or builders)]
+        return [{key: build(r) for key, build in selected} for r in rows]
+
+
+def _col(name):
+    return lambda r: r[name]
+
+
+class ClientesReader(ValuesReader):
+    annotations = {
+        'compras': Count('ventas'),
+        'gasto_total': Sum('ventas__precio_total'),
+        'ultima_compra': Max('ventas__fecha'),
+    }
+    sources = {
+        'estado': ('ultima_compra',),
+        'nombre': ('nombre', 'apellido'),
+        'email': ('correo',),
+        'segmento': ('cantidad_compras',),
+    }
+
+    def builders(self):
+        hoy = timezone.now().date()
+        fmt_dt = _datetime_formatter()
+        return {
+            'id': _col('id'),
+            'compras': _col('compras'),
+            'gasto_total': lambda r: _decimal(r['gasto_total']),
+            'estado': lambda r: estado_cliente(r['ultima_compra'], hoy),
+            'nombre': lambda r: f"{r['nombre']} {r['apellido']}".strip(),
+            'email': _col('correo'),
+            'segmento': lambda r: segmento_cliente(r['cantidad_compras']),
+            'apellido': _col('apellido'),
+            'cedula': _col('cedula'),
+            'ciudad': _col('ciudad'),
+            'correo': _col('correo'),
+            'telefono': _col('telefono'),
+            'fecha_registro': lambda r: _date(r['fecha_registro']),
+            'cantidad_compras': _col('cantidad_compras'),
+            'tipo_cliente': _col('tipo_cliente'),
+            'display_id': _col('display_id'),
+            'actualizado_en': lambda r: fmt_dt(r['actualizado_en']),
+        }
+
+
+# Solo items de ventas completadas (consistente con ingresos por categoría)
+_COMPLETADA = Q(venta_items__venta_estado=Ventas.ESTADO_COMPLETADA)
+
+
+class ProductosReader(ValuesReader):
+    annotations = {
+        'ventas_count': Count('venta_items', filter=_COMPLETADA),
+        'ingreso_total': Sum('venta_items__precio_total', filter=_COMPLETADA),
+        'vendidos_total': Sum('venta_items__cantidad', filter=_COMPLETADA),
+        'ultima_venta': Max('venta_items__venta_fecha', filter=_COMPLETADA),
+    }
+    sources = {'estado': ('stock',)}
+
+    def builders(self):
+        fmt_dt = _datetime_formatter()
+        return {
+            'id': _col('id'),
+            'ventas_count': _col('ventas_count'),
+            'ingreso_total': lambda r: _decimal(r['ingreso_total']),
+            'vendidos_total': _col('vendidos_total'),
+            'ultima_venta': lambda r: fmt_dt(r['ultima_venta']),
+            'estado': lambda r: estado_producto(r['stock']),
+            'nombre': _col('nombre'),
+            'categoria': _col('categoria'),
+            'precio': _col('precio'),
+            'costo': lambda r: _decimal(r['costo']),
+            'stock': _col('stock'),
+            'vendidos': _col('vendidos'),
+            'tendencias': _col('tendencias'),
+            'actualizado_en': lambda r: fmt_dt(r['actualizado_en']),
+        }
+
+
+class VentasReader(ValuesReader):
+    includes = ('items',)
+    sources = {
+        'items': ('id',),
+        'cliente_nombre': ('cliente__nombre', 'cliente__apellido'),
+        'cliente': ('cliente_id',),
+    }
+    item_fields = ('id', 'venta_id', 'producto_id', 'producto__nombre', 'cantidad',
+                   'precio_unitario', 'precio_total')
+
+    def _items(self, venta_ids):
+        # Items de todas las ventas en una consulta (con el nombre del producto por JOIN)
+        items = {}
+        qs = (VentaItem.objects.filter(venta_id__in=venta_ids)
+              .order_by('id').values_list(*self.item_fields))
+        for iid, venta_id, producto_id, producto_nombre, cantidad, unitario, total in qs:
+            items.setdefault(venta_id, []).append({
+                'id': iid,
+                'venta': venta_id,
+                'producto': producto_id,
+                'producto_nombre': producto_nombre,
+                'cantidad': cantidad,
+                'precio_unitario': _decimal(unitario),
+                'precio_total': _decimal(total),
+            })
+        return items
+
+    def rows(self, rows, fields=None):
+        rows = list(rows)
+        items = (self._items([r['id'] for r in rows])
+                 if rows and 'items' in (fields or self.keys) else {})
+        return self._build(self.builders(items), rows, fields)
+
+    def builders(self, items=None):
+        fmt_dt = _datetime_formatter()
+        items = items or {}
+        return {
+            'id': _col('id'),
+            'items': lambda r: items.get(r['id'], []),
+            'cliente_nombre': lambda r: f"{r['cliente__nombre']} {r['cliente__apellido']}".strip(),
+            'fecha': lambda r: fmt_dt(r['fecha']),
+            'precio_total': lambda r: _decimal(r['precio_total']),
+            'metodo_compra': _col('metodo_compra'),
+            'estado': _col('estado'),
+            'actualizado_en': lambda r: fmt_dt(r['actualizado_en']),
+            'cliente': _col('cliente_id'),
+        }
@@ -0,0 +1,310 @@
+"""Instrumentación por petición: consultas SQL y tiempos.
+
+`RequestTimingMiddleware` mide cada petición y un execute wrapper instalado en
+todas las conexiones (también las de tiendas dinámicas y los hilos de
+StoreAwareExecutor, que heredan el contexto) cuenta sus consultas:
+
+- sql: número de consultas y tiempo total en la BD; sql-max: la más lenta.
+- serialize: tiempo de la vista fuera de la BD (en este código casi todo es
+  serializar filas a JSON).
+- render: render de la Response de DRF (JSONRenderer).
+- total: toda la cadena de middlewares.
+
+Se devuelven en las cabeceras `Server-Timing` (las muestran las devtools del
+navegador) y `X-Query-Count`, y como una línea JSON por petición en el logger
+`Dashboard.timing` (con la consulta más lenta y los alias de BD usados).
+Los mismos datos alimentan /metrics (prometheus.py, METRICS_ENABLED) aunque
+las cabeceras y el log estén desactivados.
+
+Se activa con REQUEST_TIMING=1 y se puede cambiar sin reiniciar con el
+archivo REQUEST_TIMING_FLAG (p. ej. `manage.py instrumentacion --activar`):
+si existe manda su contenido ('on'/'off'), y todos los workers del nodo lo
+releen cada REQUEST_TIMING_FLAG_TTL segundos.
+
+current_view() da el nombre de la vista en curso en cualquier petición (y en
+los hilos que heredan su contexto); lo usa el log de consultas lentas.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import prometheus
+
+logger = logging.getLogger('Dashboard.timing')
+
+SLOW_SQL_CHARS = 500
+
+_current = contextvars.ContextVar('dashboard_request_stats', default=None)
+# [nombre de la vista] de la petición en curso (lo rellena process_view)
+_view = contextvars.ContextVar('dashboard_request_view', default=None)
+
+
+class RequestStats:
+    """Acumulador de una petición (puede recibir consultas de varios hilos).
+
+    Con `parent` (ver capture()) también le pasa cada consulta; con
+    `keep_queries` guarda (alias, sql, params, segundos) en `captured`.
+    """
+
+    def __init__(self, parent=None, keep_queries=False):
+        self._lock = threading.Lock()
+        self.parent = parent
+        self.captured = [] if keep_queries else None
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest = (0.0, None, None)    # (segundos, sql, alias)
+        self.by_alias = {}      # alias -> [consultas, segundos]
+        self.view_time = None
+        self.render_time = 0.0
+        self._view_started = None
+        self._view_sql = 0.0
+
+    def record(self, alias, sql, duration, params=None):
+        with self._lock:
+            self.queries += 1
+            self.sql_time += duration
+            per_alias = self.by_alias.setdefault(alias, [0, 0.0])
+            per_alias[0] += 1
+            per_alias[1] += duration
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql, alias)
+            if self.captured is not None:
+                self.captured.append((alias, sql, params, duration))
+        if self.parent is not None:
+            self.parent.record(alias, sql, duration, params)
+
+    def view_started(self):
+        self._view_started = time.perf_counter()
+        self._view_sql = self.sql_time
+
+    def view_finished(self):
+        if self._view_started is not None and self.view_time is None:
+            self.view_time = time.perf_counter() - self._view_started
+            self._view_sql = self.sql_time - self._view_sql
+
+    @property
+    def serialize_time(self):
+        if self.view_time is None:
+            return None
+        return max(self.view_time - self._view_sql, 0.0)
+
+    def server_timing(self, total):
+        parts = [
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'sql-max;dur={self.slowest[0] * 1000:.1f}',
+        ]
+        if self.serialize_time is not None:
+            parts.append(f'serialize;dur={self.serialize_time * 1000:.1f}')
+        if self.render_time:
+            parts.append(f'render;dur={self.render_time * 1000:.1f}')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_log(self, request, response, total):
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 2)
+        slow_time, slow_sql, slow_alias = self.slowest
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'store': getattr(getattr(request, 'store', None), 'slug', None),
+            'db_aliases': sorted(self.by_alias),
+            'queries': self.queries,
+            'sql_ms': ms(self.sql_time),
+            'slowest_ms': ms(slow_time),
+            'slowest_alias': slow_alias,
+            'slowest_sql': slow_sql[:SLOW_SQL_CHARS] if slow_sql else None,
+            'serialize_ms': ms(self.serialize_time),
+            'render_ms': ms(self.render_time),
+            'total_ms': ms(total),
+        }
+
+
+def current():
+    return _current.get()
+
+
+def current_view():
+    """Nombre de la URL (o ruta de la función) de la vista en curso, o None."""
+    holder = _view.get()
+    return holder[0] if holder is not None else None
+
+
+def _request_stats():
+    # El de la petición, no el de un capture() anidado
+    stats = _current.get()
+    while stats is not None and stats.parent is not None:
+        stats = stats.parent
+    return stats
+
+
+@contextlib.contextmanager
+def capture():
+    """Guarda las consultas del bloque (RequestStats.captured) sin quitárselas
+    a la petición instrumentada que lo rodea."""
+    stats = RequestStats(parent=_current.get(), keep_queries=True)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper: mide la consulta si hay una petición instrumentada."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(context['connection'].alias, sql, time.perf_counter() - start, params)
+
+
+def install(connection, **kwargs):
+    """Instala el wrapper en la conexión (idempotente; receptor de connection_created)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Interruptor en caliente
+
+_flag_lock = threading.Lock()
+_flag_cache = (0.0, None)   # (leído en, valor del archivo o None)
+
+
+def _flag_value():
+    global _flag_cache
+    path = getattr(settings, 'REQUEST_TIMING_FLAG', None)
+    if not path:
+        return None
+    ttl = float(getattr(settings, 'REQUEST_TIMING_FLAG_TTL', 2))
+    now = time.monotonic()
+    read_at, value = _flag_cache
+    if now - read_at < ttl:
+        return value
+    with _flag_lock:
+        try:
+            with open(path, encoding='utf-8') as fh:
+                value = fh.read().strip().lower() not in ('0', 'off', 'false', 'no')
+        except FileNotFoundError:
+            value = None
+        except OSError as exc:
+            logger.warning("No se pudo leer REQUEST_TIMING_FLAG %s: %s", path, exc)
+            value = None
+        _flag_cache = (now, value)
+    return value
+
+
+def set_flag(enabled):
+    """Escribe el archivo de REQUEST_TIMING_FLAG (None: lo borra y manda el setting)."""
+    global _flag_cache
+    from pathlib import Path
+    path = Path(settings.REQUEST_TIMING_FLAG)
+    if enabled is None:
+        path.unlink(missing_ok=True)
+    else:
+        path.write_text('on\n' if enabled else 'off\n', encoding='utf-8')
+    _flag_cache = (0.0, None)
+
+
+def enabled():
+    flag = _flag_value()
+    if flag is not None:
+        return flag
+    return bool(getattr(settings, 'REQUEST_TIMING', False))
+
+
+class RequestTimingMiddleware:
+    """Cuenta las consultas y mide los tiempos de la petición (ver módulo).
+
+    Va primero en MIDDLEWARE para que `total` cubra toda la cadena.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        view_token = _view.set([None])
+        try:
+            timing, metrics = enabled(), prometheus.enabled()
+            if not (timing or metrics):
+                return self.get_response(request)
+            stats, token = self._start()
+            try:
+                response = self.get_response(request)
+            finally:
+                _current.reset(token)
+            return self._finish(request, response, stats, timing, metrics)
+        finally:
+            _view.reset(view_token)
+
+    async def __acall__(self, request):
+        view_token = _view.set([None])
+        try:
+            timing, metrics = enabled(), prometheus.enabled()
+            if not (timing or metrics):
+                return await self.get_response(request)
+            stats, token = self._start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                _current.reset(token)
+            return self._finish(request, response, stats, timing, metrics)
+        finally:
+            _view.reset(view_token)
+
+    def _start(self):
+        stats = RequestStats()
+        return stats, _current.set(stats)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        holder = _view.get()
+        if holder is not None:
+            match = request.resolver_match
+            holder[0] = (match.view_name or match._func_path) if match else None
+        stats = _request_stats()
+        if stats is not None:
+            stats.view_started()
+
+    def process_template_response(self, request, response):
+        stats = _request_stats()
+        if stats is not None:
+            # Response de DRF: la vista ya terminó y falta el render
+            stats.view_finished()
+            render_started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time += time.perf_counter() - render_started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _finish(self, request, response, stats, timing, metrics):
+        stats.view_finished()
+        total = time.perf_counter() - stats.started
+        if timing:
+            if not response.streaming:
+                response['Server-Timing'] = stats.server_timing(total)
+                response['X-Query-Count'] = str(stats.queries)
+            logger.info(json.dumps(stats.as_log(request, response, total), default=str))
+        if metrics:
+            prometheus.observe_request(request, response, stats, total)
+        return response
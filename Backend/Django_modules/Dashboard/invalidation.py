@@ -0,0 +1,222 @@
+"""Bus de invalidación de cachés en memoria entre workers (LISTEN/NOTIFY).
+
+Cada escritura de Ventas, VentaItem, Productos, Clientes, Tasa o Store
+publica en su BD (canal `dashboard_invalidation`):
+
+    {"alias": "default", "model": "Dashboard.Ventas", "version": 123456}
+
+`version` es el id de la transacción que escribió (null en autocommit).
+Postgres entrega el NOTIFY solo al confirmar, así que un rollback no invalida
+nada, y publish() lo emite una sola vez por modelo y transacción: una venta
+con N ítems cuesta un aviso por modelo, no uno por fila.
+
+Cada worker escucha con un hilo y una conexión por BD de tienda y, al recibir
+un aviso, sube la generación local de (alias, modelo) y llama a los
+receptores registrados con `subscribe()`. El worker que escribe lo aplica
+además al confirmar, sin esperar a su propio NOTIFY.
+
+Las cachés comparan la generación con la que calcularon cada entrada
+(`generation()`): AggregateCache en coalesce.py, y el registro de tiendas
+se refresca con un receptor (stores.store_invalidated). Mientras el listener
+de un alias no está conectado AggregateCache no guarda nada para ese alias
+(no se sabría cuándo invalidarlo), y al (re)conectar se invalida todo el
+alias por los avisos perdidos.
+
+Los listeners se activan con `enable()` desde wsgi.py/asgi.py (no en tests ni
+comandos) y con INVALIDATION_BUS=0 se desactivan.
+"""
+
+import json
+import logging
+import os
+import threading
+from functools import partial
+
+import psycopg
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import stores
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'dashboard_invalidation'
+MODELS = ('Dashboard.Ventas', 'Dashboard.VentaItem', 'Dashboard.Productos',
+          'Dashboard.Clientes', 'Dashboard.Tasa', 'Dashboard.Store')
+
+_lock = threading.RLock()
+_generations = {}       # (alias, modelo) -> generación local
+_receivers = []
+_listeners = {}         # alias -> _Listener
+_enabled = False
+_pid = None
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+def publish(using, model):
+    """Avisa a todos los workers que `model` cambió en la BD `using`.
+
+    Una vez por (alias, modelo) y transacción: si ya hay un apply pendiente
+    de confirmar para el par, el NOTIFY ya está encolado. Si el savepoint que
+    lo publicó se deshace, Django descarta el callback y Postgres el NOTIFY,
+    así que la siguiente escritura vuelve a publicar.
+    """
+    label = _label(model)
+    connection = connections[using]
+    if connection.in_atomic_block and _pending(connection, using, label):
+        return
+    if connection.vendor != 'postgresql' or not getattr(settings, 'INVALIDATION_BUS', True):
+        transaction.on_commit(partial(apply, using, label), using=using)
+        return
+    with connection.cursor() as cursor:
+        # _if_assigned: en autocommit no gasta un xid solo para el aviso (version null)
+        cursor.execute(
+            "SELECT pg_notify(%s, json_build_object('alias', %s::text, 'model', %s::text, "
+            "'version', pg_current_xact_id_if_assigned()::text::bigint)::text), "
+            "pg_current_xact_id_if_assigned()::text::bigint",
+            [CHANNEL, using, label])
+        version = cursor.fetchone()[1]
+    transaction.on_commit(partial(apply, using, label, version), using=using)
+
+
+def _pending(connection, using, label):
+    return any(isinstance(func, partial) and func.func is apply and func.args[:2] == (using, label)
+               for _, func, _ in connection.run_on_commit)
+
+
+def model_changed(sender, instance=None, using=None, **kwargs):
+    """Receptor de post_save/post_delete de los modelos de MODELS."""
+    publish(using or instance._state.db, sender)
+
+
+def apply(alias, model, version=None):
+    """Invalida (alias, modelo) en este worker."""
+    label = _label(model)
+    with _lock:
+        _generations[(alias, label)] = _generations.get((alias, label), 0) + 1
+        receivers = list(_receivers)
+    for receiver in receivers:
+        try:
+            receiver(alias, label, version)
+        except Exception:
+            logger.exception("Receptor de invalidación %r falló", receiver)
+
+
+def apply_all(alias):
+    for label in MODELS:
+        apply(alias, label)
+
+
+def generation(alias, models):
+    with _lock:
+        return tuple(_generations.get((alias, _label(m)), 0) for m in models)
+
+
+def subscribe(receiver):
+    """Registra receiver(alias, modelo, version) para cada invalidación."""
+    with _lock:
+        if receiver not in _receivers:
+            _receivers.append(receiver)
+
+
+def unsubscribe(receiver):
+    with _lock:
+        if receiver in _receivers:
+            _receivers.remove(receiver)
+
+
+# Listeners
+
+class _Listener(threading.Thread):
+    def __init__(self, entry):
+        super().__init__(name=f'invalidation-{entry.alias}', daemon=True)
+        self.entry = entry
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        delay = 1
+        while not self.stopped.is_set():
+            try:
+                with psycopg.connect(autocommit=True, **stores.connection_params(self.entry)) as conn:
+                    conn.execute(f'LISTEN {CHANNEL}')
+                    # Lo cacheado antes de escuchar pudo perder avisos
+                    apply_all(self.entry.alias)
+                    self.connected.set()
+                    delay = 1
+                    while not self.stopped.is_set():
+                        for notification in conn.notifies(timeout=1.0):
+                            self.received(notification.payload)
+            except Exception as exc:
+                if self.stopped.is_set():
+                    break
+                logger.warning("LISTEN %s en %s falló (%s); reintento en %ss",
+                               CHANNEL, self.entry.alias, exc, delay)
+            finally:
+                if self.connected.is_set():
+                    self.connected.clear()
+                    apply_all(self.entry.alias)
+            self.stopped.wait(delay)
+            delay = min(delay * 2, 30)
+
+    def received(self, payload):
+        try:
+            data = json.loads(payload)
+            model, version = data['model'], data.get('version')
+        except (ValueError, KeyError, TypeError):
+            logger.warning("NOTIFY %s con payload inválido: %.200s", CHANNEL, payload)
+            return
+        # El alias del aviso es el del worker que escribió; aquí vale el de esta conexión
+        apply(self.entry.alias, model, version)
+
+
+def enable():
+    """Activa los listeners en este proceso y arranca los de las tiendas de settings."""
+    global _enabled
+    if not getattr(settings, 'INVALIDATION_BUS', True):
+        return
+    _enabled = True
+    for entry in stores.configured_stores():
+        ensure_listening(entry)
+
+
+def ensure_listening(entry):
+    """Arranca (una vez por proceso) el listener de la BD de la tienda."""
+    global _pid
+    if not _enabled:
+        return
+    pid = os.getpid()
+    with _lock:
+        if _pid != pid:
+            # Tras un fork los hilos del padre no existen
+            _listeners.clear()
+            _pid = pid
+        listener = _listeners.get(entry.alias)
+        if listener is not None and listener.is_alive():
+            return
+        conf = entry.database if entry.dynamic else connections.settings.get(entry.alias, {})
+        if conf.get('ENGINE', '').endswith('postgresql'):
+            listener = _listeners[entry.alias] = _Listener(entry)
+            listener.start()
+
+
+def listening(alias):
+    listener = _listeners.get(alias)
+    return listener is not None and _pid == os.getpid() and listener.connected.is_set()
+
+
+def stop():
+    """Detiene los listeners de este proceso (tests)."""
+    global _enabled
+    _enabled = False
+    with _lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stopped.set()
+    for listener in listeners:
+        listener.join(timeout=5)
+
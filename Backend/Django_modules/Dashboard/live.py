@@ -0,0 +1,249 @@
+"""Eventos en vivo del dashboard (SSE) con LISTEN/NOTIFY de PostgreSQL.
+
+Las escrituras de ventas publican eventos compactos con `notify()` (pg_notify
+dentro de la misma transacción: Postgres los entrega solo al confirmar):
+
+    {"t": "venta", "id": 10, "estado": "completada", "total": "31.10", "cliente": 4}
+    {"t": "estado", "id": 10, "estado": "cancelada", "antes": "completada"}
+    {"t": "item", "venta": 10, "producto": 7, "cantidad": 2}
+    {"t": "stock", "id": 7, "stock": 48, "antes": 50}
+
+En cada worker (un event loop) hay una sola conexión LISTEN por BD de tienda,
+abierta con el primer suscriptor y cerrada con el último; cada evento se
+reparte a las colas de todos los suscriptores de esa tienda. Tras una ráfaga
+de eventos (LIVE_METRICS_DEBOUNCE) se recalculan las métricas del día una vez
+por tienda y se envía la diferencia con el envío anterior:
+
+    {"ingresos_hoy": "310.00", "ventas_hoy": 12, "top": [...],
+     "delta": {"ingresos_hoy": "31.10", "ventas_hoy": 1, "top": true}}
+
+El endpoint es /api/live/ (con prefijo de tienda) y requiere ASGI: bajo
+WSGI cada conexión abierta ocuparía un hilo.
+"""
+
+import asyncio
+import json
+import logging
+import weakref
+from decimal import Decimal
+from itertools import count
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import stores
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'dashboard_live'
+# Eventos pendientes por suscriptor; si se llena (cliente lento) se vacía la
+# cola y se le envía "resync" para que recargue
+QUEUE_SIZE = 200
+TOP_LIMIT = 5
+
+
+def notify(using, event):
+    """Publica `event` en el canal de la BD `using` (se entrega al confirmar)."""
+    if not getattr(settings, 'LIVE_EVENTS', True):
+        return
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    payload = json.dumps(event, default=str, separators=(',', ':'))
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+
+
+def today_metrics(alias):
+    """Ingresos y cantidad de ventas completadas de hoy, y top de productos por unidades."""
+    from .models import Productos, Ventas, VentaItem
+    start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    totals = (Ventas.objects.using(alias)
+              .filter(estado=Ventas.ESTADO_COMPLETADA, fecha__gte=start)
+              .aggregate(ingresos=Sum('precio_total'), ventas=Count('id')))
+    top = list(VentaItem.objects.using(alias)
+               .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=start)
+               .values('producto_id').annotate(unidades=Sum('cantidad'))
+               .order_by('-unidades', 'producto_id')[:TOP_LIMIT])
+    names = dict(Productos.objects.using(alias)
+                 .filter(pk__in=[r['producto_id'] for r in top]).values_list('id', 'nombre'))
+    return {
+        'ingresos_hoy': totals['ingresos'] or Decimal('0'),
+        'ventas_hoy': totals['ventas'],
+        'top': [{'producto_id': r['producto_id'], 'producto': names.get(r['producto_id']),
+                 'unidades': r['unidades']} for r in top],
+    }
+
+
+def metrics_delta(previous, current):
+    """Evento de métricas: valores actuales y diferencia con `previous` (None si no hay)."""
+    event = {
+        'ingresos_hoy': str(current['ingresos_hoy']),
+        'ventas_hoy': current['ventas_hoy'],
+        'top': current['top'],
+    }
+    if previous is not None:
+        event['delta'] = {
+            'ingresos_hoy': str(current['ingresos_hoy'] - previous['ingresos_hoy']),
+            'ventas_hoy': current['ventas_hoy'] - previous['ventas_hoy'],
+            # ¿cambió el orden o las unidades del top?
+            'top': current['top'] != previous['top'],
+        }
+    return event
+
+
+class _Feed:
+    """Conexión LISTEN de una tienda y sus suscriptores en este worker."""
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.queues = set()
+        self.task = None
+        self.metrics = None     # últimas métricas enviadas
+        self.refresh = None     # recálculo de métricas programado
+        self.refreshing = False  # recálculo en curso
+        self.dirty = False      # llegó un NOTIFY durante el recálculo en curso
+        self.ids = count(1)
+
+
+class LiveHub:
+    """Reparte los NOTIFY de cada tienda a sus suscriptores SSE (uno por event loop)."""
+
+    def __init__(self):
+        self._feeds = {}
+
+    def subscribe(self, entry):
+        feed = self._feeds.get(entry.alias)
+        if feed is None:
+            feed = self._feeds[entry.alias] = _Feed(entry)
+            feed.task = asyncio.get_running_loop().create_task(self._listen(feed))
+        queue = asyncio.Queue(QUEUE_SIZE)
+        feed.queues.add(queue)
+        if feed.metrics is not None:
+            # El nuevo suscriptor arranca con las métricas completas
+            self._put(queue, self._message(feed, 'metrics', metrics_delta(None, feed.metrics)))
+        return queue
+
+    def unsubscribe(self, entry, queue):
+        feed = self._feeds.get(entry.alias)
+        if feed is None:
+            return
+        feed.queues.discard(queue)
+        if not feed.queues:
+            self._feeds.pop(entry.alias, None)
+            feed.task.cancel()
+            if feed.refresh is not None:
+                feed.refresh.cancel()
+
+    def subscribers(self, alias):
+        feed = self._feeds.get(alias)
+        return len(feed.queues) if feed is not None else 0
+
+    async def _listen(self, feed):
+        delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                        autocommit=True, **stores.connection_params(feed.entry)) as conn:
+                    await conn.execute(f'LISTEN {CHANNEL}')
+                    delay = 1
+                    # (Re)conexión: pudo perderse algo, métricas completas
+                    self._schedule_metrics(feed, 0)
+                    async for notification in conn.notifies():
+                        self.dispatch(feed.entry.alias, notification.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("LISTEN %s en %s falló (%s); reintento en %ss",
+                               CHANNEL, feed.entry.alias, exc, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def dispatch(self, alias, payload):
+        """Reparte un NOTIFY recibido y programa el recálculo de métricas."""
+        feed = self._feeds.get(alias)
+        if feed is None:
+            return
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("NOTIFY %s con payload inválido: %.200s", CHANNEL, payload)
+            return
+        self._broadcast(feed, self._message(feed, 'change', event))
+        self._schedule_metrics(feed, getattr(settings, 'LIVE_METRICS_DEBOUNCE', 1.0))
+
+    def _schedule_metrics(self, feed, delay):
+        if feed.refresh is not None:
+            return
+        if feed.refreshing:
+            # El recálculo en curso pudo leer antes de este cambio: repetir al terminar
+            feed.dirty = True
+            return
+        loop = asyncio.get_running_loop()
+        feed.refresh = loop.call_later(
+            delay, lambda: loop.create_task(self._refresh_metrics(feed)))
+
+    async def _refresh_metrics(self, feed):
+        feed.refresh = None
+        feed.refreshing = True
+        try:
+            current = await sync_to_async(self._metrics_for)(feed.entry)
+        except Exception as exc:
+            logger.warning("Métricas en vivo de %s fallaron: %s", feed.entry.alias, exc)
+            return
+        finally:
+            feed.refreshing = False
+            if feed.dirty and feed.queues:
+                feed.dirty = False
+                self._schedule_metrics(feed, getattr(settings, 'LIVE_METRICS_DEBOUNCE', 1.0))
+        if current == feed.metrics:
+            return
+        event = metrics_delta(feed.metrics, current)
+        feed.metrics = current
+        self._broadcast(feed, self._message(feed, 'metrics', event))
+
+    @staticmethod
+    def _metrics_for(entry):
+        stores.acquire(entry)
+        try:
+            return today_metrics(entry.alias)
+        finally:
+            stores.release(entry)
+
+    @staticmethod
+    def _message(feed, kind, data):
+        return next(feed.ids), kind, data
+
+    def _broadcast(self, feed, message):
+        for queue in feed.queues:
+            self._put(queue, message)
+
+    @staticmethod
+    def _put(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait((message[0], 'resync', {}))
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def hub():
+    """LiveHub del event loop actual (uno por worker ASGI)."""
+    loop = asyncio.get_running_loop()
+    instance = _hubs.get(loop)
+    if instance is None:
+        instance = _hubs[loop] = LiveHub()
+    return instance
+
+
+def sse_message(message):
+    event_id, kind, data = message
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,419 @@
+"""Prueba de carga con la mezcla de tráfico del frontend (`manage.py carga`).
+
+Cada usuario virtual (un hilo) repite acciones elegidas al azar según MIX,
+con una pausa exponencial de media `think` segundos entre ellas:
+
+- dashboard: /profile/ y luego, en paralelo (como el navegador, hasta
+  `fanout` conexiones), las métricas que piden las tarjetas y gráficos de
+  Dashboard.tsx, con el periodo anterior de las que comparan.
+- listas: uno de los listados que cargan las páginas (sin paginación en la
+  API: el listado completo, como lo pide el frontend).
+- ia: productos y recomendaciones guardadas, y POST /ai/recommendations/.
+- exportaciones: CSV de ventas de los últimos 30 días o PDF de productos.
+
+Se mide cada petición (latencia hasta leer el cuerpo completo, status,
+bytes) y cada acción completa; el reporte da por endpoint peticiones por
+segundo, p50/p95/p99 y tasa de errores (status >= 400 o error de conexión).
+
+Las peticiones son HTTP reales (http.client, una conexión keep-alive por hilo)
+contra `base_url`: un servidor externo o el que el comando levanta en el
+propio proceso (serve()), que apunta el cliente de Gemini al servidor
+simulado (services/gemini_standin.py): las acciones de IA recorren el SDK
+real sin salir a la API.
+"""
+
+import contextlib
+import http.client
+import json
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .bench import percentile
+
+REPORT_VERSION = 1
+# Las conexiones que un navegador abre en paralelo por origen
+FANOUT = 6
+
+# nombre en el reporte, url name, método, query params, cuerpo JSON
+Peticion = namedtuple('Peticion', 'name url_name method params data', defaults=('GET', None, None))
+
+
+def _month(anchor, back=0):
+    first = anchor.replace(day=1)
+    for _ in range(back):
+        first = (first - timedelta(days=1)).replace(day=1)
+    return first.strftime('%Y-%m')
+
+
+def dashboard(rng, anchor):
+    year = str(anchor.year)
+    metrics = [
+        Peticion('sales-monthly', 'sales-monthly', params={'months': '2'}),
+        Peticion('customers-monthly', 'customers-monthly', params={'months': '2'}),
+        Peticion('sales-monthly', 'sales-monthly', params={'year': year}),
+        Peticion('sales-monthly', 'sales-monthly', params={'year': str(anchor.year - 1)}),
+        Peticion('revenue-by-category', 'revenue-by-category', params={'year': year}),
+        Peticion('revenue-by-category', 'revenue-by-category', params={'year': str(anchor.year - 1)}),
+        Peticion('revenue-by-category', 'revenue-by-category', params={'days': '30'}),
+        Peticion('top-products', 'top-products',
+                 params={'limit': '5', 'sort': rng.choice(('units', 'revenue')), 'year': year}),
+        Peticion('top-customers-monthly', 'top-customers-monthly', params={'months': '12', 'limit': '5'}),
+        Peticion('top-categories-monthly', 'top-categories-monthly', params={'limit': '6', 'year': year}),
+        Peticion('sales-heatmap', 'sales-heatmap', params={'month': _month(anchor, rng.randrange(3))}),
+    ]
+    return [[Peticion('profile', 'profile')], metrics]
+
+
+def listas(rng, anchor):
+    name = rng.choice(('ventas-list', 'productos-list', 'clientes-list', 'recomendacionia-list'))
+    return [[Peticion(name, name)]]
+
+
+def ia(rng, anchor):
+    return [
+        [Peticion('productos-list', 'productos-list'),
+         Peticion('recomendacionia-list', 'recomendacionia-list')],
+        [Peticion('ai-recommendations', 'ai-recommendations', 'POST', data={'limit': 20})],
+    ]
+
+
+def exportaciones(rng, anchor):
+    if rng.random() < 0.7:
+        params = {'tipo': 'ventas', 'columns': 'fecha,cliente,total,estado',
+                  'date_from': (anchor - timedelta(days=30)).isoformat(),
+                  'date_to': anchor.isoformat()}
+        return [[Peticion('export-csv-ventas', 'export-csv', params=params)]]
+    params = {'tipo': 'productos', 'months': '12', 'top': '5', 'count': '10'}
+    return [[Peticion('export-pdf-productos', 'export-pdf', params=params)]]
+
+
+SCENARIOS = {'dashboard': dashboard, 'listas': listas, 'ia': ia, 'exportaciones': exportaciones}
+# Peso de cada acción (abrir el dashboard domina a primera hora)
+MIX = {'dashboard': 60, 'listas': 25, 'ia': 5, 'exportaciones': 10}
+
+
+def parse_mix(text):
+    """'dashboard=6,ia=1' -> {'dashboard': 6, 'ia': 1}; ValueError si no es válida."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, sep, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS or not sep:
+            raise ValueError(f"Acción desconocida o sin peso: {part!r} (válidas: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight)
+        if mix[name] < 0:
+            raise ValueError(f"Peso negativo: {part!r}")
+    if not any(mix.values()):
+        raise ValueError("La mezcla no tiene ninguna acción con peso")
+    return mix
+
+
+# Destino
+
+class Target:
+    """Servidor, tienda y credenciales de la prueba.
+
+    `token_source` es una función que devuelve un access token JWT; se
+    vuelve a pedir (una vez por respuesta 401) si caduca durante la prueba.
+    `cookie` es la cookie de sesión que también manda el navegador (la
+    exportación PDF es una vista Django sin JWT).
+    """
+
+    def __init__(self, base_url, slug=None, token_source=None):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"URL inválida: {base_url!r}")
+        self.scheme, self.host = parts.scheme, parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.slug = slug
+        self.token_source = token_source
+        self.cookie = None
+        self._token = None
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def path(self, url_name):
+        if url_name not in self._paths:
+            path = reverse(url_name)
+            if self.slug:
+                path = f'/api/s/{self.slug}/' + path[len('/api/'):]
+            self._paths[url_name] = path
+        return self._paths[url_name]
+
+    def token(self, stale=None):
+        with self._lock:
+            if self._token is None or self._token == stale:
+                self._token = self.token_source()
+            return self._token
+
+    def connection(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=120)
+
+
+def password_token(target, username, password):
+    """token_source que pide un access token a /api/token/ de la tienda."""
+    def fetch():
+        body = json.dumps({'username': username, 'password': password})
+        conn = target.connection()
+        try:
+            conn.request('POST', target.path('token_obtain_pair'), body=body,
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise ValueError(f"No se pudo obtener el token ({response.status}): {data[:200]!r}")
+        return json.loads(data)['access']
+    return fetch
+
+
+def admin_session(target, username, password):
+    """Cookie de sesión tras iniciar sesión en /admin/login/ (con la tienda en X-Store)."""
+    path = reverse('admin:login')
+    headers = {'X-Store': target.slug} if target.slug else {}
+    conn = target.connection()
+    try:
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        cookies = SimpleCookie(', '.join(response.headers.get_all('Set-Cookie') or []))
+        csrf = cookies[settings.CSRF_COOKIE_NAME].value if settings.CSRF_COOKIE_NAME in cookies else ''
+        body = urlencode({'username': username, 'password': password,
+                          'csrfmiddlewaretoken': csrf, 'next': path})
+        conn.request('POST', path, body=body, headers=dict(
+            headers, Cookie=f'{settings.CSRF_COOKIE_NAME}={csrf}', Referer=f'{target.scheme}://{target.host}:{target.port}{path}',
+            **{'Content-Type': 'application/x-www-form-urlencoded'}))
+        response = conn.getresponse()
+        response.read()
+        cookies = SimpleCookie(', '.join(response.headers.get_all('Set-Cookie') or []))
+    finally:
+        conn.close()
+    name = settings.SESSION_COOKIE_NAME
+    if name not in cookies:
+        raise ValueError(f"No se pudo iniciar sesión en {path} ({response.status})")
+    return f'{name}={cookies[name].value}'
+
+
+# Registro de resultados
+
+class Recorder:
+    """Latencias, status y errores por endpoint y por acción (varios hilos)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.actions = {}
+
+    def request(self, name, ms, status, size=0, error=None):
+        with self._lock:
+            entry = self.requests.setdefault(name, {'ms': [], 'status': {}, 'errors': {}, 'bytes': 0})
+            entry['ms'].append(ms)
+            entry['bytes'] += size
+            key = str(status) if status else 'conexión'
+            entry['status'][key] = entry['status'].get(key, 0) + 1
+            if error:
+                entry['errors'][error] = entry['errors'].get(error, 0) + 1
+
+    def action(self, name, ms, failed):
+        with self._lock:
+            entry = self.actions.setdefault(name, {'ms': [], 'failed': 0})
+            entry['ms'].append(ms)
+            entry['failed'] += bool(failed)
+
+
+def _summary(timings, failed, elapsed):
+    return {
+        'count': len(timings),
+        'rps': round(len(timings) / elapsed, 2) if elapsed else None,
+        'errors': failed,
+        'error_rate': round(failed / len(timings), 4) if timings else 0.0,
+        'p50_ms': round(percentile(timings, 50), 1),
+        'p95_ms': round(percentile(timings, 95), 1),
+        'p99_ms': round(percentile(timings, 99), 1),
+        'max_ms': round(max(timings), 1),
+    }
+
+
+def report(recorder, elapsed, config):
+    endpoints = {}
+    for name, entry in sorted(recorder.requests.items()):
+        failed = sum(n for status, n in entry['status'].items()
+                     if status == 'conexión' or int(status) >= 400)
+        endpoints[name] = dict(_summary(entry['ms'], failed, elapsed),
+                               status=entry['status'], errors_by_type=entry['errors'],
+                               bytes=entry['bytes'])
+    timings = [ms for entry in recorder.requests.values() for ms in entry['ms']]
+    total = _summary(timings, sum(e['errors'] for e in endpoints.values()), elapsed) if timings else None
+    return {
+        'version': REPORT_VERSION,
+        'config': config,
+        'elapsed_s': round(elapsed, 2),
+        'total': total,
+        'endpoints': endpoints,
+        'actions': {name: _summary(entry['ms'], entry['failed'], elapsed)
+                    for name, entry in sorted(recorder.actions.items())},
+    }
+
+
+# Usuarios virtuales
+
+class VirtualUser:
+    def __init__(self, target, recorder, rng, anchor, fanout):
+        self.target = target
+        self.recorder = recorder
+        self.rng = rng
+        self.anchor = anchor
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=fanout, thread_name_prefix='carga-fanout')
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def run_action(self, name):
+        started = time.perf_counter()
+        failed = False
+        for step in SCENARIOS[name](self.rng, self.anchor):
+            if len(step) == 1:
+                ok = [self.send(step[0])]
+            else:
+                ok = list(self._pool.map(self.send, step))
+            failed = failed or not all(ok)
+        self.recorder.action(name, (time.perf_counter() - started) * 1000, failed)
+
+    def send(self, peticion):
+        """Hace la petición y la registra; True si respondió sin error."""
+        path = self.target.path(peticion.url_name)
+        if peticion.params:
+            path = f'{path}?{urlencode(peticion.params)}'
+        body = json.dumps(peticion.data) if peticion.data is not None else None
+        started = time.perf_counter()
+        status, size, error = 0, 0, None
+        try:
+            token = self.target.token()
+            status, size = self._exchange(peticion.method, path, body, token)
+            if status == 401:
+                status, size = self._exchange(peticion.method, path, body, self.target.token(stale=token))
+        except Exception as exc:
+            error = type(exc).__name__
+        ms = (time.perf_counter() - started) * 1000
+        self.recorder.request(peticion.name, ms, status, size, error)
+        return error is None and status < 400
+
+    def _exchange(self, method, path, body, token):
+        headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+        if self.target.cookie:
+            headers['Cookie'] = self.target.cookie
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            conn = getattr(self._local, 'conn', None)
+            reused = conn is not None
+            if conn is None:
+                conn = self._local.conn = self.target.connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                size = len(response.read())
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                self._local.conn = None
+                # El servidor cerró una conexión keep-alive ociosa: reintentar una vez
+                if reused and attempt == 1:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+                self._local.conn = None
+            return response.status, size
+
+
+def run(target, mix=None, users=20, duration=60.0, think=1.0, ramp=0.0, fanout=FANOUT,
+        seed=0, anchor=None, progress=None):
+    """Lanza `users` usuarios virtuales durante `duration` segundos y devuelve el reporte.
+
+    `progress(segundos, recorder)` se llama cada ~5 s desde el hilo principal.
+    """
+    mix = mix or MIX
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    anchor = anchor or timezone.now()
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def user_loop(index):
+        rng = random.Random(seed * 1_000_003 + index)
+        user = VirtualUser(target, recorder, rng, anchor, fanout)
+        try:
+            # Arranque escalonado a lo largo de `ramp` segundos
+            _sleep_until(min(deadline, started + ramp * index / max(1, users)))
+            while time.perf_counter() < deadline:
+                user.run_action(rng.choices(names, weights)[0])
+                if think > 0:
+                    _sleep_until(min(deadline, time.perf_counter() + rng.expovariate(1 / think)))
+        finally:
+            user.close()
+
+    threads = [threading.Thread(target=user_loop, args=(i,), name=f'carga-{i}', daemon=True)
+               for i in range(users)]
+    for thread in threads:
+        thread.start()
+    while True:
+        alive = [thread for thread in threads if thread.is_alive()]
+        if not alive:
+            break
+        alive[0].join(timeout=5)
+        if progress is not None and time.perf_counter() < deadline:
+            progress(time.perf_counter() - started, recorder)
+    elapsed = time.perf_counter() - started
+    config = {'users': users, 'duration_s': duration, 'think_s': think, 'ramp_s': ramp,
+              'fanout': fanout, 'seed': seed, 'mix': mix,
+              'target': f'{target.scheme}://{target.host}:{target.port}', 'store': target.slug}
+    return report(recorder, elapsed, config)
+
+
+def _sleep_until(moment):
+    remaining = moment - time.perf_counter()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+# Servidor en proceso con Gemini simulado
+
+@contextlib.contextmanager
+def serve(gemini=None):
+    """Servidor WSGI multihilo de Django en 127.0.0.1 (puerto libre) y, para las
+    acciones de IA, el Gemini simulado de services/gemini_standin.py (kwargs de
+    GeminiStandIn en `gemini`). Produce (URL base, GeminiStandIn)."""
+    from django.core.servers.basehttp import (
+        ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application)
+    from django.test import override_settings
+
+    from .services.gemini_standin import GeminiStandIn
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+    server.set_app(get_internal_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, name='carga-servidor', daemon=True)
+    with GeminiStandIn(**(gemini or {})) as standin, override_settings(GEMINI_BASE_URL=standin.url):
+        thread.start()
+        try:
+            yield f'http://127.0.0.1:{server.server_address[1]}', standin
+        finally:
+            server.shutdown()
+            server.server_close()
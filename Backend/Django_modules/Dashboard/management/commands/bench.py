@@ -0,0 +1,148 @@
+import json
+import time
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+
+from Dashboard import bench
+from Dashboard.db_router import using_store
+
+
+class Command(BaseCommand):
+    help = ("Mide los endpoints de métricas, structured-*, listados y exportaciones sobre "
+            "datasets deterministas de 10k/100k/1M ventas en una BD aparte (tienda 'bench') "
+            "y escribe un reporte JSON comparable con una línea base.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escalas", type=str, default=",".join(bench.SCALES),
+                            help=f"Escalas separadas por comas ({', '.join(bench.SCALES)})")
+        parser.add_argument("--semilla", type=int, default=0,
+                            help="Semilla del generador de datos")
+        parser.add_argument("--ancla", type=str, default=None,
+                            help="Fecha (YYYY-MM-DD) desde la que se generan las ventas hacia atrás "
+                                 "(por defecto: hoy)")
+        parser.add_argument("--endpoints", type=str, default=None,
+                            help="Nombres de endpoints separados por comas (por defecto: todos)")
+        parser.add_argument("--repeticiones", type=int, default=10,
+                            help="Peticiones medidas por endpoint de métricas/structured")
+        parser.add_argument("--repeticiones-listas", type=int, default=3,
+                            help="Peticiones medidas por listado/exportación (sin paginar: "
+                                 "a 1M ventas cada una tarda)")
+        parser.add_argument("--regenerar", action="store_true",
+                            help="Volver a sembrar aunque la BD ya tenga el mismo dataset")
+        parser.add_argument("--salida", type=str, default="bench_report.json",
+                            help="Ruta del reporte JSON")
+        parser.add_argument("--linea-base", type=str, default=None,
+                            help="Reporte JSON con el que comparar")
+        parser.add_argument("--tolerancia", type=float, default=0.2,
+                            help="Aumento relativo de p50/p95 tolerado frente a la línea base")
+        parser.add_argument("--fallar-si-empeora", action="store_true",
+                            help="Terminar con error si algún endpoint empeora frente a la línea base")
+
+    def handle(self, *args, **options):
+        scales = [s.strip().lower() for s in options['escalas'].split(',') if s.strip()]
+        unknown = [s for s in scales if s not in bench.SCALES]
+        if unknown:
+            raise CommandError(f"Escala desconocida: {', '.join(unknown)}")
+        endpoints = bench.ENDPOINTS
+        if options.get('endpoints'):
+            wanted = {e.strip() for e in options['endpoints'].split(',') if e.strip()}
+            missing = wanted - {e[0] for e in endpoints}
+            if missing:
+                raise CommandError(f"Endpoint desconocido: {', '.join(sorted(missing))}")
+            endpoints = [e for e in endpoints if e[0] in wanted]
+        anchor = None
+        if options.get('ancla'):
+            try:
+                anchor = timezone.make_aware(datetime.strptime(options['ancla'], '%Y-%m-%d'),
+                                             timezone.utc)
+            except ValueError:
+                raise CommandError("--ancla debe tener el formato YYYY-MM-DD")
+        anchor = bench.day_anchor(anchor)
+        baseline = None
+        if options.get('linea_base'):
+            with open(options['linea_base'], encoding='utf-8') as fh:
+                baseline = json.load(fh)
+
+        try:
+            alias = bench.ensure_scratch_store()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        call_command('migrate', database=alias, interactive=False, verbosity=0)
+        client = self._client(alias)
+
+        report = {
+            'version': bench.REPORT_VERSION,
+            'generated_at': timezone.now().isoformat(),
+            'seed': options['semilla'],
+            'anchor': anchor.date().isoformat(),
+            'postgres': connections[alias].cursor().connection.info.server_version,
+            'scales': {},
+        }
+        for scale in scales:
+            sales = bench.SCALES[scale]
+            report['scales'][scale] = self._run_scale(
+                alias, client, scale, sales, endpoints, anchor, options)
+
+        with open(options['salida'], 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Reporte guardado en {options['salida']}"))
+
+        if baseline is not None:
+            self._compare(report, baseline, options)
+
+    def _client(self, alias):
+        # Usuario y sesión en la BD de la tienda bench (exportación PDF)
+        with using_store(alias):
+            user, _created = get_user_model().objects.get_or_create(
+                username='bench', defaults={'is_staff': True, 'is_superuser': True})
+            client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+            client.force_login(user)
+        return client
+
+    def _run_scale(self, alias, client, scale, sales, endpoints, anchor, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {scale} ({sales:,} ventas)"))
+        seed_seconds = None
+        signature = bench.signature(sales, options['semilla'], anchor)
+        if options['regenerar'] or bench.stored_signature(alias) != signature:
+            started = time.perf_counter()
+            bench.clear(alias)
+            items = bench.seed(alias, sales, seed=options['semilla'], anchor=anchor)
+            seed_seconds = round(time.perf_counter() - started, 1)
+            self.stdout.write(f"  sembrado: {sales:,} ventas, {items:,} items en {seed_seconds}s")
+        else:
+            self.stdout.write("  dataset reutilizado")
+
+        self.stdout.write(f"  {'endpoint':<28} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'consultas':>9} {'py MB':>7} {'rss MB':>7}")
+        results = {}
+        for name, url_name, params, kind in endpoints:
+            repetitions = options['repeticiones'] if kind in ('metrics', 'structured') \
+                else options['repeticiones_listas']
+            result = bench.run_endpoint(client, bench.store_path(url_name),
+                                 bench.endpoint_params(params, anchor), max(1, repetitions))
+            result['kind'] = kind
+            results[name] = result
+            line = (f"  {name:<28} {result['status']:>6} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+                    f"{result['queries']:>9} {result['py_peak_mb']:>7.1f} {result['max_rss_mb']:>7.1f}")
+            self.stdout.write(line if result['status'] == 200 else self.style.WARNING(line))
+        return {'sales': sales, 'seed_seconds': seed_seconds, 'endpoints': results}
+
+    def _compare(self, report, baseline, options):
+        rows = bench.compare(report, baseline, options['tolerancia'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== Comparación con {options['linea_base']}"))
+        worse = [r for r in rows if r[6]]
+        for scale, name, metric, before, after, change, is_worse in rows:
+            if not is_worse and abs(change) < options['tolerancia']:
+                continue
+            line = f"  {scale:<5} {name:<28} {metric:<8} {before:>10} -> {after:<10} ({change:+.0%})"
+            self.stdout.write(self.style.ERROR(line) if is_worse else self.style.SUCCESS(line))
+        if not worse:
+            self.stdout.write(self.style.SUCCESS("  Sin regresiones"))
+        elif options['fallar_si_empeora']:
+            raise CommandError(f"{len(worse)} métricas empeoraron frente a la línea base")
@@ -0,0 +1,186 @@
+import json
+import time
+import warnings
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Dashboard import bench, loadtest
+from Dashboard.db_router import using_store
+
+
+class Command(BaseCommand):
+    help = ("Prueba de carga con la mezcla de tráfico del frontend (dashboard, listados, IA y "
+            "exportaciones) y N usuarios concurrentes. Sin --url levanta un servidor en el propio "
+            "proceso sobre la tienda 'bench' de `manage.py bench` y con Gemini simulado.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", type=str, default=None,
+                            help="Servidor ya levantado (p. ej. http://127.0.0.1:8000); requiere "
+                                 "--usuario y --clave. Sin --url: servidor en proceso")
+        parser.add_argument("--tienda", type=str, default=None,
+                            help="Slug de la tienda (/api/s/<slug>/); por defecto 'bench' en el "
+                                 "servidor en proceso y /api/ con --url")
+        parser.add_argument("--usuario", type=str, default=None)
+        parser.add_argument("--clave", type=str, default=None)
+        parser.add_argument("--usuarios", type=int, default=20,
+                            help="Usuarios virtuales concurrentes")
+        parser.add_argument("--duracion", type=float, default=60,
+                            help="Segundos de prueba")
+        parser.add_argument("--rampa", type=float, default=10,
+                            help="Segundos en los que se van incorporando los usuarios")
+        parser.add_argument("--pausa", type=float, default=1.0,
+                            help="Pausa media entre acciones de un usuario, en segundos (0: sin pausa)")
+        parser.add_argument("--paralelas", type=int, default=loadtest.FANOUT,
+                            help="Peticiones en paralelo por usuario al cargar el dashboard")
+        parser.add_argument("--mezcla", type=str, default=None,
+                            help="Pesos de las acciones, p. ej. 'dashboard=6,listas=2,ia=1,exportaciones=1' "
+                                 f"(por defecto {','.join(f'{k}={v}' for k, v in loadtest.MIX.items())})")
+        parser.add_argument("--semilla", type=int, default=0,
+                            help="Semilla de las acciones (y del dataset en proceso)")
+        parser.add_argument("--escala", type=str, default="10k",
+                            help=f"Dataset del servidor en proceso ({', '.join(bench.SCALES)})")
+        parser.add_argument("--regenerar", action="store_true",
+                            help="Volver a sembrar la tienda bench aunque ya tenga el dataset")
+        parser.add_argument("--ia-latencia-ms", type=float, default=800,
+                            help="Latencia de Gemini simulado en el servidor en proceso")
+        parser.add_argument("--ia-tasa-429", type=float, default=0.0,
+                            help="Fracción de llamadas a Gemini simulado que responden 429")
+        parser.add_argument("--ia-tasa-malformado", type=float, default=0.0,
+                            help="Fracción de respuestas de Gemini simulado con JSON roto")
+        parser.add_argument("--salida", type=str, default=None,
+                            help="Ruta del reporte JSON")
+        parser.add_argument("--max-errores", type=float, default=None,
+                            help="Terminar con error si la tasa de errores total la supera (0-1)")
+
+    def handle(self, *args, **options):
+        # Las vistas de métricas construyen límites de mes naive (ver bench.run_endpoint)
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='.*received a naive datetime', category=RuntimeWarning)
+            self._handle(options)
+
+    def _handle(self, options):
+        try:
+            mix = loadtest.parse_mix(options['mezcla']) if options.get('mezcla') else loadtest.MIX
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['usuarios'] < 1 or options['duracion'] <= 0 or options['paralelas'] < 1:
+            raise CommandError("--usuarios, --duracion y --paralelas deben ser positivos")
+        rates = (options['ia_tasa_429'], options['ia_tasa_malformado'])
+        if min(rates) < 0 or sum(rates) > 1:
+            raise CommandError("--ia-tasa-429 y --ia-tasa-malformado van de 0 a 1 y no pueden sumar más de 1")
+
+        if options.get('url'):
+            if not (options.get('usuario') and options.get('clave')):
+                raise CommandError("Con --url hacen falta --usuario y --clave")
+            result = self._run(options['url'], options['tienda'], mix, options, self._remote_auth)
+        else:
+            slug = self._prepare_bench(options)
+            gemini = {'latency': options['ia_latencia_ms'] / 1000, 'seed': options['semilla'],
+                      'rate_429': options['ia_tasa_429'], 'rate_malformed': options['ia_tasa_malformado']}
+            with loadtest.serve(gemini) as (url, standin):
+                self.stdout.write(f"Servidor en proceso: {url} (Gemini simulado en {standin.url}, "
+                                  f"{options['ia_latencia_ms']:.0f} ms)")
+                result = self._run(url, slug, mix, options, self._local_auth)
+            result['gemini'] = dict(standin.counts)
+
+        self._print(result)
+        if options.get('salida'):
+            with open(options['salida'], 'w', encoding='utf-8') as fh:
+                json.dump(result, fh, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Reporte guardado en {options['salida']}"))
+        total = result['total']
+        if total is None:
+            raise CommandError("No se completó ninguna petición")
+        if options.get('max_errores') is not None and total['error_rate'] > options['max_errores']:
+            raise CommandError(f"Tasa de errores {total['error_rate']:.1%} > {options['max_errores']:.1%}")
+
+    def _prepare_bench(self, options):
+        if options['escala'] not in bench.SCALES:
+            raise CommandError(f"Escala desconocida: {options['escala']}")
+        try:
+            alias = bench.ensure_scratch_store()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        call_command('migrate', database=alias, interactive=False, verbosity=0)
+        sales, anchor = bench.SCALES[options['escala']], bench.day_anchor()
+        if options['regenerar'] or bench.stored_signature(alias) != bench.signature(
+                sales, options['semilla'], anchor):
+            started = time.perf_counter()
+            bench.clear(alias)
+            items = bench.seed(alias, sales, seed=options['semilla'], anchor=anchor)
+            self.stdout.write(f"Sembrado: {sales:,} ventas, {items:,} items en "
+                              f"{time.perf_counter() - started:.1f}s")
+        with using_store(alias):
+            self._user, _created = get_user_model().objects.get_or_create(
+                username='carga', defaults={'is_staff': True, 'is_superuser': True})
+            client = Client()
+            client.force_login(self._user)
+            self._session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return options.get('tienda') or bench.SLUG
+
+    def _local_auth(self, target, options):
+        user = self._user
+        target.token_source = lambda: str(RefreshToken.for_user(user).access_token)
+        target.cookie = f'{settings.SESSION_COOKIE_NAME}={self._session}'
+
+    def _remote_auth(self, target, options):
+        target.token_source = loadtest.password_token(target, options['usuario'], options['clave'])
+        try:
+            target.cookie = loadtest.admin_session(target, options['usuario'], options['clave'])
+        except (OSError, ValueError) as exc:
+            # Solo la exportación PDF usa la sesión: sus peticiones contarán como 401
+            self.stderr.write(f"Sin sesión Django ({exc}); la exportación PDF fallará")
+
+    def _run(self, url, slug, mix, options, authenticate):
+        try:
+            target = loadtest.Target(url, slug=slug)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        try:
+            authenticate(target, options)
+            target.token()
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo autenticar contra {url}: {exc}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"== {options['usuarios']} usuarios, {options['duracion']:.0f}s, "
+            f"mezcla {', '.join(f'{k}={v:g}' for k, v in mix.items())}"))
+
+        def progress(seconds, recorder):
+            done = sum(len(e['ms']) for e in list(recorder.requests.values()))
+            self.stdout.write(f"  {seconds:5.0f}s  {done:,} peticiones")
+
+        return loadtest.run(
+            target, mix, users=options['usuarios'], duration=options['duracion'],
+            think=options['pausa'], ramp=options['rampa'], fanout=options['paralelas'],
+            seed=options['semilla'], progress=progress)
+
+    def _print(self, result):
+        header = (f"  {'':<26} {'peticiones':>10} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+                  f"{'p99 ms':>8} {'max ms':>8} {'errores':>8}")
+        for title, rows in (('Endpoints', result['endpoints']), ('Acciones', result['actions'])):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {title}"))
+            self.stdout.write(header)
+            for name, row in rows.items():
+                line = (f"  {name:<26} {row['count']:>10,} {row['rps']:>7.1f} {row['p50_ms']:>8.0f} "
+                        f"{row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {row['max_ms']:>8.0f} "
+                        f"{row['error_rate']:>8.1%}")
+                self.stdout.write(self.style.WARNING(line) if row['errors'] else line)
+                for status, count in sorted(row.get('status', {}).items()):
+                    if status == 'conexión' or int(status) >= 400:
+                        self.stdout.write(f"    {status}: {count}")
+        total = result['total']
+        if total:
+            self.stdout.write(self.style.SUCCESS(
+                f"Total: {total['count']:,} peticiones en {result['elapsed_s']:.0f}s "
+                f"({total['rps']:.1f} req/s), p95 {total['p95_ms']:.0f} ms, "
+                f"errores {total['error_rate']:.2%}"))
+        gemini = result.get('gemini')
+        if gemini:
+            self.stdout.write(f"Gemini simulado: {gemini['requests']} llamadas, {gemini['429']} 429, "
+                              f"{gemini['malformed']} con JSON roto")
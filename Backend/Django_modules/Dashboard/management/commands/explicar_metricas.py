@@ -0,0 +1,176 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+import json
+
+from Dashboard.db_router import using_store
+from Dashboard.models import Productos, Ventas, VentaItem
+
+
+# Endpoints de métricas a analizar: (nombre de la URL, query params por defecto)
+METRIC_ENDPOINTS = [
+    ('sales-monthly', {'months': '6'}),
+    ('sales-yearly', {'years': '5'}),
+    ('revenue-by-category', {'days': '30'}),
+    ('top-products', {'limit': '5'}),
+    ('customers-monthly', {'months': '7'}),
+    ('top-customers-monthly', {'months': '12'}),
+    ('top-categories-monthly', {'months': '12'}),
+    ('sales-heatmap', None),  # month=YYYY-MM actual, se calcula al ejecutar
+    ('returning-customers-rate', {}),
+    ('products-growth', {'days': '30'}),
+    ('structured-monthly', {'n_months': '6'}),
+    ('structured-by-product', {'days': '30'}),
+    ('structured-by-category', {'days': '30'}),
+]
+
+# Modelos cuyos índices declarados en Meta se comparan (con vs sin índices)
+INDEXED_MODELS = (Ventas, VentaItem, Productos)
+
+
+class Command(BaseCommand):
+    help = ("Muestra los planes EXPLAIN de las consultas de cada endpoint de métricas, "
+            "antes (sin los índices analíticos) y después (con los índices).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", type=str, default='default',
+                            help="Alias de BD a analizar (default, store_b, store_c)")
+        parser.add_argument("--endpoints", type=str, default=None,
+                            help="Nombres de endpoints separados por comas (ej: sales-monthly,top-products)")
+        parser.add_argument("--analyze", action="store_true",
+                            help="Usar EXPLAIN ANALYZE (ejecuta realmente las consultas)")
+        parser.add_argument("--planes", action="store_true",
+                            help="Imprimir los planes completos además del resumen")
+        parser.add_argument("--sin-comparar", action="store_true",
+                            help="No calcular el plan 'antes' (evita DROP INDEX temporal)")
+        parser.add_argument("--json", type=str, default=None,
+                            help="Ruta de un archivo donde guardar el reporte en JSON")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.databases:
+            raise CommandError(f"Alias de BD desconocido: {alias}")
+        if connections[alias].vendor != 'postgresql':
+            raise CommandError("Este comando requiere PostgreSQL")
+
+        endpoints = METRIC_ENDPOINTS
+        if options.get('endpoints'):
+            wanted = {e.strip()
+                      for e in options['endpoints'].split(',') if e.strip()}
+            endpoints = [e for e in METRIC_ENDPOINTS if e[0] in wanted]
+
+        # 1) Capturar las consultas SQL que ejecuta cada endpoint
+        captured = {}
+        for name, params in endpoints:
+            captured[name] = self._capture_queries(alias, name, params)
+
+        # 2) Planes con los índices actuales ("después")
+        after = self._explain_all(alias, captured, options['analyze'])
+
+        # 3) Planes sin los índices analíticos ("antes"): se eliminan dentro de
+        # una transacción que luego se revierte. DROP INDEX toma un lock
+        # exclusivo sobre la tabla mientras dura el análisis: usar en una copia.
+        before = None
+        if not options['sin_comparar']:
+            with transaction.atomic(using=alias):
+                with connections[alias].cursor() as cursor:
+                    for index_name in self._index_names():
+                        cursor.execute(
+                            f'DROP INDEX IF EXISTS "{index_name}"')
+                before = self._explain_all(
+                    alias, captured, options['analyze'])
+                transaction.set_rollback(True, using=alias)
+
+        report = []
+        for name, _params in endpoints:
+            entry = {'endpoint': name, 'queries': []}
+            for idx, sql in enumerate(captured[name]):
+                q = {'sql': sql, 'after': after[name][idx]}
+                if before is not None:
+                    q['before'] = before[name][idx]
+                entry['queries'].append(q)
+            report.append(entry)
+            self._print_entry(entry, options['planes'])
+
+        if options.get('json'):
+            with open(options['json'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Reporte guardado en {options['json']}"))
+
+    def _index_names(self):
+        names = []
+        for model in INDEXED_MODELS:
+            names.extend(idx.name for idx in model._meta.indexes)
+        return names
+
+    def _capture_queries(self, alias, url_name, params):
+        if params is None:
+            params = {'month': timezone.now().strftime('%Y-%m')}
+        path = reverse(url_name)
+        match = resolve(path)
+        request = RequestFactory().get(path, params)
+        with using_store(alias):
+            with CaptureQueriesContext(connections[alias]) as ctx:
+                match.func(request, *match.args, **match.kwargs)
+        return [q['sql'] for q in ctx.captured_queries
+                if q['sql'].lstrip().upper().startswith('SELECT')]
+
+    def _explain_all(self, alias, captured, analyze):
+        out = {}
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' if analyze else 'EXPLAIN (FORMAT JSON) '
+        with connections[alias].cursor() as cursor:
+            for name, queries in captured.items():
+                plans = []
+                for sql in queries:
+                    cursor.execute(prefix + sql)
+                    raw = cursor.fetchone()[0]
+                    plan = raw if isinstance(raw, list) else json.loads(raw)
+                    plans.append(self._summarize(plan[0]))
+                out[name] = plans
+        return out
+
+    def _summarize(self, plan):
+        root = plan.get('Plan', {})
+        nodes = []
+
+        def walk(node):
+            label = node.get('Node Type', '')
+            if node.get('Index Name'):
+                label = f"{label} ({node['Index Name']})"
+            elif node.get('Relation Name'):
+                label = f"{label} ({node['Relation Name']})"
+            nodes.append(label)
+            for child in node.get('Plans', []) or []:
+                walk(child)
+
+        walk(root)
+        return {
+            'total_cost': root.get('Total Cost'),
+            'actual_time_ms': root.get('Actual Total Time'),
+            'nodes': nodes,
+        }
+
+    def _print_entry(self, entry, show_plans):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"== {entry['endpoint']} ({len(entry['queries'])} consultas)"))
+        total_before = total_after = 0.0
+        for q in entry['queries']:
+            total_after += q['after']['total_cost'] or 0
+            if 'before' in q:
+                total_before += q['before']['total_cost'] or 0
+            if show_plans:
+                self.stdout.write(f"  SQL: {q['sql'][:200]}")
+                if 'before' in q:
+                    self.stdout.write(
+                        f"    antes   cost={q['before']['total_cost']}: {' > '.join(q['before']['nodes'])}")
+                self.stdout.write(
+                    f"    después cost={q['after']['total_cost']}: {' > '.join(q['after']['nodes'])}")
+        if entry['queries'] and any('before' in q for q in entry['queries']):
+            self.stdout.write(
+                f"  costo total antes={total_before:.2f} después={total_after:.2f}")
+        else:
+            self.stdout.write(f"  costo total={total_after:.2f}")
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard.services.gemini_standin import GeminiStandIn
+
+
+def _rate(value):
+    rate = float(value)
+    if not 0 <= rate <= 1:
+        raise ValueError(value)
+    return rate
+
+
+class Command(BaseCommand):
+    help = ("Servidor local con la API de Gemini (generateContent) para medir latencia, "
+            "concurrencia y fallbacks sin salir a la API real. Apuntar el backend con "
+            "GEMINI_BASE_URL=http://<host>:<puerto>.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", type=str, default="127.0.0.1")
+        parser.add_argument("--puerto", type=int, default=8765)
+        parser.add_argument("--latencia-ms", type=float, default=800,
+                            help="Espera media por petición")
+        parser.add_argument("--variacion-ms", type=float, default=0,
+                            help="La espera es uniforme en latencia ± variación")
+        parser.add_argument("--tasa-429", type=_rate, default=0.0,
+                            help="Fracción de peticiones que responden 429 RESOURCE_EXHAUSTED (0-1)")
+        parser.add_argument("--tasa-malformado", type=_rate, default=0.0,
+                            help="Fracción de respuestas con JSON roto en el texto del modelo (0-1)")
+        parser.add_argument("--semilla", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['tasa_429'] + options['tasa_malformado'] > 1:
+            raise CommandError("--tasa-429 + --tasa-malformado no puede superar 1")
+        try:
+            standin = GeminiStandIn(
+                host=options['host'], port=options['puerto'],
+                latency=options['latencia_ms'] / 1000, jitter=options['variacion_ms'] / 1000,
+                rate_429=options['tasa_429'], rate_malformed=options['tasa_malformado'],
+                seed=options['semilla'])
+        except OSError as exc:
+            raise CommandError(f"No se pudo abrir {options['host']}:{options['puerto']}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Gemini simulado en {standin.url}"))
+        self.stdout.write(f"  export GEMINI_BASE_URL={standin.url}")
+        with standin:
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+        counts = standin.counts
+        self.stdout.write(f"{counts['requests']} peticiones: {counts['ok']} ok, {counts['429']} 429, "
+                          f"{counts['malformed']} JSON roto, {counts['bad_request']} inválidas")
@@ -10,6 +10,7 @@ from faker import Faker
 from django.conf import settings
 from django.core.management import call_command
 
+from Dashboard import invalidation
 from Dashboard.models import Clientes, Productos, Ventas, VentaItem, ModeloPrediccion, EntradaPrediccion, RecomendacionIA, Tasa, Store, UserProfile
 
 
@@ -132,7 +133,6 @@ class Command(BaseCommand):
                     fecha_registro=timezone.now().date(),
                     cantidad_compras=0,
                     tipo_cliente=random.choice(['nuevo', 'frecuente', 'vip']),
-                    display_id=1000 + i,  # Asignar display_id único
                 )
                 clientes.append(cliente)
 
@@ -303,10 +303,14 @@ class Command(BaseCommand):
                     p.estado = 'bajo'
                 else:
                     p.estado = 'disponible'
+                # bulk_update no aplica auto_now
+                p.actualizado_en = timezone.now()
                 productos_a_actualizar.append(p)
 
             Productos.objects.using(db_alias).bulk_update(productos_a_actualizar, [
-                'vendidos', 'stock', 'tendencias', 'estado'])
+                'vendidos', 'stock', 'tendencias', 'estado', 'actualizado_en'])
+            # bulk_update no emite señales: avisar a los workers
+            invalidation.publish(db_alias, Productos)
 
         for i, db_alias in enumerate(target_aliases):
             c_count = int(n_clientes * multipliers[i % len(multipliers)])
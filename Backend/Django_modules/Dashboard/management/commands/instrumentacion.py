@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard import instrumentation
+
+
+class Command(BaseCommand):
+    help = ("Activa o desactiva sin reiniciar las cabeceras Server-Timing/X-Query-Count "
+            "y el log Dashboard.timing (archivo settings.REQUEST_TIMING_FLAG, que los "
+            "workers del nodo releen cada REQUEST_TIMING_FLAG_TTL segundos).")
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("--activar", action="store_true")
+        group.add_argument("--desactivar", action="store_true")
+        group.add_argument("--restablecer", action="store_true",
+                           help="Borra el archivo: vuelve a mandar settings.REQUEST_TIMING")
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        if not getattr(settings, 'REQUEST_TIMING_FLAG', None):
+            raise CommandError("REQUEST_TIMING_FLAG no está configurado")
+        if options['activar']:
+            instrumentation.set_flag(True)
+        elif options['desactivar']:
+            instrumentation.set_flag(False)
+        elif options['restablecer']:
+            instrumentation.set_flag(None)
+        estado = 'activa' if instrumentation.enabled() else 'inactiva'
+        self.stdout.write(f"Instrumentación {estado} ({settings.REQUEST_TIMING_FLAG})")
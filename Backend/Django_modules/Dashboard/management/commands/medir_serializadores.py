@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Dashboard import views
+from Dashboard.db_router import using_store
+
+
+class Command(BaseCommand):
+    help = ("Compara filas/segundo de los listados de Clientes, Productos y Ventas: "
+            "ModelSerializer frente a los lectores de .values() (fast_serializers).")
+
+    RECURSOS = {
+        'clientes': views.Clientes_ViewSet,
+        'productos': views.Productos_ViewSet,
+        'ventas': views.Ventas_ViewSet,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", type=str, default="default",
+                            help="Alias de BD a medir")
+        parser.add_argument("--recursos", type=str, default=",".join(self.RECURSOS),
+                            help="Recursos separados por comas (clientes,productos,ventas)")
+        parser.add_argument("--repeticiones", type=int, default=5,
+                            help="Repeticiones por variante (se informa la mejor)")
+        parser.add_argument("--limite", type=int, default=None,
+                            help="Máximo de filas por listado (por defecto: todas)")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.settings:
+            raise CommandError(f"Alias de BD desconocido: {alias}")
+        recursos = [r.strip() for r in options['recursos'].split(',') if r.strip()]
+        unknown = [r for r in recursos if r not in self.RECURSOS]
+        if unknown:
+            raise CommandError(f"Recurso desconocido: {', '.join(unknown)}")
+        repeticiones = max(1, options['repeticiones'])
+        limite = options['limite']
+
+        self.stdout.write(f"{'recurso':<10} {'filas':>7} {'serializer ms':>14} "
+                          f"{'filas/s':>10} {'values ms':>10} {'filas/s':>10} {'x':>6}")
+        with using_store(alias):
+            for nombre in recursos:
+                viewset = self.RECURSOS[nombre]()
+                viewset.request = None
+                viewset.format_kwarg = None
+
+                def lento():
+                    # Queryset del serializer (anotado), no el del listado rápido
+                    viewset.action = 'retrieve'
+                    qs = viewset.get_queryset()
+                    qs = qs[:limite] if limite else qs
+                    return viewset.get_serializer_class()(qs, many=True).data
+
+                def rapido():
+                    viewset.action = 'list'
+                    reader = viewset.list_reader
+                    qs = reader.values(viewset.get_list_queryset())
+                    return reader.rows(qs[:limite] if limite else qs)
+
+                filas, t_lento = self._medir(lento, repeticiones)
+                _filas, t_rapido = self._medir(rapido, repeticiones)
+                self.stdout.write(
+                    f"{nombre:<10} {filas:>7} {t_lento * 1000:>14.1f} {self._rate(filas, t_lento):>10} "
+                    f"{t_rapido * 1000:>10.1f} {self._rate(filas, t_rapido):>10} "
+                    f"{(t_lento / t_rapido if t_rapido else 0):>6.1f}")
+
+    @staticmethod
+    def _medir(fn, repeticiones):
+        # Incluye la consulta: ambas variantes leen de la BD en cada repetición
+        mejor, filas = None, 0
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            filas = len(fn())
+            dur = time.perf_counter() - inicio
+            mejor = dur if mejor is None else min(mejor, dur)
+        return filas, mejor
+
+    @staticmethod
+    def _rate(filas, segundos):
+        return f"{filas / segundos:,.0f}" if segundos else '-'
@@ -0,0 +1,34 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard import stores
+
+
+class Command(BaseCommand):
+    help = ("Aplica las migraciones en la BD de cada tienda del registro "
+            "(settings.STORE_REGISTRY y tabla Store), incluidas las dinámicas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stores", type=str, default=None,
+                            help="Slugs separados por comas (por defecto: todas)")
+
+    def handle(self, *args, **options):
+        if options.get('stores'):
+            try:
+                entries = [stores.get_store(s.strip())
+                           for s in options['stores'].split(',') if s.strip()]
+            except stores.UnknownStore as exc:
+                raise CommandError(f"Tienda desconocida: {exc}")
+        else:
+            entries = stores.all_stores()
+
+        done = set()
+        for entry in entries:
+            if entry.alias in done:
+                continue
+            done.add(entry.alias)
+            alias = stores.activate(entry.slug)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Tienda {entry.slug} ({alias})"))
+            call_command('migrate', database=alias,
+                         interactive=False, verbosity=options['verbosity'])
@@ -0,0 +1,292 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from datetime import datetime
+import re
+
+from Dashboard.models import Ventas, VentaItem
+
+
+# Tablas particionadas por mes: (modelo, campo de fecha usado como clave)
+PARTITIONED = (
+    (Ventas, 'fecha'),
+    (VentaItem, 'venta_fecha'),
+)
+
+PARTITION_RE = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def _add_months(year, month, n):
+    idx = year * 12 + (month - 1) + n
+    return idx // 12, idx % 12 + 1
+
+
+def _month_bounds(year, month):
+    """Límites [inicio, fin) del mes en la zona horaria del proyecto."""
+    ny, nm = _add_months(year, month, 1)
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(ny, nm, 1))
+    return start, end
+
+
+class Command(BaseCommand):
+    help = ("Particionado mensual (PostgreSQL) de Ventas y VentaItem: convierte las tablas, "
+            "crea particiones futuras y desacopla/archiva las antiguas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", type=str, default='default',
+                            help="Alias de BD (default, store_b, store_c)")
+        parser.add_argument("--convertir", action="store_true",
+                            help="Convertir las tablas actuales en tablas particionadas por mes "
+                                 "(copia los datos; ejecutar con la tienda sin tráfico)")
+        parser.add_argument("--meses-futuros", type=int, default=3,
+                            help="Particiones a crear por delante del mes actual")
+        parser.add_argument("--desacoplar-antes", type=str, default=None,
+                            help="Desacoplar particiones anteriores a este mes (YYYY-MM)")
+        parser.add_argument("--archivar", action="store_true",
+                            help="Mover las particiones desacopladas al esquema de archivo")
+        parser.add_argument("--esquema-archivo", type=str, default='archivo',
+                            help="Esquema destino de las particiones archivadas")
+        parser.add_argument("--estado", action="store_true",
+                            help="Solo listar las particiones existentes")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.databases:
+            raise CommandError(f"Alias de BD desconocido: {alias}")
+        conn = connections[alias]
+        if conn.vendor != 'postgresql':
+            raise CommandError("El particionado requiere PostgreSQL")
+        self.qn = conn.ops.quote_name
+
+        cutoff = None
+        if options.get('desacoplar_antes'):
+            try:
+                d = datetime.strptime(options['desacoplar_antes'], '%Y-%m')
+            except ValueError:
+                raise CommandError("--desacoplar-antes debe tener formato YYYY-MM")
+            cutoff = (d.year, d.month)
+
+        with conn.cursor() as cursor:
+            if options['estado']:
+                for model, _col in PARTITIONED:
+                    self._print_status(cursor, model._meta.db_table)
+                return
+
+            if options['convertir']:
+                with transaction.atomic(using=alias):
+                    # Las FKs son DEFERRABLE: validar ya los eventos pendientes,
+                    # PostgreSQL no permite ALTER TABLE con triggers pendientes
+                    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                    self._fill_item_dates(cursor)
+                    for model, field in PARTITIONED:
+                        self._convert(cursor, model, field,
+                                      options['meses_futuros'])
+            for model, _field in PARTITIONED:
+                if not self._is_partitioned(cursor, model._meta.db_table):
+                    raise CommandError(
+                        f"{model._meta.db_table} no está particionada (usar --convertir)")
+
+            # Particiones del mes actual y los siguientes
+            now = timezone.localtime()
+            created = 0
+            with transaction.atomic(using=alias):
+                for n in range(options['meses_futuros'] + 1):
+                    year, month = _add_months(now.year, now.month, n)
+                    for model, field in PARTITIONED:
+                        if self._ensure_partition(cursor, model, field, year, month):
+                            created += 1
+            self.stdout.write(f"{alias}: {created} particiones creadas")
+
+            if cutoff is not None:
+                with transaction.atomic(using=alias):
+                    detached = self._detach_before(
+                        cursor, cutoff, options['archivar'], options['esquema_archivo'])
+                action = 'archivadas' if options['archivar'] else 'desacopladas'
+                self.stdout.write(f"{alias}: {len(detached)} particiones {action}")
+                for name in detached:
+                    self.stdout.write(f"  - {name}")
+
+        self.stdout.write(self.style.SUCCESS("Particionado completado"))
+
+    # --- helpers SQL ---
+
+    def _is_partitioned(self, cursor, table):
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [self.qn(table)])
+        return cursor.fetchone()[0]
+
+    def _exists(self, cursor, table):
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [self.qn(table)])
+        return cursor.fetchone()[0]
+
+    def _fill_item_dates(self, cursor):
+        # La clave de partición forma parte de la PK: no puede quedar en NULL
+        cursor.execute(
+            f'UPDATE {self.qn(VentaItem._meta.db_table)} AS vi SET venta_fecha = v.fecha '
+            f'FROM {self.qn(Ventas._meta.db_table)} AS v '
+            f'WHERE v.id = vi.venta_id AND vi.venta_fecha IS NULL')
+
+    def _convert(self, cursor, model, field, future_months):
+        """Reemplaza la tabla del modelo por una tabla particionada por mes.
+
+        PostgreSQL exige que la PK incluya la clave de partición, por lo que pasa
+        a ser (id, fecha) y `id` se alimenta de una secuencia propia. Las FKs que
+        apuntan a la tabla (VentaItem.venta -> Ventas) no pueden mantenerse a
+        nivel de BD y se eliminan; la relación sigue existiendo en el ORM.
+        """
+        qn = self.qn
+        table = model._meta.db_table
+        if self._is_partitioned(cursor, table):
+            self.stdout.write(f"{table} ya está particionada")
+            return
+        column = model._meta.get_field(field).column
+        pk = model._meta.pk.column
+        old = f'{table}_sinparticion'
+
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+            [qn(old)])
+        pk_name = cursor.fetchone()[0]
+        cursor.execute(
+            f'ALTER TABLE {qn(old)} RENAME CONSTRAINT {qn(pk_name)} TO {qn(old + "_pkey")}')
+        # Liberar el nombre de la secuencia de identidad para la tabla nueva
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [qn(old), pk])
+        old_seq = cursor.fetchone()[0]
+        if old_seq:
+            cursor.execute(
+                f'ALTER SEQUENCE {old_seq} RENAME TO {qn(old + "_" + pk + "_seq")}')
+
+        # Índices secundarios y FKs salientes, para recrearlos en la tabla nueva
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary",
+            [qn(old)])
+        indexes = cursor.fetchall()
+        for name, _definition in indexes:
+            cursor.execute(f'DROP INDEX {qn(name)}')
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [qn(old)])
+        foreign_keys = cursor.fetchall()
+        # FKs entrantes: no pueden referenciar una tabla particionada por (id) solo
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+            [qn(old)])
+        for rel, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {rel} DROP CONSTRAINT {qn(name)}')
+
+        cursor.execute(
+            f'CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({qn(column)})')
+        seq = f'{table}_{pk}_seq'
+        cursor.execute(
+            f'CREATE SEQUENCE {qn(seq)} OWNED BY {qn(table)}.{qn(pk)}')
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(pk)} SET DEFAULT nextval(%s::regclass)",
+            [qn(seq)])
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(pk_name)} PRIMARY KEY ({qn(pk)}, {qn(column)})')
+        cursor.execute(
+            f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+
+        # Una partición por cada mes con datos, más los meses futuros
+        cursor.execute(
+            f'SELECT MIN({qn(column)}), MAX({qn(column)}) FROM {qn(old)}')
+        lo, hi = cursor.fetchone()
+        now = timezone.localtime()
+        first = timezone.localtime(lo) if lo else now
+        last = timezone.localtime(hi) if hi else now
+        last_key = max((last.year, last.month), _add_months(
+            now.year, now.month, future_months))
+        year, month = first.year, first.month
+        while (year, month) <= last_key:
+            self._ensure_partition(cursor, model, field, year, month)
+            year, month = _add_months(year, month, 1)
+
+        cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+        cursor.execute(
+            f"SELECT setval(%s::regclass, COALESCE((SELECT MAX({qn(pk)}) FROM {qn(table)}), 0) + 1, false)",
+            [qn(seq)])
+
+        # Recrear índices sobre la tabla padre (se propagan a cada partición)
+        for _name, definition in indexes:
+            definition = re.sub(r' ON (ONLY )?\S+ USING ',
+                                f' ON {qn(table)} USING ', definition, count=1)
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+
+        cursor.execute(f'DROP TABLE {qn(old)}')
+        self.stdout.write(f"{table} convertida a tabla particionada por mes")
+
+    def _ensure_partition(self, cursor, model, field, year, month):
+        """Crea la partición del mes si no existe. Devuelve True si la creó.
+
+        Las filas de ese mes que hubieran caído en la partición DEFAULT se mueven
+        a la nueva partición antes de adjuntarla.
+        """
+        qn = self.qn
+        table = model._meta.db_table
+        column = model._meta.get_field(field).column
+        name = f'{table}_p{year}{month:02d}'
+        if self._exists(cursor, name):
+            return False
+        start, end = _month_bounds(year, month)
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        default = table + '_default'
+        if self._exists(cursor, default):
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {qn(default)} '
+                f'WHERE {qn(column)} >= %s AND {qn(column)} < %s RETURNING *) '
+                f'INSERT INTO {qn(name)} SELECT * FROM moved',
+                [start, end])
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+        return True
+
+    def _partitions(self, cursor, table):
+        cursor.execute(
+            "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [self.qn(table)])
+        return cursor.fetchall()
+
+    def _detach_before(self, cursor, cutoff, archive, schema):
+        qn = self.qn
+        detached = []
+        if archive:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {qn(schema)}')
+        for model, _field in PARTITIONED:
+            table = model._meta.db_table
+            for name, _rows in self._partitions(cursor, table):
+                m = PARTITION_RE.search(name)
+                if not m or (int(m.group(1)), int(m.group(2))) >= cutoff:
+                    continue
+                cursor.execute(
+                    f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+                if archive:
+                    cursor.execute(
+                        f'ALTER TABLE {qn(name)} SET SCHEMA {qn(schema)}')
+                    # La tabla archivada ya no debe consumir la secuencia del padre
+                    cursor.execute(
+                        f'ALTER TABLE {qn(schema)}.{qn(name)} ALTER COLUMN {qn(model._meta.pk.column)} DROP DEFAULT')
+                detached.append(name)
+        return detached
+
+    def _print_status(self, cursor, table):
+        if not self._is_partitioned(cursor, table):
+            self.stdout.write(f"{table}: sin particionar")
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{table}"))
+        for name, rows in self._partitions(cursor, table):
+            self.stdout.write(f"  {name}: ~{max(rows, 0)} filas")
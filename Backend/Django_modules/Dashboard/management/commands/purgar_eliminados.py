@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard import stores, sync
+
+
+class Command(BaseCommand):
+    help = ("Borra las lápidas de filas eliminadas (RegistroEliminado) más antiguas "
+            "que la retención de ?updated_since= (settings.SYNC_TOMBSTONE_DAYS).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stores", type=str, default=None,
+                            help="Slugs separados por comas (por defecto: todas)")
+        parser.add_argument("--dias", type=int, default=None,
+                            help="Días a conservar (por defecto: SYNC_TOMBSTONE_DAYS). "
+                                 "Con menos días que la retención, los clientes con un "
+                                 "sync_token más antiguo no verán esos borrados.")
+
+    def handle(self, *args, **options):
+        if options.get('stores'):
+            try:
+                entries = [stores.get_store(s.strip())
+                           for s in options['stores'].split(',') if s.strip()]
+            except stores.UnknownStore as exc:
+                raise CommandError(f"Tienda desconocida: {exc}")
+        else:
+            entries = stores.all_stores()
+
+        done = set()
+        for entry in entries:
+            if entry.alias in done:
+                continue
+            done.add(entry.alias)
+            alias = stores.activate(entry.slug)
+            borradas = sync.purge(alias, days=options['dias'])
+            self.stdout.write(f"{entry.slug} ({alias}): {borradas} lápidas borradas")
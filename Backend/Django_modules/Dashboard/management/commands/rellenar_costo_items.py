@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from Dashboard import invalidation, replicas
+from Dashboard.models import Productos, VentaItem
+
+
+class Command(BaseCommand):
+    help = ("Rellena VentaItem.costo_unitario de los items que no lo tienen con el costo "
+            "actual del producto (aproximación para ventas anteriores al snapshot).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stores", type=str, default=None,
+                            help="Alias de BD separados por comas (por defecto: todos los "
+                                 "primarios; las réplicas de lectura se omiten)")
+        parser.add_argument("--lote", type=int, default=5000,
+                            help="Cantidad de items actualizados por transacción")
+        parser.add_argument("--sobrescribir", action="store_true",
+                            help="Recalcular también los items que ya tienen costo_unitario")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Solo contar los items pendientes, sin modificar")
+
+    def handle(self, *args, **options):
+        if options.get('stores'):
+            aliases = [a.strip()
+                       for a in options['stores'].split(',') if a.strip()]
+        else:
+            aliases = [a for a in settings.DATABASES if replicas.primary_of(a) == a]
+        unknown = [a for a in aliases if a not in settings.DATABASES]
+        if unknown:
+            raise CommandError(f"Alias de BD desconocido: {', '.join(unknown)}")
+        # Las réplicas reciben los cambios del primario (y suelen ser de solo lectura)
+        replica_aliases = [a for a in aliases if replicas.primary_of(a) != a]
+        if replica_aliases:
+            raise CommandError(f"Alias de réplica (usar el primario): {', '.join(replica_aliases)}")
+
+        lote = max(1, options['lote'])
+        for alias in aliases:
+            items = VentaItem.objects.using(alias)
+            if not options['sobrescribir']:
+                items = items.filter(costo_unitario__isnull=True)
+            # Solo productos con costo cargado: el resto quedaría NULL igualmente
+            items = items.filter(producto__costo__isnull=False)
+
+            pendientes = items.count()
+            if options['dry_run'] or pendientes == 0:
+                self.stdout.write(
+                    f"{alias}: {pendientes} items pendientes")
+                continue
+
+            costo_producto = Subquery(
+                Productos.objects.using(alias)
+                .filter(pk=OuterRef('producto_id'))
+                .values('costo')[:1]
+            )
+            ids = list(items.order_by('id').values_list('id', flat=True))
+            actualizados = 0
+            # Por lotes de ids para no bloquear la tabla en una sola transacción
+            for i in range(0, len(ids), lote):
+                chunk = ids[i:i + lote]
+                with transaction.atomic(using=alias):
+                    actualizados += (
+                        VentaItem.objects.using(alias)
+                        .filter(id__in=chunk)
+                        .update(costo_unitario=costo_producto)
+                    )
+                    invalidation.publish(alias, VentaItem)
+            self.stdout.write(self.style.SUCCESS(
+                f"{alias}: {actualizados} items actualizados"))
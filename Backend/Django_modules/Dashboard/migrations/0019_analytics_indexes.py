@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:09
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Los índices se crean con CONCURRENTLY para no bloquear escrituras en
+    # tablas de ventas grandes; requiere ejecutar fuera de una transacción.
+    atomic = False
+
+    dependencies = [
+        ('Dashboard', '0018_merge_0017_alter_store_id_0017_userprofile_font_size'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='productos',
+            index=models.Index(fields=['categoria'], name='productos_categoria_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ventaitem',
+            index=models.Index(fields=['venta', 'producto'], include=('cantidad', 'precio_total'), name='ventaitem_venta_prod_cov_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ventas',
+            index=models.Index(fields=['estado', 'fecha'], name='ventas_estado_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ventas',
+            index=models.Index(condition=models.Q(('estado', 'completada')), fields=['fecha'], include=('precio_total', 'cliente'), name='ventas_completadas_fecha_idx'),
+        ),
+    ]
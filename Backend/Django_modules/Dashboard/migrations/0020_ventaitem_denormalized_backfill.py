@@ -0,0 +1,43 @@
+from django.db import migrations, transaction
+
+# Items por transacción: cada lote bloquea solo sus filas y confirma enseguida
+LOTE = 5000
+
+# Copia fecha/estado de la venta y categoría del producto en los items de un
+# rango de ids; los que ya tienen venta_fecha (escritos por el código nuevo o
+# por un lote anterior) se saltan, así que la migración se puede reanudar.
+BACKFILL_SQL = '''
+UPDATE "Dashboard_ventaitem" AS vi
+SET venta_fecha = v.fecha,
+    venta_estado = v.estado,
+    categoria = p.categoria
+FROM "Dashboard_ventas" AS v, "Dashboard_productos" AS p
+WHERE v.id = vi.venta_id AND p.id = vi.producto_id
+  AND vi.id >= %s AND vi.id < %s AND vi.venta_fecha IS NULL
+'''
+
+
+def backfill(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(id), MAX(id) FROM "Dashboard_ventaitem"')
+        first, last = cursor.fetchone()
+    if first is None:
+        return
+    for start in range(first, last + 1, LOTE):
+        with transaction.atomic(using=alias):
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(BACKFILL_SQL, [start, start + LOTE])
+
+
+class Migration(migrations.Migration):
+    # Cada lote en su propia transacción para no bloquear VentaItem entera
+    atomic = False
+
+    dependencies = [
+        ('Dashboard', '0020_ventaitem_denormalized_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, elidable=True),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0019_analytics_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventaitem',
+            name='categoria',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='ventaitem',
+            name='venta_estado',
+            field=models.CharField(blank=True, choices=[('pendiente', 'Pendiente'), ('completada', 'Completada'), ('cancelada', 'Cancelada'), ('reembolsada', 'Reembolsada')], default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ventaitem',
+            name='venta_fecha',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
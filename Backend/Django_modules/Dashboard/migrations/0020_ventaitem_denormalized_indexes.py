@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Igual que 0019: CONCURRENTLY no bloquea escrituras pero no admite transacción
+    atomic = False
+
+    dependencies = [
+        ('Dashboard', '0020_ventaitem_denormalized_backfill'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ventaitem',
+            index=models.Index(fields=['venta_estado', 'venta_fecha'], name='ventaitem_estado_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ventaitem',
+            index=models.Index(condition=models.Q(('venta_estado', 'completada')), fields=['venta_fecha'], include=('producto', 'categoria', 'cantidad', 'precio_total'), name='ventaitem_compl_fecha_cov_idx'),
+        ),
+    ]
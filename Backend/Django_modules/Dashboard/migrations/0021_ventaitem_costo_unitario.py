@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:13
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # El índice cubriente nuevo se construye con otro nombre antes de borrar el
+    # viejo: las consultas de margen siempre tienen uno y no se bloquean escrituras.
+    atomic = False
+
+    dependencies = [
+        ('Dashboard', '0020_ventaitem_denormalized_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventaitem',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='ventaitem',
+            index=models.Index(condition=models.Q(('venta_estado', 'completada')), fields=['venta_fecha'], include=('producto', 'categoria', 'cantidad', 'precio_total', 'costo_unitario'), name='ventaitem_compl_costo_cov_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='ventaitem',
+            name='ventaitem_compl_fecha_cov_idx',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0021_ventaitem_costo_unitario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='db_settings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=63, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+SEQUENCE = 'dashboard_clientes_display_id_seq'
+
+
+def create_sequence(apps, schema_editor):
+    # Una secuencia por BD, sembrada con el mayor display_id actual + 1
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} MINVALUE 1000 START 1000')
+        cursor.execute(
+            f'SELECT setval(%s, GREATEST((SELECT COALESCE(MAX(display_id), 0) + 1 '
+            f'FROM "Dashboard_clientes"), 1000), false)', [SEQUENCE])
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP SEQUENCE IF EXISTS {SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0022_store_slug_db_settings'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, reverse_code=drop_sequence),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0023_clientes_display_id_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50)),
+                ('objeto_id', models.BigIntegerField()),
+                ('eliminado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='clientes',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='productos',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ventaitem',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ventas',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='clientes',
+            index=models.Index(fields=['actualizado_en'], name='clientes_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productos',
+            index=models.Index(fields=['actualizado_en'], name='productos_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventaitem',
+            index=models.Index(fields=['actualizado_en'], name='ventaitem_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventas',
+            index=models.Index(fields=['actualizado_en'], name='ventas_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroeliminado',
+            index=models.Index(fields=['modelo', 'eliminado_en'], name='eliminado_modelo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0024_actualizado_en_registroeliminado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HuellaConsulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=16, unique=True)),
+                ('sql_normalizado', models.TextField()),
+                ('llamadas', models.PositiveIntegerField(default=0)),
+                ('tiempo_total_ms', models.FloatField(default=0)),
+                ('tiempo_max_ms', models.FloatField(default=0)),
+                ('vistas', models.JSONField(blank=True, default=dict)),
+                ('alias', models.JSONField(blank=True, default=dict)),
+                ('primera_vez', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultima_vez', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Consulta lenta',
+                'verbose_name_plural': 'Consultas lentas',
+                'indexes': [models.Index(fields=['-tiempo_total_ms'], name='huella_tiempo_total_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlanConsulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capturado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('vista', models.CharField(blank=True, max_length=200)),
+                ('alias', models.CharField(max_length=100)),
+                ('alias_explain', models.CharField(blank=True, max_length=100)),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('duracion_ms', models.FloatField()),
+                ('plan', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('huella', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='planes', to='Dashboard.huellaconsulta')),
+            ],
+            options={
+                'verbose_name': 'Plan de consulta',
+                'verbose_name_plural': 'Planes de consulta',
+                'ordering': ['-capturado_en'],
+            },
+        ),
+    ]
@@ -1,10 +1,43 @@
-from django.db import models, IntegrityError
+from django.db import models, router
+from django.db.models import Q
 import random
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from . import invalidation, live
+from .display_ids import next_display_id, reserve_display_ids
 
-class Clientes(models.Model):
+
+class ActualizadoEnMixin:
+    """save(update_fields=[...]) también guarda actualizado_en.
+
+    auto_now solo se escribe si el campo está en update_fields; sin él la
+    fila no sale en ?updated_since= (sync.py).
+    """
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'actualizado_en'}
+        super().save(*args, **kwargs)
+
+
+class ClientesQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create no llama a save(): reservar los display_id en bloque
+        objs = list(objs)
+        missing = [obj for obj in objs if not obj.display_id]
+        if missing:
+            using = self._db or router.db_for_write(self.model, **self._hints)
+            for obj, display_id in zip(missing, reserve_display_ids(len(missing), using)):
+                obj.display_id = display_id
+        created = super().bulk_create(objs, *args, **kwargs)
+        # bulk_create no emite post_save
+        invalidation.publish(self._db or router.db_for_write(self.model, **self._hints), self.model)
+        return created
+
+
+class Clientes(ActualizadoEnMixin, models.Model):
     nombre = models.CharField(max_length=150)
     apellido = models.CharField(max_length=150)
     cedula = models.CharField(max_length=25)
@@ -30,47 +63,27 @@ class Clientes(models.Model):
     # ID legible/mostrable persistente (opcionalmente diferente de la PK)
     display_id = models.PositiveIntegerField(
         null=True, blank=True, unique=True)
+    # Última modificación (listados con ?updated_since=, ver sync.py)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    objects = ClientesQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['actualizado_en'], name='clientes_actualizado_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        # Asigna un display_id secuencial empezando en 1000 si aún no existe.
-        # Estrategia:
-        #  - Buscar el máximo display_id existente (>= 1000) y usar max+1.
-        #  - Si no existe ninguno, comenzar en 1000.
-        #  - En caso de condición de carrera en la base de datos (IntegrityError
-        #    por unique constraint), reintentar unas pocas veces incrementando.
+        # Asigna un display_id secuencial (desde 1000) si aún no existe, con la
+        # secuencia de la BD destino: sin consultar el máximo ni reintentar.
         if not self.display_id:
-            START = 1000
-            MAX_RETRIES = 5
-            for attempt in range(MAX_RETRIES):
-                # Obtener el máximo display_id actual >= START
-                qs = Clientes.objects.filter(
-                    display_id__isnull=False, display_id__gte=START)
-                max_row = qs.order_by('-display_id').first()
-                if max_row and max_row.display_id:
-                    candidate = max_row.display_id + 1
-                else:
-                    candidate = START
-
-                self.display_id = candidate
-                try:
-                    # Intentar guardar; si choque de unique ocurre, reintentar
-                    super().save(*args, **kwargs)
-                    return
-                except IntegrityError:
-                    # Otro proceso pudo haber tomado el mismo candidate.
-                    # Borrar el candidato y reintentar incrementando.
-                    self.display_id = None
-                    if attempt == MAX_RETRIES - 1:
-                        # Agotar reintentos: propagar error para que el operador
-                        # pueda investigar (o ejecutar la migración de datos manualmente).
-                        raise
-                    # si quedan reintentos, volver a intentar en el siguiente ciclo
-                    continue
-        else:
-            super().save(*args, **kwargs)
-
-
-class Productos(models.Model):
+            using = kwargs.get('using') or router.db_for_write(
+                type(self), instance=self)
+            self.display_id = next_display_id(using)
+        super().save(*args, **kwargs)
+
+
+class Productos(ActualizadoEnMixin, models.Model):
     nombre = models.CharField(max_length=150)
     categoria = models.CharField(max_length=200)
     precio = models.FloatField()
@@ -112,9 +125,51 @@ class Productos(models.Model):
         default=ESTADO_DISPONIBLE,
         help_text='Estado del producto',
     )
+    actualizado_en = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Las métricas agrupan y filtran por categoría (GROUP BY / categoria__in)
+            models.Index(fields=['categoria'], name='productos_categoria_idx'),
+            models.Index(fields=['actualizado_en'], name='productos_actualizado_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Recordar la categoría cargada para propagar cambios a VentaItem.categoria
+        # (y el stock, para los eventos en vivo)
+        loaded = dict(zip(field_names, values))
+        instance._orig_categoria = loaded.get('categoria')
+        instance._orig_stock = loaded.get('stock')
+        return instance
 
-class Ventas(models.Model):
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        orig_stock = getattr(self, '_orig_stock', None)
+        if (not adding and orig_stock not in (None, self.stock)
+                and (update_fields is None or 'stock' in update_fields)):
+            live.notify(self._state.db, {'t': 'stock', 'id': self.pk,
+                                         'stock': self.stock, 'antes': orig_stock})
+        if update_fields is None or 'stock' in update_fields:
+            self._orig_stock = self.stock
+        if adding:
+            # Los items aún no existen: nada que propagar en el próximo save()
+            self._orig_categoria = self.categoria
+            return
+        if update_fields is not None and 'categoria' not in update_fields:
+            return
+        if getattr(self, '_orig_categoria', None) != self.categoria:
+            # Mantener sincronizada la copia desnormalizada en los items
+            VentaItem.objects.using(self._state.db).filter(
+                producto_id=self.pk).update(categoria=self.categoria, actualizado_en=timezone.now())
+            invalidation.publish(self._state.db, VentaItem)
+        self._orig_categoria = self.categoria
+
+
+class Ventas(ActualizadoEnMixin, models.Model):
 
     """Representa una transacción (venta) que puede contener N items.
 
@@ -168,12 +223,56 @@ class Ventas(models.Model):
         choices=ESTADO_CHOICES,
         default=ESTADO_PENDIENTE,
     )
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Filtro típico de las métricas: estado + rango de fechas
+            models.Index(fields=['estado', 'fecha'],
+                         name='ventas_estado_fecha_idx'),
+            # Índice parcial solo con ventas completadas (la mayoría de los
+            # agregados ignora pendientes/canceladas). Incluye las columnas
+            # leídas por los agregados para permitir index-only scans.
+            models.Index(fields=['fecha'], name='ventas_completadas_fecha_idx',
+                         include=['precio_total', 'cliente'],
+                         condition=Q(estado='completada')),
+            models.Index(fields=['actualizado_en'], name='ventas_actualizado_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Recordar fecha/estado cargados para propagar cambios a los items
+        loaded = dict(zip(field_names, values))
+        instance._orig_fecha = loaded.get('fecha')
+        instance._orig_estado = loaded.get('estado')
+        return instance
 
-
-class VentaItem(models.Model):
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if adding:
+            live.notify(self._state.db, {'t': 'venta', 'id': self.pk, 'estado': self.estado,
+                                         'total': self.precio_total, 'cliente': self.cliente_id})
+            self._orig_fecha, self._orig_estado = self.fecha, self.estado
+        elif (getattr(self, '_orig_estado', None) not in (None, self.estado)
+              and (update_fields is None or 'estado' in update_fields)):
+            live.notify(self._state.db, {'t': 'estado', 'id': self.pk, 'estado': self.estado,
+                                         'antes': self._orig_estado})
+        if adding or (update_fields is not None and not {'fecha', 'estado'} & set(update_fields)):
+            return
+        if (getattr(self, '_orig_fecha', None), getattr(self, '_orig_estado', None)) != (self.fecha, self.estado):
+            # VentaItem guarda copias de fecha/estado para agregar sin JOIN
+            VentaItem.objects.using(self._state.db).filter(venta_id=self.pk).update(
+                venta_fecha=self.fecha, venta_estado=self.estado, actualizado_en=timezone.now())
+            invalidation.publish(self._state.db, VentaItem)
+        self._orig_fecha = self.fecha
+        self._orig_estado = self.estado
+
+
+class VentaItem(ActualizadoEnMixin, models.Model):
     """Item (línea) de una venta: referencia a producto, cantidad y precios."""
 
     venta = models.ForeignKey(
@@ -193,10 +292,128 @@ class VentaItem(models.Model):
     precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
     precio_total = models.DecimalField(max_digits=12, decimal_places=2)
 
+    # Copias desnormalizadas de Ventas.fecha, Ventas.estado y Productos.categoria.
+    # Permiten que los agregados por item sean escaneos de una sola tabla.
+    # Se sincronizan en save() de VentaItem, Ventas y Productos (QuerySet.update()
+    # y bulk_create() no pasan por save(): deben copiarlas explícitamente, igual
+    # que actualizado_en en los update()).
+    venta_fecha = models.DateTimeField(null=True, blank=True, editable=False)
+    venta_estado = models.CharField(
+        max_length=20, choices=Ventas.ESTADO_CHOICES, blank=True, default='', editable=False)
+    categoria = models.CharField(
+        max_length=200, blank=True, default='', editable=False)
+    # Costo unitario del producto al momento de la venta. Se captura al crear
+    # el item y no cambia cuando se actualiza Productos.costo, así el margen
+    # histórico es estable. Items antiguos: comando rellenar_costo_items.
+    costo_unitario = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Join venta -> items y agrupación por producto sin visitar el heap
+            models.Index(fields=['venta', 'producto'], name='ventaitem_venta_prod_cov_idx',
+                         include=['cantidad', 'precio_total']),
+            models.Index(fields=['venta_estado', 'venta_fecha'],
+                         name='ventaitem_estado_fecha_idx'),
+            # Agregados sobre ventas completadas resueltos solo con el índice
+            models.Index(fields=['venta_fecha'], name='ventaitem_compl_costo_cov_idx',
+                         include=['producto', 'categoria', 'cantidad',
+                                  'precio_total', 'costo_unitario'],
+                         condition=Q(venta_estado='completada')),
+            models.Index(fields=['actualizado_en'], name='ventaitem_actualizado_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Copiar fecha/estado de la venta y categoría del producto
+        if self.venta_id is not None:
+            self.venta_fecha = self.venta.fecha
+            self.venta_estado = self.venta.estado
+        if self.producto_id is not None:
+            self.categoria = self.producto.categoria
+            # Snapshot del costo solo al crear el item
+            if self._state.adding and self.costo_unitario is None:
+                self.costo_unitario = self.producto.costo
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                'venta_fecha', 'venta_estado', 'categoria'}
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            live.notify(self._state.db, {'t': 'item', 'venta': self.venta_id,
+                                         'producto': self.producto_id, 'cantidad': self.cantidad})
+
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} @ {self.precio_unitario}"
 
 
+class RegistroEliminado(models.Model):
+    """Lápida de una fila borrada de Clientes, Productos, Ventas o VentaItem.
+
+    La escribe sync.record_deletion (post_delete) para que los listados con
+    ?updated_since= informen los borrados. Se purgan con `purgar_eliminados`.
+    """
+    modelo = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    eliminado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'eliminado_en'], name='eliminado_modelo_fecha_idx'),
+        ]
+
+
+class HuellaConsulta(models.Model):
+    """Consultas lentas agrupadas por huella (SQL sin literales), ver slow_queries.py.
+
+    Se guarda siempre en la BD default, sea cual sea la tienda de la consulta.
+    """
+    huella = models.CharField(max_length=16, unique=True)
+    sql_normalizado = models.TextField()
+    llamadas = models.PositiveIntegerField(default=0)
+    tiempo_total_ms = models.FloatField(default=0)
+    tiempo_max_ms = models.FloatField(default=0)
+    # vista -> llamadas y alias de BD -> llamadas
+    vistas = models.JSONField(default=dict, blank=True)
+    alias = models.JSONField(default=dict, blank=True)
+    primera_vez = models.DateTimeField(default=timezone.now)
+    ultima_vez = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Consulta lenta'
+        verbose_name_plural = 'Consultas lentas'
+        indexes = [
+            models.Index(fields=['-tiempo_total_ms'], name='huella_tiempo_total_idx'),
+        ]
+
+    @property
+    def tiempo_medio_ms(self):
+        return self.tiempo_total_ms / self.llamadas if self.llamadas else 0.0
+
+    def __str__(self):
+        return f"{self.huella} ({self.llamadas} llamadas, {self.tiempo_total_ms:.0f} ms)"
+
+
+class PlanConsulta(models.Model):
+    """EXPLAIN (ANALYZE, BUFFERS) de una consulta lenta, con su vista y parámetros."""
+    huella = models.ForeignKey(HuellaConsulta, on_delete=models.CASCADE, related_name='planes')
+    capturado_en = models.DateTimeField(default=timezone.now)
+    vista = models.CharField(max_length=200, blank=True)
+    alias = models.CharField(max_length=100)
+    alias_explain = models.CharField(max_length=100, blank=True)
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    duracion_ms = models.FloatField()
+    plan = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-capturado_en']
+        verbose_name = 'Plan de consulta'
+        verbose_name_plural = 'Planes de consulta'
+
+
 class ModeloPrediccion(models.Model):
     """Metadatos de una ejecución/versión del modelo de predicción.
 
@@ -351,6 +568,11 @@ class Store(models.Model):
     owner = models.ForeignKey(
         get_user_model(), on_delete=models.CASCADE, related_name='stores')
     creado_en = models.DateTimeField(auto_now_add=True)
+    # Tiendas servidas por este backend con BD propia: se atienden en
+    # /api/s/<slug>/ (o cabecera X-Store). `db_settings` sobrescribe las claves
+    # de conexión de la BD default (NAME, HOST, PORT, USER, PASSWORD).
+    slug = models.SlugField(max_length=63, unique=True, null=True, blank=True)
+    db_settings = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ['-creado_en']
@@ -0,0 +1,330 @@
+"""Perfilado a demanda de una petición: `?_profile=cpu|sql|mem` (solo staff).
+
+- cpu: cProfile de la petición; las PROFILE_TOP funciones con más tiempo
+  acumulado.
+- sql: todas las consultas (también las de otros hilos, vía el capture() de
+  instrumentation.py) y EXPLAIN (ANALYZE, BUFFERS) de las PROFILE_EXPLAIN_TOP
+  SELECT más lentas, ejecutado en su alias al terminar la petición dentro de
+  una transacción que se deshace (sin ANALYZE si llaman a pg_notify o
+  nextval; ver explain.py).
+- mem: tracemalloc; pico y las PROFILE_TOP líneas que más memoria asignaron.
+
+La respuesta es la normal de la vista con las cabeceras `X-Request-ID` y
+`X-Profile-Id`; el reporte queda en PROFILE_DIR (un JSON por petición, se
+conservan los últimos PROFILE_KEEP) y se lee en /api/debug/profiles/<id>/.
+Con `&_profile_inline=1` la respuesta es directamente el reporte. El id es la
+cabecera X-Request-ID de la petición si viene (proxy) o uno nuevo.
+
+Sin `_profile` en la query string el middleware solo mira QUERY_STRING; si el
+usuario no es staff (sesión o JWT) el parámetro se ignora. El parámetro llega
+a la vista: para la caché de agregados (coalesce.py) es otra clave, así que se
+mide el cálculo y no un acierto de caché.
+
+cProfile y tracemalloc son globales del proceso: se perfila una petición cpu o
+mem a la vez por worker (las demás se sirven sin perfil) y bajo ASGI el perfil
+incluye lo que el event loop haga mientras tanto; la CPU de sync_to_async y
+de los hilos de StoreAwareExecutor no aparece en `cpu` (sí sus consultas en
+`sql`).
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import explain, instrumentation
+
+MODES = ('cpu', 'sql', 'mem')
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+PARAMS_CHARS = 500
+
+# cProfile y tracemalloc no admiten dos sesiones a la vez
+_global_lock = threading.Lock()
+
+
+def enabled():
+    return bool(getattr(settings, 'PROFILING_ENABLED', True))
+
+
+def _setting(name, default):
+    return int(getattr(settings, name, default))
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', None) or settings.BASE_DIR / '.profiles')
+
+
+def requested_mode(request):
+    """Modo pedido en la query string o None (sin parsear request.GET si no hace falta)."""
+    if '_profile=' not in request.META.get('QUERY_STRING', ''):
+        return None
+    mode = request.GET.get('_profile')
+    return mode if mode in MODES else None
+
+
+def request_id(request):
+    incoming = request.headers.get('X-Request-ID', '')
+    return incoming if REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+
+def staff_user(request):
+    """Usuario staff de la sesión o del JWT, o None."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # API con JWT: DRF autentica en la vista, aquí hay que hacerlo a mano
+        from rest_framework.exceptions import AuthenticationFailed
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = result[0] if result else None
+    return user if user is not None and user.is_staff else None
+
+
+# Reportes
+
+def _path(profile_id):
+    if not REQUEST_ID_RE.match(profile_id or ''):
+        raise ValueError(f'Id de perfil inválido: {profile_id!r}')
+    return profile_dir() / f'{profile_id}.json'
+
+
+def save(report):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = _path(report['id'])
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(report, ensure_ascii=False, default=str), encoding='utf-8')
+    os.replace(tmp, path)
+    _prune(directory)
+    return path
+
+
+def _prune(directory):
+    keep = _setting('PROFILE_KEEP', 200)
+    files = sorted(directory.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[keep:]:
+        old.unlink(missing_ok=True)
+
+
+def load(profile_id):
+    """Reporte guardado o None."""
+    try:
+        return json.loads(_path(profile_id).read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def recent(limit=50):
+    """Resumen de los últimos reportes, del más nuevo al más viejo."""
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    files = sorted(directory.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    summaries = []
+    for path in files[:limit]:
+        try:
+            report = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        summaries.append({key: report.get(key) for key in
+                          ('id', 'mode', 'method', 'path', 'status', 'store', 'total_ms', 'created_at')})
+    return summaries
+
+
+# Perfiladores: start() antes de la petición, finish() -> datos del reporte
+
+class _CPUProfile:
+    def start(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def finish(self, request, response):
+        stats = pstats.Stats(self.profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        functions = []
+        for (filename, line, name), (_prim, calls, tottime, cumtime, _callers) in \
+                rows[:_setting('PROFILE_TOP', 40)]:
+            functions.append({
+                'function': name,
+                'where': f'{filename}:{line}',
+                'calls': calls,
+                'tottime_ms': round(tottime * 1000, 3),
+                'cumtime_ms': round(cumtime * 1000, 3),
+            })
+        return {'total_calls': stats.total_calls, 'functions': functions}
+
+
+class _MemProfile:
+    def start(self):
+        tracemalloc.start()
+
+    def stop(self):
+        _current, self.peak = tracemalloc.get_traced_memory()
+        self.snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    def finish(self, request, response):
+        top = self.snapshot.statistics('lineno')[:_setting('PROFILE_TOP', 40)]
+        return {
+            'peak_mb': round(self.peak / (1024 * 1024), 3),
+            'allocations': [{
+                'where': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count,
+            } for stat in top],
+        }
+
+
+class _SQLProfile:
+    def start(self):
+        self._capture = instrumentation.capture()
+        self.stats = self._capture.__enter__()
+
+    def stop(self):
+        self._capture.__exit__(None, None, None)
+
+    def finish(self, request, response):
+        captured = list(self.stats.captured)
+        statements = [{
+            'alias': alias,
+            'sql': sql,
+            'params': repr(params)[:PARAMS_CHARS] if params is not None else None,
+            'ms': round(seconds * 1000, 3),
+        } for alias, sql, params, seconds in captured]
+        return {
+            'queries': len(captured),
+            'sql_ms': round(sum(s['ms'] for s in statements), 3),
+            'by_alias': {alias: {'queries': n, 'ms': round(secs * 1000, 3)}
+                         for alias, (n, secs) in self.stats.by_alias.items()},
+            'statements': statements,
+            'explain': explain_slowest(captured, _setting('PROFILE_EXPLAIN_TOP', 5)),
+        }
+
+
+PROFILERS = {'cpu': _CPUProfile, 'sql': _SQLProfile, 'mem': _MemProfile}
+
+
+def explain_slowest(captured, top):
+    """Plan de las `top` SELECT más lentas (distintas); ver explain.py."""
+    seen, plans = set(), []
+    for alias, sql, params, seconds in sorted(captured, key=lambda q: q[3], reverse=True):
+        key = (alias, sql, repr(params))
+        if not explain.explainable(sql) or key in seen:
+            continue
+        seen.add(key)
+        plan = {'alias': alias, 'sql': sql, 'ms': round(seconds * 1000, 3),
+                'analyze': explain.analyzable(sql)}
+        try:
+            plan['plan'] = explain.explain(alias, sql, params)
+        except Exception as exc:
+            plan['error'] = str(exc)
+        plans.append(plan)
+        if len(plans) >= top:
+            break
+    return plans
+
+
+class ProfilingMiddleware:
+    """Atiende `?_profile=` (ver módulo). Va después de AuthenticationMiddleware
+    y de RequestDBRouterMiddleware (usuario y EXPLAIN en la BD de la tienda)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = requested_mode(request) if enabled() else None
+        user = staff_user(request) if mode else None
+        if user is None:
+            return self.get_response(request)
+        profiler = self._start(mode)
+        if profiler is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(mode, profiler)
+        data = profiler.finish(request, response)
+        return self._respond(request, response, user, mode, data, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        mode = requested_mode(request) if enabled() else None
+        user = await sync_to_async(staff_user)(request) if mode else None
+        if user is None:
+            return await self.get_response(request)
+        profiler = self._start(mode)
+        if profiler is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(mode, profiler)
+        # EXPLAIN y lectura del snapshot: E/S y CPU fuera del event loop
+        data = await sync_to_async(profiler.finish)(request, response)
+        return await sync_to_async(self._respond)(
+            request, response, user, mode, data, time.perf_counter() - started)
+
+    def _start(self, mode):
+        if mode != 'sql' and not _global_lock.acquire(blocking=False):
+            return None
+        profiler = PROFILERS[mode]()
+        try:
+            profiler.start()
+        except Exception:
+            if mode != 'sql':
+                _global_lock.release()
+            raise
+        return profiler
+
+    def _stop(self, mode, profiler):
+        try:
+            profiler.stop()
+        finally:
+            if mode != 'sql':
+                _global_lock.release()
+
+    def _respond(self, request, response, user, mode, data, total):
+        profile_id = request_id(request)
+        report = {
+            'id': profile_id,
+            'mode': mode,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'store': getattr(getattr(request, 'store', None), 'slug', None),
+            'user': user.get_username(),
+            'created_at': timezone.now().isoformat(),
+            'total_ms': round(total * 1000, 3),
+            mode: data,
+        }
+        save(report)
+        if request.GET.get('_profile_inline') == '1':
+            response = JsonResponse(report)
+        response['X-Request-ID'] = profile_id
+        response['X-Profile-Id'] = profile_id
+        return response
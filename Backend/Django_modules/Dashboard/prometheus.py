@@ -0,0 +1,169 @@
+"""Métricas en formato Prometheus para /metrics.
+
+- dashboard_http_request_duration_seconds{view,method}: histograma de latencia
+  por ruta (nombre de la URL, no el path: cardinalidad acotada).
+- dashboard_http_requests_total{view,method,status}: peticiones por estado.
+- dashboard_db_queries_total / dashboard_db_query_seconds_total{alias}:
+  consultas y tiempo SQL por alias de BD (execute wrapper de instrumentation.py).
+- dashboard_db_pool_connections{alias,state}: uso de los pools de psycopg
+  (size, available, waiting), muestreado cada POOL_SAMPLE_SECONDS.
+- dashboard_cache_requests_total{cache,result}: aciertos y fallos de las cachés
+  en memoria (hit ratio = hit / total en PromQL).
+- dashboard_export_jobs_in_progress{kind}: exportaciones PDF/CSV en curso.
+- dashboard_gemini_request_duration_seconds{operation,outcome},
+  dashboard_gemini_tokens_total{operation,kind} y
+  dashboard_gemini_fallbacks_total{operation,reason}: llamadas a Gemini.
+
+Las métricas de la petición se acumulan en el RequestStats de
+instrumentation.py y se vuelcan una vez al terminar (no una por consulta).
+
+Con varios workers (gunicorn/uvicorn --workers) hay que definir
+PROMETHEUS_MULTIPROC_DIR, un directorio vacío al arrancar: cada proceso
+escribe sus valores en archivos mmap y /metrics suma los de todos. Con
+gunicorn, llamar a `mark_process_dead(worker.pid)` en el hook child_exit para
+que los gauges de un worker muerto dejen de contar. Sin la variable cada
+proceso expone solo los suyos (runserver, tests).
+"""
+
+import functools
+import hmac
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+
+POOL_SAMPLE_SECONDS = 5
+
+# Latencias de la API: la mayoría bajo 1 s; exportaciones e IA llegan a decenas
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+GEMINI_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+http_duration = Histogram(
+    'dashboard_http_request_duration_seconds', 'Latencia de las peticiones por vista',
+    ['view', 'method'], buckets=HTTP_BUCKETS)
+http_requests = Counter(
+    'dashboard_http_requests', 'Peticiones por vista y código de estado',
+    ['view', 'method', 'status'])
+db_queries = Counter(
+    'dashboard_db_queries', 'Consultas SQL por alias de BD', ['alias'])
+db_seconds = Counter(
+    'dashboard_db_query_seconds', 'Tiempo en consultas SQL por alias de BD', ['alias'])
+db_pool = Gauge(
+    'dashboard_db_pool_connections', 'Conexiones de los pools de psycopg por estado',
+    ['alias', 'state'], multiprocess_mode='livesum')
+cache_requests = Counter(
+    'dashboard_cache_requests', 'Consultas a las cachés en memoria por resultado',
+    ['cache', 'result'])
+export_jobs = Gauge(
+    'dashboard_export_jobs_in_progress', 'Exportaciones en curso', ['kind'],
+    multiprocess_mode='livesum')
+gemini_duration = Histogram(
+    'dashboard_gemini_request_duration_seconds', 'Latencia de las llamadas a Gemini',
+    ['operation', 'outcome'], buckets=GEMINI_BUCKETS)
+gemini_tokens = Counter(
+    'dashboard_gemini_tokens', 'Tokens de Gemini por tipo', ['operation', 'kind'])
+gemini_fallbacks = Counter(
+    'dashboard_gemini_fallbacks', 'Respuestas deterministas en lugar de la del modelo',
+    ['operation', 'reason'])
+
+_pool_lock = threading.Lock()
+_pool_sampled_at = 0.0
+
+
+def enabled():
+    return bool(getattr(settings, 'METRICS_ENABLED', True))
+
+
+def observe_request(request, response, stats, total):
+    """Vuelca las métricas de una petición (RequestTimingMiddleware)."""
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name or match._func_path) if match else '<sin ruta>'
+    http_duration.labels(view, request.method).observe(total)
+    http_requests.labels(view, request.method, str(response.status_code)).inc()
+    for alias, (count, seconds) in stats.by_alias.items():
+        db_queries.labels(alias).inc(count)
+        db_seconds.labels(alias).inc(seconds)
+    _sample_pools()
+
+
+def _sample_pools():
+    global _pool_sampled_at
+    now = time.monotonic()
+    if now - _pool_sampled_at < POOL_SAMPLE_SECONDS or not _pool_lock.acquire(blocking=False):
+        return
+    try:
+        _pool_sampled_at = now
+        from .db_pool import pool_stats
+        for alias, pool in pool_stats().items():
+            db_pool.labels(alias, 'size').set(pool.get('pool_size', 0))
+            db_pool.labels(alias, 'available').set(pool.get('pool_available', 0))
+            db_pool.labels(alias, 'waiting').set(pool.get('requests_waiting', 0))
+    finally:
+        _pool_lock.release()
+
+
+def cache_result(cache, result):
+    cache_requests.labels(cache, result).inc()
+
+
+def track_export(kind):
+    """Decorador de los get() de exportación: cuenta las que están en curso."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with export_jobs.labels(kind).track_inprogress():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_gemini(operation, seconds, result=None, error=False):
+    gemini_duration.labels(operation, 'error' if error else 'ok').observe(seconds)
+    usage = getattr(result, 'usage_metadata', None)
+    if usage is not None:
+        for kind, attr in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count')):
+            count = getattr(usage, attr, None)
+            if count:
+                gemini_tokens.labels(operation, kind).inc(count)
+
+
+def gemini_fallback(operation, reason):
+    gemini_fallbacks.labels(operation, reason).inc()
+
+
+def mark_process_dead(pid):
+    """Hook child_exit de gunicorn: descarta los gauges del worker muerto."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+def exposition():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def metrics_view(request):
+    """GET /metrics. Con METRICS_TOKEN exige `Authorization: Bearer <token>`;
+    sin él, un usuario staff (sesión o JWT), como DBPoolStatsView."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        # Comparación en tiempo constante: no revela el token por la latencia
+        # (en bytes: con str, compare_digest rechaza cabeceras no ASCII)
+        allowed = hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                      f'Bearer {token}'.encode())
+    else:
+        from .profiling import staff_user
+        allowed = staff_user(request) is not None
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE_LATEST)
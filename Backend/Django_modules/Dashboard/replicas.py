@@ -0,0 +1,202 @@
+"""Lecturas en réplicas por tienda (opcional).
+
+Una tienda tiene réplica si su entrada del registro define la opción
+'replica' con un alias de settings.DATABASES (ver DB_<ALIAS>_REPLICA_* en
+settings). PathRouter envía a la réplica solo las lecturas:
+
+- hechas dentro de `replica_reads()` (métricas, exportaciones y el contexto
+  de la IA: la middleware lo activa en GET a settings.REPLICA_READ_PATHS),
+- de los modelos analíticos (REPLICA_MODELS; usuarios y perfiles siempre
+  van al primario),
+- cuando el cliente no escribió en los últimos REPLICA_STICKY_SECONDS
+  (read-your-writes: la respuesta de una escritura lleva la cookie firmada
+  REPLICA_STICKY_COOKIE con el plazo por primario, así la ve el worker que
+  atienda la siguiente petición), y
+- cuando la réplica responde y su retraso no supera REPLICA_MAX_LAG_SECONDS.
+  El estado se comprueba como mucho cada REPLICA_HEALTH_TTL segundos.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Modelos (Meta.label_lower) cuyas lecturas pueden ir a la réplica
+REPLICA_MODELS = {
+    'Dashboard.clientes', 'Dashboard.productos', 'Dashboard.ventas', 'Dashboard.ventaitem',
+    'Dashboard.tasa', 'Dashboard.modeloprediccion', 'Dashboard.entradaprediccion',
+    'Dashboard.recomendacionia',
+}
+
+LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_replica_reads = contextvars.ContextVar('dashboard_replica_reads', default=False)
+_request_state = contextvars.ContextVar('dashboard_replica_request', default=None)
+
+_health_lock = threading.Lock()
+_health = {}  # alias réplica -> (instante de la comprobación, sana, retraso en s)
+
+
+STICKY_SALT = 'Dashboard.replicas.sticky'
+
+
+class _RequestState:
+    __slots__ = ('request', 'written', '_sticky')
+
+    def __init__(self, request):
+        self.request = request
+        self.written = set()   # primarios en los que escribió esta petición
+        self._sticky = None    # primario -> hasta cuándo leer de él (cookie)
+
+    def sticky(self):
+        if self._sticky is None:
+            value = self.request.COOKIES.get(_cookie_name())
+            try:
+                data = signing.loads(value, salt=STICKY_SALT) if value else {}
+            except signing.BadSignature:
+                data = {}
+            self._sticky = data if isinstance(data, dict) else {}
+        return self._sticky
+
+    def remember(self, response):
+        """Cookie con los primarios en los que escribió esta petición."""
+        if not self.written:
+            return
+        ttl = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+        now = time.time()
+        until = {primary: t for primary, t in self.sticky().items()
+                 if isinstance(t, (int, float)) and t > now}
+        until.update(dict.fromkeys(self.written, now + ttl))
+        response.set_cookie(_cookie_name(), signing.dumps(until, salt=STICKY_SALT), max_age=ttl,
+                            httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE)
+
+
+def _cookie_name():
+    return getattr(settings, 'REPLICA_STICKY_COOKIE', 'replica_sticky')
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Permite que las lecturas del bloque vayan a la réplica de la tienda."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def request_scope(request):
+    """Estado read-your-writes de una petición (lo usa la middleware, que
+    pasa la respuesta a `remember()`)."""
+    state = _RequestState(request)
+    token = _request_state.set(state)
+    read_token = None
+    if request.method in ('GET', 'HEAD') and request.path_info.startswith(
+            tuple(getattr(settings, 'REPLICA_READ_PATHS', ()))):
+        read_token = _replica_reads.set(True)
+    try:
+        yield state
+    finally:
+        if read_token is not None:
+            _replica_reads.reset(read_token)
+        _request_state.reset(token)
+
+
+def note_write(primary):
+    """Registra una escritura de la sesión actual en `primary`."""
+    state = _request_state.get()
+    if state is not None:
+        state.written.add(primary)
+
+
+def _is_sticky(primary):
+    state = _request_state.get()
+    if state is None:
+        return False
+    if primary in state.written:
+        return True
+    until = state.sticky().get(primary)
+    return isinstance(until, (int, float)) and until > time.time()
+
+
+def replica_for(primary):
+    from .stores import store_for_alias
+    entry = store_for_alias(primary or DEFAULT_DB_ALIAS)
+    replica = entry.options.get('replica') if entry is not None else None
+    return replica if replica in connections.settings else None
+
+
+_primaries = None
+
+
+def primary_of(alias):
+    """Alias primario de una réplica (o el mismo alias si no es réplica)."""
+    global _primaries
+    if _primaries is None:
+        from .stores import configured_stores
+        _primaries = {e.options['replica']: e.alias
+                      for e in configured_stores() if e.options.get('replica')}
+    return _primaries.get(alias, alias)
+
+
+def _probe(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            lag = float(cursor.fetchone()[0] or 0)
+        return lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10), lag
+    except Exception as exc:
+        logger.warning("Réplica %s no disponible: %s", alias, exc)
+        try:
+            connections[alias].close()
+        except Exception:
+            pass
+        return False, None
+
+
+def replica_healthy(alias):
+    ttl = getattr(settings, 'REPLICA_HEALTH_TTL', 5)
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < ttl:
+        return checked[1]
+    # Un solo hilo comprueba; los demás usan el último estado conocido
+    if not _health_lock.acquire(blocking=checked is None):
+        return checked[1]
+    try:
+        ok, lag = _probe(alias)
+        if checked is not None and checked[1] != ok:
+            logger.info("Réplica %s %s (retraso=%s)", alias,
+                        'disponible' if ok else 'descartada', lag)
+        _health[alias] = (time.monotonic(), ok, lag)
+        return ok
+    finally:
+        _health_lock.release()
+
+
+def read_alias(model, primary):
+    """Alias para una lectura de `model` cuyo primario es `primary` (None: default)."""
+    if not _replica_reads.get() or model._meta.label_lower not in REPLICA_MODELS:
+        return primary
+    replica = replica_for(primary)
+    if replica is None or _is_sticky(primary or DEFAULT_DB_ALIAS):
+        return primary
+    return replica if replica_healthy(replica) else primary
+
+
+def replica_status():
+    """Último estado conocido de cada réplica: {alias: {healthy, lag_seconds}}."""
+    return {alias: {'healthy': ok, 'lag_seconds': lag}
+            for alias, (_t, ok, lag) in _health.items()}
@@ -3,6 +3,7 @@ from rest_framework.validators import UniqueValidator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 
+from .fast_serializers import estado_cliente, estado_producto, segmento_cliente
 from .models import Clientes, Productos, Ventas, ModeloPrediccion, EntradaPrediccion, RecomendacionIA, VentaItem, Tasa, UserProfile, Store
 
 
@@ -24,20 +25,7 @@ class Clientes_Serializers(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_estado(self, obj):
-        ultima = getattr(obj, 'ultima_compra', None)
-        if not ultima:
-            return 'inactivo'
-        try:
-            ultima_date = ultima.date() if hasattr(ultima, 'date') else ultima
-        except Exception:
-            ultima_date = None
-        if not ultima_date:
-            return 'inactivo'
-        from django.utils import timezone
-        from datetime import timedelta
-        if (timezone.now().date() - ultima_date) <= timedelta(days=365):
-            return 'activo'
-        return 'inactivo'
+        return estado_cliente(getattr(obj, 'ultima_compra', None))
 
     def get_nombre(self, obj):
         return f"{obj.nombre} {obj.apellido}".strip()
@@ -47,15 +35,7 @@ class Clientes_Serializers(serializers.ModelSerializer):
 
     def get_segmento(self, obj):
         # Determinar segmento a partir de la cantidad de compras si está disponible
-        try:
-            compras = int(getattr(obj, 'cantidad_compras', 0) or 0)
-        except Exception:
-            compras = 0
-        if compras <= 5:
-            return 'nuevo'
-        if compras > 50:
-            return 'vip'
-        return 'frecuente'
+        return segmento_cliente(getattr(obj, 'cantidad_compras', 0))
     # display_id ahora es un campo del modelo (persistente); se incluirá en
     # la serialización automáticamente por fields='__all__'
 
@@ -76,15 +56,7 @@ class Productos_Serializers(serializers.ModelSerializer):
 
     def get_estado(self, obj):
         # Determinar estado a partir del stock para asegurar consistencia
-        try:
-            stock = int(getattr(obj, 'stock', 0) or 0)
-        except Exception:
-            stock = 0
-        if stock == 0:
-            return 'agotado'
-        if stock < 50:
-            return 'bajo-stock'
-        return 'activo'
+        return estado_producto(getattr(obj, 'stock', 0))
 
 
 class Tasa_Serializers(serializers.ModelSerializer):
@@ -142,21 +114,6 @@ class RecomendacionIA_Serializers(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class VentaItem_Serializers(serializers.ModelSerializer):
-    producto_nombre = serializers.SerializerMethodField()
-
-    class Meta:
-        model = VentaItem
-        fields = ('id', 'venta', 'producto', 'producto_nombre',
-                  'cantidad', 'precio_unitario', 'precio_total')
-
-    def get_producto_nombre(self, obj):
-        try:
-            return obj.producto.nombre
-        except Exception:
-            return str(obj.producto)
-
-
 # Serializer para registro de usuarios
 User = get_user_model()
 
@@ -0,0 +1,181 @@
+"""Fan-out de una métrica a varias tiendas en paralelo y consolidación.
+
+Cada tienda se consulta en un hilo del pool (StoreAwareExecutor) dentro de
+`using_store(alias)`. En PostgreSQL la consulta corre con `statement_timeout`
+igual al timeout de la tienda, así una BD lenta no retiene el hilo ni la
+respuesta: la tienda se marca como 'timeout' y el resto se devuelve igual.
+Cada tienda queda en uso (stores.acquire) hasta que su tarea termina de verdad,
+aunque la respuesta ya haya salido: el LRU de alias dinámicos no cierra una BD
+que un hilo del pool sigue usando.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import wait
+from typing import Callable, Dict, List
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .. import stores as store_registry
+from ..db_router import StoreAwareExecutor, using_store
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> StoreAwareExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = StoreAwareExecutor(
+                max_workers=getattr(settings, 'CROSS_STORE_MAX_WORKERS', 8),
+                thread_name_prefix='cross-store')
+    return _executor
+
+
+def _run_in_store(alias: str, timeout: float, fn: Callable):
+    started = time.monotonic()
+    try:
+        with using_store(alias):
+            with transaction.atomic(using=alias):
+                if connections[alias].vendor == 'postgresql':
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                                       [str(int(timeout * 1000))])
+                data = fn()
+        return data, (time.monotonic() - started) * 1000
+    finally:
+        # Conexiones de este hilo del pool: devolverlas al terminar la tarea
+        connections.close_all()
+
+
+def _submit(executor, alias: str, timeout: float, fn: Callable, entry=None):
+    """Lanza fn en `alias`; la tienda `entry` queda en uso hasta que la tarea
+    termina (o se cancela)."""
+    if entry is not None:
+        store_registry.acquire(entry)
+    try:
+        future = executor.submit(_run_in_store, alias, timeout, fn)
+    except BaseException:
+        if entry is not None:
+            store_registry.release(entry)
+        raise
+    if entry is not None:
+        future.add_done_callback(lambda _future: store_registry.release(entry))
+    return future
+
+
+def fan_out(stores, fn: Callable, timeout: float) -> Dict[str, dict]:
+    """Ejecuta `fn()` en cada tienda y devuelve {slug: resultado}.
+
+    Resultado por tienda: {'status': 'ok', 'data', 'elapsed_ms'} o
+    {'status': 'timeout'|'error', 'detail'}.
+    """
+    executor = _get_executor()
+    futures = OrderedDict(
+        (entry.slug, _submit(executor, entry.alias, timeout, fn, entry))
+        for entry in stores
+    )
+    wait(list(futures.values()), timeout=timeout)
+    return _collect(futures, timeout)
+
+
+async def afan_out(tasks: Dict[str, tuple], timeout: float) -> Dict[str, dict]:
+    """Versión async: `tasks` es {clave: (alias, fn)}; devuelve {clave: resultado}.
+
+    Las funciones corren en el mismo pool de hilos que fan_out(); la corrutina
+    solo espera, sin bloquear el event loop. El formato de cada resultado es
+    el de fan_out().
+    """
+    executor = _get_executor()
+    futures = OrderedDict(
+        (key, _submit(executor, alias, timeout, fn, store_registry.store_for_alias(alias)))
+        for key, (alias, fn) in tasks.items()
+    )
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(f) for f in futures.values()],
+                           timeout=timeout)
+    return _collect(futures, timeout)
+
+
+def _collect(futures, timeout: float) -> Dict[str, dict]:
+    results = OrderedDict()
+    for key, future in futures.items():
+        if not future.done():
+            future.cancel()
+            results[key] = {'status': 'timeout',
+                            'detail': f'Sin respuesta en {timeout:g}s'}
+            continue
+        try:
+            data, elapsed_ms = future.result()
+            results[key] = {'status': 'ok', 'data': data,
+                            'elapsed_ms': round(elapsed_ms, 1)}
+        except Exception as exc:
+            results[key] = {'status': 'error', 'detail': str(exc)}
+    return results
+
+
+def _add_numbers(acc: dict, row: dict, skip=()):
+    for key, value in row.items():
+        if key in skip or isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        acc[key] = acc.get(key, 0) + value
+
+
+def merge_monthly(series: List[List[dict]]) -> List[dict]:
+    """Suma por mes los valores numéricos de cada tienda."""
+    by_month = {}
+    for rows in series:
+        for row in rows:
+            acc = by_month.setdefault(
+                row['month'], {'month': row['month'], 'month_label': row.get('month_label')})
+            _add_numbers(acc, row)
+    out = [by_month[m] for m in sorted(by_month)]
+    for row in out:
+        for key, value in row.items():
+            if isinstance(value, float):
+                row[key] = round(value, 2)
+    return out
+
+
+def merge_by_category(series: List[List[dict]]) -> List[dict]:
+    """Suma ingresos y costo por categoría y recalcula el margen."""
+    by_cat = {}
+    for rows in series:
+        for row in rows:
+            acc = by_cat.setdefault(row['category'], {
+                                    'category': row['category'], 'revenue': 0.0, 'cost': 0.0})
+            acc['revenue'] += float(row.get('revenue') or 0)
+            acc['cost'] += float(row.get('cost') or 0)
+    out = []
+    for acc in by_cat.values():
+        revenue, cost = acc['revenue'], acc['cost']
+        margin_pct = ((revenue - cost) / revenue * 100) if revenue > 0 else 0.0
+        out.append({'category': acc['category'], 'revenue': round(revenue, 2),
+                    'cost': round(cost, 2), 'margin_pct': round(margin_pct, 1)})
+    out.sort(key=lambda r: r['revenue'], reverse=True)
+    return out
+
+
+def merge_top_products(series: List[List[dict]], sort: str = 'units', limit: int = 5) -> List[dict]:
+    """Une los top de cada tienda por nombre de producto.
+
+    Cada tienda aporta solo su top N, por lo que el consolidado es una
+    aproximación del top global (exacto si los tops no difieren mucho).
+    """
+    by_name = {}
+    for rows in series:
+        for row in rows:
+            name = row.get('producto')
+            acc = by_name.setdefault(
+                name, {'producto': name, 'ventas': 0.0, 'unidades': 0})
+            acc['ventas'] += float(row.get('ventas') or 0)
+            acc['unidades'] += int(row.get('unidades') or 0)
+    key = 'ventas' if sort == 'revenue' else 'unidades'
+    out = sorted(by_name.values(), key=lambda r: r[key], reverse=True)[:limit]
+    for row in out:
+        row['ventas'] = round(row['ventas'], 2)
+    return out
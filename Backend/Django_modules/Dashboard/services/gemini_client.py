@@ -1,15 +1,21 @@
 import os
+import time
 from datetime import timedelta
 from typing import Iterable, List, Optional, Tuple, Dict
 
+from asgiref.sync import sync_to_async
 from google import genai
+from google.genai import types
 import json
 from decimal import Decimal
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Sum, F
 from django.db.models.functions import TruncMonth
 
+from .. import prometheus
 from ..models import Productos, Ventas, VentaItem
+from ..replicas import replica_reads
 
 
 class GeminiError(Exception):
@@ -24,12 +30,18 @@ MONTH_LABELS_ES = [
 
 def _get_client() -> genai.Client:
     api_key = os.environ.get("GEMINI_API_KEY")
+    base_url = getattr(settings, "GEMINI_BASE_URL", "")
+    if base_url:
+        # Servidor compatible (p. ej. gemini_standin.py): la clave no se valida
+        return genai.Client(api_key=api_key or "simulado",
+                            http_options=types.HttpOptions(base_url=base_url))
     if not api_key:
         raise GeminiError("Falta la variable de entorno GEMINI_API_KEY")
     # Nuevo SDK
     return genai.Client(api_key=api_key)
 
 
+@replica_reads()
 def _collect_product_context(
     product_ids: Optional[Iterable[int]] = None,
     category: Optional[str] = None,
@@ -67,17 +79,17 @@ def _collect_product_context(
 
     # Ventas recientes (últimos 30) y previas (30-60) para cambio de demanda.
     recent_qs = (
-        VentaItem.objects.select_related("venta")
-        .filter(venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=last_30)
+        VentaItem.objects
+        .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=last_30)
         .values("producto_id")
         .annotate(units=Sum("cantidad"), revenue=Sum("precio_total"))
     )
     prev_qs = (
-        VentaItem.objects.select_related("venta")
+        VentaItem.objects
         .filter(
-            venta__estado=Ventas.ESTADO_COMPLETADA,
-            venta__fecha__gte=prev_30,
-            venta__fecha__lt=last_30,
+            venta_estado=Ventas.ESTADO_COMPLETADA,
+            venta_fecha__gte=prev_30,
+            venta_fecha__lt=last_30,
         )
         .values("producto_id")
         .annotate(units=Sum("cantidad"), revenue=Sum("precio_total"))
@@ -372,22 +384,125 @@ def _evaluate_options(products_ctx: List[dict]) -> Tuple[dict, List[dict]]:
     return best_opt, options
 
 
-def generate_ai_recommendation(
+def _prepare_recommendation(
     product_ids: Optional[Iterable[int]] = None,
     category: Optional[str] = None,
     limit: Optional[int] = None,
-) -> dict:
+) -> Tuple[List[dict], str]:
+    """Contexto de productos (consultas a la BD) y prompt para Gemini."""
     products_ctx = _collect_product_context(
         product_ids=product_ids, category=category, limit=limit)
     if not products_ctx:
         raise GeminiError(
             "No se encontraron productos para generar la recomendación")
+    return products_ctx, _build_prompt(products_ctx)
 
-    # Construir prompt y pedir a Gemini que elija recomendación basada en datos
-    client = _get_client()
-    model_name = os.environ.get("GEMINI_MODEL", "gemini-3-flash-preview")
-    prompt = _build_prompt(products_ctx)
 
+def _model_name() -> str:
+    return os.environ.get("GEMINI_MODEL", "gemini-3-flash-preview")
+
+
+def _generate(client: genai.Client, prompt: str, operation: str) -> str:
+    """Texto de la respuesta del modelo; registra latencia y tokens (/metrics)."""
+    started = time.perf_counter()
+    try:
+        result = client.models.generate_content(model=_model_name(), contents=prompt)
+    except Exception:
+        prometheus.observe_gemini(operation, time.perf_counter() - started, error=True)
+        raise
+    prometheus.observe_gemini(operation, time.perf_counter() - started, result)
+    return (getattr(result, "text", "") or "").strip()
+
+
+async def _agenerate(client: genai.Client, prompt: str, operation: str) -> str:
+    started = time.perf_counter()
+    try:
+        result = await client.aio.models.generate_content(model=_model_name(), contents=prompt)
+    except Exception:
+        prometheus.observe_gemini(operation, time.perf_counter() - started, error=True)
+        raise
+    prometheus.observe_gemini(operation, time.perf_counter() - started, result)
+    return (getattr(result, "text", "") or "").strip()
+
+
+def _recommendation_on_error(products_ctx: List[dict], exc: Exception) -> dict:
+    # Si cuota/429 u otros errores, hacer fallback determinista para no romper la UX
+    msg = str(exc)
+    if "Quota" in msg or "429" in msg or "rate limit" in msg.lower():
+        prometheus.gemini_fallback("recommendation", "quota")
+        best_card, _options = _evaluate_options(products_ctx)
+        pf = best_card.get("product_focus")
+        out = {
+            "title": best_card.get("title"),
+            "type": best_card.get("type"),
+            "change_pct": best_card.get("change_pct"),
+            "description": best_card.get("description"),
+            "impact": best_card.get("impact"),
+            "product_id": pf.get("id") if pf else None,
+            "product_name": pf.get("nombre") if pf else "",
+        }
+        # Continuar con el flujo normal usando datos de fallback
+        data = out
+        reco_type = (data.get("type") or "").strip()
+        marketing_priority, stock_priority = _compute_priorities(
+            products_ctx)
+
+        def _derive_priority(rt: str) -> str:
+            if rt in {"pricing_increase", "pricing_decrease"}:
+                return marketing_priority
+            if rt in {"promo_campaign", "discount", "bundle"}:
+                return "media" if marketing_priority == "alta" else marketing_priority
+            return marketing_priority
+
+        derived_priority = _derive_priority(reco_type)
+        prio_rank = {"baja": 0, "media": 1, "alta": 2}
+        best_context_priority = max([derived_priority, stock_priority], key=lambda p: prio_rank.get(
+            p, 0)) if stock_priority else derived_priority
+        priority = best_context_priority
+
+        pr_cap = priority.capitalize()
+        description = (data.get("description") or "").strip()
+        impact = (data.get("impact") or "").strip()
+        title = (data.get("title") or "Recomendación").strip()
+        product_id = data.get("product_id")
+        product_name = data.get("product_name") or ""
+        try:
+            product_id = int(
+                product_id) if product_id is not None else None
+        except Exception:
+            product_id = None
+        product_label = f"Producto: {product_name} (ID {product_id})" if product_name or product_id else "Producto no identificado"
+
+        lines = [f"{title} · {product_label}", pr_cap, description]
+        if impact:
+            lines.append("")
+            lines.append(impact)
+        summary = "\n".join(lines)
+
+        return {
+            "summary": summary,
+            "card": {
+                "title": title,
+                "priority": priority,
+                "type": reco_type,
+                "description": description,
+                "impact": impact,
+                "change_pct": data.get("change_pct"),
+                "product_id": product_id,
+                "product_name": product_name,
+                "product_label": product_label,
+            },
+            "products": products_ctx,
+            "debug": {
+                "metrics": products_ctx,
+                "best_option": best_card,
+                "fallback_reason": "quota_exceeded",
+            },
+        }
+    raise GeminiError(f"Error al invocar Gemini: {exc}")
+
+
+def _recommendation_from_text(products_ctx: List[dict], text: str) -> dict:
     def _extract_first_json_block(txt: str) -> str | None:
         if not txt:
             return None
@@ -406,86 +521,6 @@ def generate_ai_recommendation(
                         return txt[start:i+1]
         return None
 
-    try:
-        result = client.models.generate_content(
-            model=model_name, contents=prompt)
-        text = (getattr(result, "text", "") or "").strip()
-    except Exception as exc:  # noqa: BLE001
-        # Si cuota/429 u otros errores, hacer fallback determinista para no romper la UX
-        msg = str(exc)
-        if "Quota" in msg or "429" in msg or "rate limit" in msg.lower():
-            best_card, _options = _evaluate_options(products_ctx)
-            pf = best_card.get("product_focus")
-            out = {
-                "title": best_card.get("title"),
-                "type": best_card.get("type"),
-                "change_pct": best_card.get("change_pct"),
-                "description": best_card.get("description"),
-                "impact": best_card.get("impact"),
-                "product_id": pf.get("id") if pf else None,
-                "product_name": pf.get("nombre") if pf else "",
-            }
-            # Continuar con el flujo normal usando datos de fallback
-            data = out
-            reco_type = (data.get("type") or "").strip()
-            marketing_priority, stock_priority = _compute_priorities(
-                products_ctx)
-
-            def _derive_priority(rt: str) -> str:
-                if rt in {"pricing_increase", "pricing_decrease"}:
-                    return marketing_priority
-                if rt in {"promo_campaign", "discount", "bundle"}:
-                    return "media" if marketing_priority == "alta" else marketing_priority
-                return marketing_priority
-
-            derived_priority = _derive_priority(reco_type)
-            prio_rank = {"baja": 0, "media": 1, "alta": 2}
-            best_context_priority = max([derived_priority, stock_priority], key=lambda p: prio_rank.get(
-                p, 0)) if stock_priority else derived_priority
-            priority = best_context_priority
-
-            pr_cap = priority.capitalize()
-            description = (data.get("description") or "").strip()
-            impact = (data.get("impact") or "").strip()
-            title = (data.get("title") or "Recomendación").strip()
-            product_id = data.get("product_id")
-            product_name = data.get("product_name") or ""
-            try:
-                product_id = int(
-                    product_id) if product_id is not None else None
-            except Exception:
-                product_id = None
-            product_label = f"Producto: {product_name} (ID {product_id})" if product_name or product_id else "Producto no identificado"
-
-            lines = [f"{title} · {product_label}", pr_cap, description]
-            if impact:
-                lines.append("")
-                lines.append(impact)
-            summary = "\n".join(lines)
-
-            return {
-                "summary": summary,
-                "card": {
-                    "title": title,
-                    "priority": priority,
-                    "type": reco_type,
-                    "description": description,
-                    "impact": impact,
-                    "change_pct": data.get("change_pct"),
-                    "product_id": product_id,
-                    "product_name": product_name,
-                    "product_label": product_label,
-                },
-                "products": products_ctx,
-                "debug": {
-                    "metrics": products_ctx,
-                    "best_option": best_card,
-                    "fallback_reason": "quota_exceeded",
-                },
-            }
-        else:
-            raise GeminiError(f"Error al invocar Gemini: {exc}")
-
     if not text:
         raise GeminiError("Gemini no devolvió texto")
 
@@ -522,12 +557,14 @@ def generate_ai_recommendation(
         return out
 
     if data is None or not isinstance(data, dict):
+        prometheus.gemini_fallback("recommendation", "invalid_output")
         data = _fallback_best()
     else:
         # Asegurar campos esenciales
         rtype = str((data.get("type") or "").strip())
         if rtype not in allowed_types:
             # fallback si type no válido
+            prometheus.gemini_fallback("recommendation", "invalid_output")
             data = _fallback_best()
         else:
             # Normalizar change_pct
@@ -633,6 +670,46 @@ def generate_ai_recommendation(
     }
 
 
+def generate_ai_recommendation(
+    product_ids: Optional[Iterable[int]] = None,
+    category: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> dict:
+    products_ctx, prompt = _prepare_recommendation(
+        product_ids=product_ids, category=category, limit=limit)
+
+    # Pedir a Gemini que elija recomendación basada en datos
+    client = _get_client()
+    try:
+        text = _generate(client, prompt, "recommendation")
+    except Exception as exc:  # noqa: BLE001
+        return _recommendation_on_error(products_ctx, exc)
+    return _recommendation_from_text(products_ctx, text)
+
+
+async def agenerate_ai_recommendation(
+    product_ids: Optional[Iterable[int]] = None,
+    category: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> dict:
+    """Versión async de generate_ai_recommendation para las vistas ASGI.
+
+    El contexto se consulta con el ORM en un hilo (sync_to_async conserva el
+    alias de la tienda del ContextVar) y la llamada a Gemini usa el cliente
+    async del SDK: el event loop sigue atendiendo otras peticiones mientras
+    el modelo responde.
+    """
+    products_ctx, prompt = await sync_to_async(_prepare_recommendation)(
+        product_ids=product_ids, category=category, limit=limit)
+
+    client = _get_client()
+    try:
+        text = await _agenerate(client, prompt, "recommendation")
+    except Exception as exc:  # noqa: BLE001
+        return _recommendation_on_error(products_ctx, exc)
+    return _recommendation_from_text(products_ctx, text)
+
+
 # =============================
 # Salidas estructuradas (JSON)
 # =============================
@@ -646,6 +723,7 @@ def _to_float(value) -> float:
         return 0.0
 
 
+@replica_reads()
 def build_structured_monthly(metric: str = "revenue", n_months: int = 6) -> dict:
     """Devuelve una estructura JSON con valores mensuales.
 
@@ -663,9 +741,8 @@ def build_structured_monthly(metric: str = "revenue", n_months: int = 6) -> dict
     # Agregamos por mes usando VentaItem para consistencia (precio_total/cantidad)
     qs = (
         VentaItem.objects
-        .select_related("venta")
-        .filter(venta__estado=Ventas.ESTADO_COMPLETADA)
-        .annotate(month=TruncMonth("venta__fecha"))
+        .filter(venta_estado=Ventas.ESTADO_COMPLETADA)
+        .annotate(month=TruncMonth("venta_fecha"))
         .values("month")
     )
 
@@ -696,6 +773,7 @@ def build_structured_monthly(metric: str = "revenue", n_months: int = 6) -> dict
     }
 
 
+@replica_reads()
 def build_structured_by_product(metric: str = "revenue", days: int = 30, limit: Optional[int] = None) -> dict:
     """Devuelve valores agregados por producto para un periodo reciente.
 
@@ -713,9 +791,8 @@ def build_structured_by_product(metric: str = "revenue", days: int = 30, limit:
 
     qs = (
         VentaItem.objects
-        .select_related("venta", "producto")
-        .filter(venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=since)
-        .values("producto_id", "producto__nombre", "producto__categoria")
+        .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=since)
+        .values("producto_id", "categoria")
     )
 
     if metric == "units":
@@ -728,6 +805,8 @@ def build_structured_by_product(metric: str = "revenue", days: int = 30, limit:
     rows.sort(key=lambda r: _to_float(r.get("value")), reverse=True)
     if limit:
         rows = rows[:limit]
+    names = dict(Productos.objects.filter(
+        id__in=[r.get("producto_id") for r in rows]).values_list("id", "nombre"))
 
     items = []
     total = 0.0
@@ -735,8 +814,8 @@ def build_structured_by_product(metric: str = "revenue", days: int = 30, limit:
         val = _to_float(r.get("value"))
         items.append({
             "id": r.get("producto_id"),
-            "name": r.get("producto__nombre") or "",
-            "category": r.get("producto__categoria") or "",
+            "name": names.get(r.get("producto_id")) or "",
+            "category": r.get("categoria") or "",
             "value": val,
         })
         total += val
@@ -750,6 +829,7 @@ def build_structured_by_product(metric: str = "revenue", days: int = 30, limit:
     }
 
 
+@replica_reads()
 def build_structured_by_category(metric: str = "revenue", days: int = 30) -> dict:
     """Devuelve valores agregados por categoría para un periodo reciente.
 
@@ -767,9 +847,8 @@ def build_structured_by_category(metric: str = "revenue", days: int = 30) -> dic
 
     qs = (
         VentaItem.objects
-        .select_related("venta", "producto")
-        .filter(venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=since)
-        .values("producto__categoria")
+        .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=since)
+        .values("categoria")
     )
 
     if metric == "units":
@@ -785,7 +864,7 @@ def build_structured_by_category(metric: str = "revenue", days: int = 30) -> dic
     for r in rows:
         val = _to_float(r.get("value"))
         items.append({
-            "category": r.get("producto__categoria") or "",
+            "category": r.get("categoria") or "",
             "value": val,
         })
         total += val
@@ -892,12 +971,7 @@ Calcula una predicción razonable para cada label provisto, manteniendo el mismo
 """.strip()
         try:
             client = _get_client()
-            model_name = os.environ.get(
-                "GEMINI_MODEL", "gemini-3-flash-preview")
-            result = client.models.generate_content(
-                model=model_name, contents=prompt)
-            data = _safe_json_loads(
-                (getattr(result, "text", "") or "").strip()) or {}
+            data = _safe_json_loads(_generate(client, prompt, "forecast_monthly")) or {}
             out = []
             for it in (data.get("items") or []):
                 label = str(it.get("label") or "")
@@ -924,6 +998,8 @@ Calcula una predicción razonable para cada label provisto, manteniendo el mismo
             pass
 
     # Fallback: tendencia lineal simple sobre últimos 3 valores
+    if items:
+        prometheus.gemini_fallback("forecast_monthly", "model_output" if model else "unavailable")
     vals = [float(it['value']) for it in items]
     out = []
     if len(vals) >= 3:
@@ -962,12 +1038,7 @@ Calcula demanda predicha por producto.
 """.strip()
         try:
             client = _get_client()
-            model_name = os.environ.get(
-                "GEMINI_MODEL", "gemini-3-flash-preview")
-            result = client.models.generate_content(
-                model=model_name, contents=prompt)
-            data = _safe_json_loads(
-                (getattr(result, "text", "") or "").strip()) or {}
+            data = _safe_json_loads(_generate(client, prompt, "forecast_by_product")) or {}
             out = []
             by_id = {int(it['id']): it for it in items if it.get(
                 'id') is not None}
@@ -991,6 +1062,8 @@ Calcula demanda predicha por producto.
         except Exception:
             pass
     # Fallback: aumentar 5% si top, reducir 5% si bottom
+    if items:
+        prometheus.gemini_fallback("forecast_by_product", "model_output" if model else "unavailable")
     out = []
     if items:
         for idx, it in enumerate(items):
@@ -1020,12 +1093,7 @@ Calcula ingresos predichos por categoría.
 """.strip()
         try:
             client = _get_client()
-            model_name = os.environ.get(
-                "GEMINI_MODEL", "gemini-3-flash-preview")
-            result = client.models.generate_content(
-                model=model_name, contents=prompt)
-            data = _safe_json_loads(
-                (getattr(result, "text", "") or "").strip()) or {}
+            data = _safe_json_loads(_generate(client, prompt, "forecast_by_category")) or {}
             out = []
             by_cat = {str(it['category']): it for it in items}
             for it in (data.get("items") or []):
@@ -1052,6 +1120,8 @@ Calcula ingresos predichos por categoría.
         except Exception:
             pass
     # Fallback: mover 3% hacia arriba
+    if items:
+        prometheus.gemini_fallback("forecast_by_category", "model_output" if model else "unavailable")
     return [{"category": it.get('category') or '', "pred": max(0.0, _to_float(it.get('value')) * 1.03), "confidence": None} for it in items]
 
 
@@ -0,0 +1,191 @@
+"""Servidor local que imita la API REST de Gemini (`manage.py gemini_simulado`).
+
+Atiende `POST /<versión>/models/<modelo>:generateContent` con el mismo JSON
+que la API real (candidates, usageMetadata, errores con code/status), así que
+el SDK (genai.Client, sync y aio) no nota la diferencia: basta con apuntar
+settings.GEMINI_BASE_URL a este servidor.
+
+La respuesta se arma a partir del prompt (los que construye gemini_client.py):
+recomendación para el primer producto del contexto o predicciones de cada
+línea de datos (mensual, por producto, por categoría).
+
+Comportamiento configurable para medir latencia, concurrencia y fallbacks:
+
+- latency / jitter: segundos de espera por petición (uniforme en
+  latency ± jitter).
+- rate_429: fracción de peticiones que responden 429 RESOURCE_EXHAUSTED.
+- rate_malformed: fracción con 200 y un texto de modelo con JSON roto (el
+  camino de fallback de gemini_client.py).
+
+Los resultados salen de random.Random(seed) en orden de llegada: con la misma
+semilla y las peticiones de una en una, la secuencia se repite.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_RE = re.compile(r'^/(?P<version>v\w+)/models/(?P<model>[^/:]+):generateContent$')
+RECOMMENDATION_RE = re.compile(r'^- id=(?P<id>\d+) \| (?P<name>.+?) \(cat:', re.MULTILINE)
+MONTH_RE = re.compile(r'^- (?P<label>\d{4}-\d{2}): (?P<value>[\d.]+)$', re.MULTILINE)
+PRODUCT_RE = re.compile(r'^- (?P<id>\d+) \| .*: (?P<value>[\d.]+)$', re.MULTILINE)
+CATEGORY_RE = re.compile(r'^- (?P<category>.+): (?P<value>[\d.]+)$', re.MULTILINE)
+
+
+def answer(prompt):
+    """Texto del modelo para un prompt de gemini_client.py (JSON válido)."""
+    match = RECOMMENDATION_RE.search(prompt)
+    if match and '"product_id"' in prompt:
+        return json.dumps({
+            'title': f"Campaña para {match['name']}",
+            'type': 'promo_campaign',
+            'change_pct': None,
+            'description': 'Respuesta del servidor simulado de Gemini.',
+            'impact': 'Sin estimación (simulado).',
+            'product_id': int(match['id']),
+            'product_name': match['name'],
+        }, ensure_ascii=False)
+    if '"label": "YYYY-MM"' in prompt:
+        items = [{'label': m['label'], 'pred': round(float(m['value']) * 1.05, 2), 'confidence': 70}
+                 for m in MONTH_RE.finditer(prompt)]
+    elif '"id": number' in prompt:
+        items = [{'id': int(m['id']), 'pred': round(float(m['value']) * 1.05, 2), 'confidence': 70}
+                 for m in PRODUCT_RE.finditer(prompt)]
+    elif '"category": string' in prompt:
+        items = [{'category': m['category'], 'pred': round(float(m['value']) * 1.05, 2), 'confidence': 70}
+                 for m in CATEGORY_RE.finditer(prompt)]
+    else:
+        items = []
+    return json.dumps({'items': items}, ensure_ascii=False)
+
+
+def malformed(text):
+    """El mismo JSON cortado a la mitad y con texto alrededor."""
+    return f"Claro, aquí está el análisis:\n```json\n{text[:max(1, len(text) // 2)]}\n```"
+
+
+def _prompt(body):
+    parts = []
+    for content in body.get('contents') or []:
+        for part in (content.get('parts') or []) if isinstance(content, dict) else []:
+            if isinstance(part, dict) and isinstance(part.get('text'), str):
+                parts.append(part['text'])
+    return '\n'.join(parts)
+
+
+class GeminiStandIn:
+    """Servidor multihilo (un hilo por conexión); start()/stop() o `with`."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, jitter=0.0,
+                 rate_429=0.0, rate_malformed=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_malformed = rate_malformed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'ok': 0, '429': 0, 'malformed': 0, 'bad_request': 0}
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='gemini-simulado',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def decide(self):
+        """(resultado, segundos de espera) de la próxima petición."""
+        with self._lock:
+            self.counts['requests'] += 1
+            roll = self._rng.random()
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        if roll < self.rate_429:
+            return '429', delay
+        if roll < self.rate_429 + self.rate_malformed:
+            return 'malformed', delay
+        return 'ok', delay
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'GeminiSimulado/1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        standin = self.server.standin
+        match = PATH_RE.match(self.path.split('?', 1)[0])
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if match is None:
+            standin._count('bad_request')
+            return self._error(404, 'NOT_FOUND', f'Ruta no soportada: {self.path}')
+        try:
+            body = json.loads(raw or b'{}')
+        except ValueError:
+            standin._count('bad_request')
+            return self._error(400, 'INVALID_ARGUMENT', 'Cuerpo JSON inválido')
+
+        outcome, delay = standin.decide()
+        if delay:
+            time.sleep(delay)
+        standin._count(outcome)
+        if outcome == '429':
+            return self._error(429, 'RESOURCE_EXHAUSTED',
+                               'Resource has been exhausted (e.g. check quota).')
+        prompt = _prompt(body)
+        text = answer(prompt)
+        if outcome == 'malformed':
+            text = malformed(text)
+        prompt_tokens, output_tokens = max(1, len(prompt) // 4), max(1, len(text) // 4)
+        self._json(200, {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': text}]},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+            'usageMetadata': {
+                'promptTokenCount': prompt_tokens,
+                'candidatesTokenCount': output_tokens,
+                'totalTokenCount': prompt_tokens + output_tokens,
+            },
+            'modelVersion': match['model'],
+        })
+
+    def _error(self, code, status, message):
+        self._json(code, {'error': {'code': code, 'message': message, 'status': status}})
+
+    def _json(self, code, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
@@ -0,0 +1,231 @@
+"""Log de consultas lentas con EXPLAIN automático e historial de planes.
+
+Un execute wrapper (instalado en todas las conexiones, como el de
+instrumentation.py) mide cada consulta; las que tardan SLOW_QUERY_MS o más
+se encolan con su alias, parámetros y la vista de la petición. Un hilo por
+proceso las procesa fuera de la petición:
+
+1. Huella: el SQL sin literales ni parámetros (listas IN colapsadas), así
+   `WHERE id = 1` y `WHERE id = 2` cuentan como la misma consulta.
+2. Acumulados de la huella en HuellaConsulta: llamadas, tiempo total y
+   máximo, vistas y alias que la lanzan.
+3. Para SELECT, como mucho una vez cada SLOW_QUERY_EXPLAIN_INTERVAL segundos
+   por huella: EXPLAIN (ANALYZE, BUFFERS) con los mismos parámetros en la
+   réplica de la tienda si está sana (ver replicas.py) o en el mismo alias,
+   con statement_timeout SLOW_QUERY_EXPLAIN_TIMEOUT_MS, en una transacción
+   que se deshace (sin ANALYZE si llama a pg_notify o nextval; explain.py).
+   El plan se guarda en PlanConsulta (se conservan los últimos
+   SLOW_QUERY_PLANS por huella).
+
+Todo se escribe en la BD default. El admin (Consultas lentas) ordena las
+huellas por tiempo total: ahí se ve qué vistas de métricas y qué filtros
+necesitan índices.
+
+Si la cola (SLOW_QUERY_QUEUE) está llena la consulta se descarta: el log
+nunca frena a las peticiones. Con SLOW_QUERY_ASYNC=False se procesa en el
+mismo hilo (tests).
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import instrumentation
+from .explain import explain as explain_plan, explainable
+
+logger = logging.getLogger(__name__)
+
+PARAMS_CHARS = 2000
+
+SlowQuery = namedtuple('SlowQuery', 'alias sql params ms view')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s|\$\d+')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+_local = threading.local()
+_lock = threading.Lock()
+_queue = None
+_worker = None
+_pid = None
+_explained = {}     # huella -> instante del último EXPLAIN (este proceso)
+dropped = 0
+
+
+def threshold_ms():
+    """Umbral en ms o None si el log está desactivado."""
+    if not getattr(settings, 'SLOW_QUERY_LOG', True):
+        return None
+    return float(getattr(settings, 'SLOW_QUERY_MS', 500))
+
+
+def normalize(sql):
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """(huella, sql normalizado)."""
+    normalized = normalize(sql)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+
+# Captura
+
+def capture_slow(execute, sql, params, many, context):
+    """Execute wrapper: encola las consultas que superan el umbral."""
+    limit = threshold_ms()
+    if limit is None or getattr(_local, 'internal', False):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        if ms >= limit:
+            # executemany: sin parámetros (son muchos) ni EXPLAIN
+            submit(SlowQuery(context['connection'].alias, sql, None if many else params, ms,
+                             instrumentation.current_view()))
+
+
+def install(connection, **kwargs):
+    """Receptor de connection_created (idempotente)."""
+    if capture_slow not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_slow)
+
+
+def submit(item):
+    global dropped
+    if not getattr(settings, 'SLOW_QUERY_ASYNC', True):
+        try:
+            record(item)
+        except Exception:
+            logger.exception("No se pudo registrar la consulta lenta de %s", item.alias)
+        return
+    try:
+        _ensure_worker().put_nowait(item)
+    except queue.Full:
+        dropped += 1
+
+
+def _ensure_worker():
+    global _queue, _worker, _pid
+    pid = os.getpid()
+    with _lock:
+        if _pid != pid or _worker is None or not _worker.is_alive():
+            # Tras un fork el hilo del padre no existe
+            _queue = queue.Queue(maxsize=int(getattr(settings, 'SLOW_QUERY_QUEUE', 1000)))
+            _worker = threading.Thread(target=_run, args=(_queue,), name='slow-queries', daemon=True)
+            _pid = pid
+            _worker.start()
+        return _queue
+
+
+def _run(items):
+    while True:
+        item = items.get()
+        try:
+            record(item)
+        except Exception:
+            logger.exception("No se pudo registrar la consulta lenta de %s", item.alias)
+        finally:
+            items.task_done()
+            if items.empty():
+                # Sin trabajo pendiente: no retener conexiones
+                connections.close_all()
+
+
+def drain():
+    """Espera a que se procesen las consultas encoladas (tests, comandos)."""
+    if _queue is not None and _pid == os.getpid():
+        _queue.join()
+
+
+# Procesado
+
+def record(item):
+    """Acumula la consulta en su huella y, si toca, guarda su plan."""
+    _local.internal = True
+    try:
+        huella, normalized = fingerprint(item.sql)
+        plan = explain(item) if _should_explain(huella, item) else None
+        _store(huella, normalized, item, plan)
+    finally:
+        _local.internal = False
+
+
+def _should_explain(huella, item):
+    if item.params is None and _PLACEHOLDER_RE.search(item.sql):
+        return False
+    if not explainable(item.sql):
+        return False
+    interval = float(getattr(settings, 'SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+    now = time.monotonic()
+    with _lock:
+        last = _explained.get(huella)
+        if last is not None and now - last < interval:
+            return False
+        _explained[huella] = now
+    return True
+
+
+def explain_alias(alias):
+    """Réplica sana de la tienda de `alias` o el mismo alias."""
+    from . import replicas
+    replica = replicas.replica_for(replicas.primary_of(alias))
+    if replica is not None and replica != alias and replicas.replica_healthy(replica):
+        return replica
+    return alias
+
+
+def explain(item):
+    """(alias del EXPLAIN, plan, error); ver explain.py."""
+    try:
+        alias = explain_alias(item.alias)
+        timeout = int(getattr(settings, 'SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 10_000))
+        return alias, explain_plan(alias, item.sql, item.params, timeout_ms=timeout), ''
+    except Exception as exc:
+        return item.alias, '', str(exc)
+
+
+def _store(huella, normalized, item, plan):
+    from .models import HuellaConsulta, PlanConsulta
+    now = timezone.now()
+    view = item.view or ''
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        entry, _created = (HuellaConsulta.objects.using(DEFAULT_DB_ALIAS).select_for_update()
+                           .get_or_create(huella=huella, defaults={'sql_normalizado': normalized}))
+        entry.vistas[view] = entry.vistas.get(view, 0) + 1
+        entry.alias[item.alias] = entry.alias.get(item.alias, 0) + 1
+        HuellaConsulta.objects.using(DEFAULT_DB_ALIAS).filter(pk=entry.pk).update(
+            llamadas=F('llamadas') + 1,
+            tiempo_total_ms=F('tiempo_total_ms') + item.ms,
+            tiempo_max_ms=max(entry.tiempo_max_ms, item.ms),
+            vistas=entry.vistas, alias=entry.alias, ultima_vez=now)
+        if plan is None:
+            return
+        explain_alias_, text, error = plan
+        PlanConsulta.objects.using(DEFAULT_DB_ALIAS).create(
+            huella=entry, capturado_en=now, vista=view, alias=item.alias,
+            alias_explain=explain_alias_, sql=item.sql,
+            params=repr(item.params)[:PARAMS_CHARS] if item.params is not None else '',
+            duracion_ms=item.ms, plan=text, error=error)
+        keep = int(getattr(settings, 'SLOW_QUERY_PLANS', 20))
+        old = (PlanConsulta.objects.using(DEFAULT_DB_ALIAS).filter(huella=entry)
+               .order_by('-capturado_en', '-pk').values_list('pk', flat=True)[keep:])
+        PlanConsulta.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=list(old)).delete()
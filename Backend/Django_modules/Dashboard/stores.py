@@ -0,0 +1,345 @@
+"""Registro de tiendas: resuelve el slug de una tienda a su alias de BD.
+
+Fuentes:
+- settings.STORE_REGISTRY: tiendas con alias fijo en settings.DATABASES
+  (default, store_b, store_c) o con un bloque 'database' propio.
+- Tabla Store (BD default): filas con `slug` y `db_settings`.
+
+Las tiendas con BD propia se registran en django.db.connections la primera vez
+que se usan. Como cada alias mantiene su pool de conexiones, se conservan como
+máximo settings.STORE_MAX_OPEN_ALIASES abiertos a la vez y se desaloja el menos
+usado recientemente (LRU) que no tenga peticiones en curso.
+
+La resolución por petición son búsquedas en diccionarios y dos expresiones
+regulares precompiladas; no depende del número de tiendas.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .db_router import get_db_for_request
+
+logger = logging.getLogger(__name__)
+
+# /api/s/<slug>/resto -> /api/resto
+STORE_PATH_RE = re.compile(r'^/api/s/(?P<slug>[-\w]+)(?P<rest>/.*)?$')
+STORE_HEADER = 'X-Store'
+
+# Claves de conexión que una tienda dinámica hereda de la BD default
+_INHERITED_KEYS = ('ENGINE', 'USER', 'PASSWORD', 'HOST', 'PORT',
+                   'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')
+
+
+class UnknownStore(Exception):
+    pass
+
+
+class StoreLookupRequired(Exception):
+    """El slug no está en memoria y resolverlo requiere consultar la BD."""
+
+
+class StoreEntry:
+    __slots__ = ('slug', 'alias', 'database', 'options')
+
+    def __init__(self, slug, alias, database=None, options=None):
+        self.slug = slug
+        self.alias = alias
+        # None: el alias ya existe en settings.DATABASES (no se desaloja)
+        self.database = database
+        self.options = options or {}
+
+    @property
+    def dynamic(self):
+        return self.database is not None
+
+    def __repr__(self):
+        return f"StoreEntry({self.slug!r} -> {self.alias!r})"
+
+
+_lock = threading.RLock()
+_by_slug = {}
+_by_alias = {}
+_legacy_re = None
+_legacy = {}
+_missing = {}           # slug -> instante en que se buscó sin éxito en la tabla Store
+_open = OrderedDict()   # alias dinámicos registrados en connections (orden LRU)
+_in_use = {}            # alias -> peticiones en curso
+_registered = set()     # slugs de register(): no vienen de la tabla Store
+_loaded = False
+
+
+def _database_settings(alias, overrides):
+    base = connections.settings[DEFAULT_DB_ALIAS]
+    conf = {k: base[k] for k in _INHERITED_KEYS if k in base}
+    conf['OPTIONS'] = dict(conf.get('OPTIONS') or {})
+    if isinstance(conf['OPTIONS'].get('pool'), dict):
+        conf['OPTIONS']['pool'] = dict(conf['OPTIONS']['pool'], name=alias)
+    conf.update(overrides or {})
+    return conf
+
+
+def _make_entry(slug, spec):
+    spec = dict(spec or {})
+    alias = spec.pop('alias', None)
+    database = spec.pop('database', None)
+    spec.pop('legacy_prefix', None)
+    if alias is None:
+        alias = f'store_{slug}'
+    if alias in settings.DATABASES:
+        database = None
+    elif database is None:
+        raise ValueError(f"La tienda {slug!r} no define alias ni database")
+    else:
+        database = _database_settings(alias, database)
+    return StoreEntry(slug, alias, database, spec)
+
+
+def _add(entry):
+    _by_slug[entry.slug] = entry
+    # El primer slug registrado para un alias es el canónico
+    _by_alias.setdefault(entry.alias, entry)
+
+
+def _load():
+    global _loaded, _legacy_re
+    with _lock:
+        if _loaded:
+            return
+        registry = getattr(settings, 'STORE_REGISTRY', None) or {
+            alias: {'alias': alias} for alias in settings.DATABASES}
+        for slug, spec in registry.items():
+            _add(_make_entry(slug, spec))
+            prefix = (spec or {}).get('legacy_prefix')
+            if prefix:
+                _legacy[prefix] = slug
+        if DEFAULT_DB_ALIAS not in _by_alias:
+            _add(StoreEntry(DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS))
+        if _legacy:
+            names = '|'.join(re.escape(p) for p in sorted(_legacy))
+            _legacy_re = re.compile(rf'^/(?P<prefix>{names})(?P<rest>/.*)?$')
+        _loaded = True
+
+
+def _load_from_table(slug):
+    """Busca una tienda con BD propia en la tabla Store (BD default)."""
+    ttl = getattr(settings, 'STORE_REGISTRY_MISS_TTL', 30)
+    missed_at = _missing.get(slug)
+    if missed_at is not None and time.monotonic() - missed_at < ttl:
+        return None
+    from .models import Store
+    row = (Store.objects.using(DEFAULT_DB_ALIAS)
+           .filter(slug=slug).exclude(db_settings={})
+           .values('db_settings').first())
+    if row is None:
+        _missing[slug] = time.monotonic()
+        return None
+    entry = _make_entry(slug, {'database': row['db_settings']})
+    with _lock:
+        _add(entry)
+        _missing.pop(slug, None)
+    return entry
+
+
+def get_store(slug, lookup=True):
+    """Devuelve la entrada de la tienda o lanza UnknownStore.
+
+    Con lookup=False no consulta la tabla Store (sin E/S: usable desde el
+    event loop); si el slug no está cargado lanza StoreLookupRequired.
+    """
+    if not _loaded:
+        _load()
+    entry = _by_slug.get(slug)
+    if entry is None:
+        if not lookup:
+            raise StoreLookupRequired(slug)
+        entry = _load_from_table(slug)
+    if entry is None:
+        raise UnknownStore(slug)
+    return entry
+
+
+def store_for_alias(alias=None):
+    """Entrada de la tienda del alias dado (por defecto, el de la petición actual)."""
+    if not _loaded:
+        _load()
+    return _by_alias.get(alias or get_db_for_request() or DEFAULT_DB_ALIAS)
+
+
+def uses_simulated_plan():
+    """True si la tienda actual sirve datos simulados del plan de trabajo."""
+    entry = store_for_alias()
+    return bool(entry and entry.options.get('plan_simulado'))
+
+
+def resolve_path(path, header_slug=None, lookup=True):
+    """Devuelve (tienda, path sin el prefijo de tienda).
+
+    Orden: /api/s/<slug>/..., prefijos heredados (/api2/, /api3/), cabecera
+    X-Store y, si nada aplica, la tienda default. `lookup` como en get_store().
+    """
+    if not _loaded:
+        _load()
+    m = STORE_PATH_RE.match(path)
+    if m:
+        return get_store(m.group('slug'), lookup), '/api' + (m.group('rest') or '/')
+    if _legacy_re is not None:
+        m = _legacy_re.match(path)
+        if m:
+            return get_store(_legacy[m.group('prefix')], lookup), '/api' + (m.group('rest') or '/')
+    if header_slug:
+        return get_store(header_slug.strip(), lookup), path
+    return _by_alias[DEFAULT_DB_ALIAS], path
+
+
+def connection_params(entry):
+    """kwargs de psycopg.connect para una conexión propia a la BD de la tienda (LISTEN)."""
+    conf = entry.database if entry.dynamic else connections.settings[entry.alias]
+    params = {'dbname': conf.get('NAME'), 'user': conf.get('USER'), 'password': conf.get('PASSWORD'),
+              'host': conf.get('HOST'), 'port': conf.get('PORT')}
+    return {k: v for k, v in params.items() if v not in (None, '')}
+
+
+def acquire(entry):
+    """Marca el alias como en uso, registrándolo en connections si hace falta."""
+    if not entry.dynamic:
+        return
+    with _lock:
+        _in_use[entry.alias] = _in_use.get(entry.alias, 0) + 1
+        if entry.alias in _open:
+            _open.move_to_end(entry.alias)
+        else:
+            _register_alias(entry)
+            _open[entry.alias] = entry
+            _evict()
+
+
+def release(entry):
+    if not entry.dynamic:
+        return
+    with _lock:
+        _in_use[entry.alias] = max(0, _in_use.get(entry.alias, 1) - 1)
+
+
+def _register_alias(entry):
+    if entry.alias in connections.settings:
+        return
+    conf = connections.configure_settings(
+        {DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS], entry.alias: dict(entry.database)})
+    # Copia nueva del dict: otros hilos pueden estar iterando el anterior
+    databases = dict(connections.settings)
+    databases[entry.alias] = conf[entry.alias]
+    connections.__dict__['settings'] = databases
+    logger.info("Tienda %s registrada como alias %s", entry.slug, entry.alias)
+
+
+def _unregister_alias(alias):
+    try:
+        conn = connections[alias]
+        conn.close()
+        if getattr(conn, 'pool', None) is not None:
+            conn.close_pool()
+    except Exception as exc:
+        logger.warning("Error cerrando conexiones de %s: %s", alias, exc)
+    databases = dict(connections.settings)
+    databases.pop(alias, None)
+    connections.__dict__['settings'] = databases
+    try:
+        del connections[alias]
+    except AttributeError:
+        pass
+
+
+def _evict():
+    limit = max(1, getattr(settings, 'STORE_MAX_OPEN_ALIASES', 32))
+    for alias in list(_open):
+        if len(_open) <= limit:
+            break
+        if _in_use.get(alias):
+            continue
+        _open.pop(alias)
+        _in_use.pop(alias, None)
+        _unregister_alias(alias)
+        logger.info("Alias %s desalojado (LRU)", alias)
+
+
+def register(slug, spec):
+    """Registra en memoria una tienda que no está en settings (p. ej. la BD de `manage.py bench`)."""
+    if not _loaded:
+        _load()
+    entry = _make_entry(slug, spec)
+    with _lock:
+        _add(entry)
+        _registered.add(slug)
+    return entry
+
+
+def activate(slug):
+    """Registra la BD de la tienda y devuelve su alias (para comandos)."""
+    entry = get_store(slug)
+    acquire(entry)
+    release(entry)
+    return entry.alias
+
+
+def configured_stores():
+    """Tiendas declaradas en settings, una por alias (orden del registro)."""
+    if not _loaded:
+        _load()
+    registry = getattr(settings, 'STORE_REGISTRY', None) or {}
+    seen, out = set(), []
+    for slug in registry or _by_slug:
+        entry = _by_slug.get(slug)
+        if entry is not None and entry.alias not in seen:
+            seen.add(entry.alias)
+            out.append(entry)
+    return out
+
+
+def all_stores():
+    """Tiendas conocidas: las de settings y las de la tabla Store."""
+    if not _loaded:
+        _load()
+    from .models import Store
+    slugs = (Store.objects.using(DEFAULT_DB_ALIAS)
+             .exclude(slug__isnull=True).exclude(db_settings={})
+             .values_list('slug', flat=True))
+    for slug in slugs:
+        if slug not in _by_slug:
+            _load_from_table(slug)
+    return list(_by_slug.values())
+
+
+def invalidate(slug=None):
+    """Olvida tiendas cargadas de la tabla Store (todas o una)."""
+    with _lock:
+        _missing.clear()
+        for key, entry in list(_by_slug.items()):
+            if slug is not None and key != slug:
+                continue
+            if not entry.dynamic or key in _registered \
+                    or key in (getattr(settings, 'STORE_REGISTRY', None) or {}):
+                continue
+            _by_slug.pop(key, None)
+            if _by_alias.get(entry.alias) is entry:
+                _by_alias.pop(entry.alias, None)
+            if entry.alias in _open and not _in_use.get(entry.alias):
+                _open.pop(entry.alias)
+                _unregister_alias(entry.alias)
+
+
+def store_changed(sender, instance, **kwargs):
+    """Receptor de post_save/post_delete de Store."""
+    if getattr(instance, 'slug', None):
+        invalidate(instance.slug)
+
+
+def store_invalidated(alias, model, version):
+    """Receptor del bus de invalidación: Store cambió en otro worker."""
+    if model == 'Dashboard.Store' and alias == DEFAULT_DB_ALIAS:
+        invalidate()
@@ -0,0 +1,90 @@
+"""Sincronización incremental de los listados (?updated_since=).
+
+Clientes, Productos, Ventas y VentaItem tienen `actualizado_en` (auto_now,
+indexado) y cada borrado deja una lápida en RegistroEliminado. Con
+`?updated_since=<sync_token>` los listados devuelven solo lo que cambió:
+
+    {"changed": [...], "deleted": [ids], "sync_token": "..."}
+
+- El sync_token es una marca de tiempo UTC (ISO 8601) tomada antes de leer y
+  retrasada SYNC_TOKEN_MARGIN_SECONDS: una transacción que confirma tarde con
+  un actualizado_en anterior entra en la siguiente consulta. A cambio pueden
+  repetirse filas ya recibidas (el cliente debe reemplazar por id).
+- Las filas con agregados de otras tablas (compras de un cliente, ventas de un
+  producto, items de una venta) cuentan como cambiadas cuando cambia una fila
+  hija (ver FastListMixin.sync_dependencies); los borrados de hijas tocan
+  actualizado_en del padre.
+- Si el token es anterior a la retención de lápidas (SYNC_TOMBSTONE_DAYS) no
+  se pueden informar los borrados: se responde 410 y el cliente recarga todo.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def _margin():
+    return timedelta(seconds=getattr(settings, 'SYNC_TOKEN_MARGIN_SECONDS', 5))
+
+
+def retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+
+
+def new_token(now=None):
+    """sync_token para la próxima consulta (tomar antes de leer)."""
+    moment = (now or timezone.now()) - _margin()
+    return moment.astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def parse_since(raw):
+    """Fecha de ?updated_since= (token o ISO 8601). ValueError si no es válida."""
+    # '+' sin codificar en la URL llega como espacio
+    value = parse_datetime((raw or '').strip().replace(' ', '+'))
+    if value is None:
+        raise ValueError("updated_since debe ser un sync_token o una fecha ISO 8601")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def expired(since, now=None):
+    """True si `since` es más antiguo que las lápidas conservadas."""
+    return since < (now or timezone.now()) - retention()
+
+
+def deleted_ids(model, since):
+    from .models import RegistroEliminado
+    return sorted(set(RegistroEliminado.objects.filter(
+        modelo=model._meta.label, eliminado_en__gte=since).values_list('objeto_id', flat=True)))
+
+
+def _parents():
+    from .models import Clientes, Productos, Ventas, VentaItem
+    # Filas padre cuyo JSON incluye agregados o copias de la hija borrada
+    return {
+        Ventas: ((Clientes, 'cliente_id'),),
+        VentaItem: ((Ventas, 'venta_id'), (Productos, 'producto_id')),
+    }
+
+
+def record_deletion(sender, instance, using, **kwargs):
+    """post_delete: lápida de la fila y actualizado_en de sus padres."""
+    from .models import RegistroEliminado
+    now = timezone.now()
+    RegistroEliminado.objects.using(using).create(
+        modelo=sender._meta.label, objeto_id=instance.pk, eliminado_en=now)
+    for parent, column in _parents().get(sender, ()):
+        parent_id = getattr(instance, column, None)
+        if parent_id is not None:
+            parent.objects.using(using).filter(pk=parent_id).update(actualizado_en=now)
+
+
+def purge(using, days=None, now=None):
+    """Borra lápidas más antiguas que la retención. Devuelve cuántas borró."""
+    from .models import RegistroEliminado
+    limit = (now or timezone.now()) - (timedelta(days=days) if days is not None else retention())
+    deleted, _ = RegistroEliminado.objects.using(using).filter(eliminado_en__lt=limit).delete()
+    return deleted
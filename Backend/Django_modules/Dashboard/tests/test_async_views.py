@@ -0,0 +1,99 @@
+from datetime import date
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Dashboard import stores
+from Dashboard.models import Clientes, Productos, Ventas, VentaItem
+
+
+def _crear_venta():
+    cliente = Clientes.objects.create(
+        nombre='Asy', apellido='Nc', cedula='21', ciudad='Z', correo='a@n.com', telefono='1',
+        fecha_registro=date(2020, 1, 3), cantidad_compras=0)
+    for nombre, cantidad in (('ProdA', 3), ('ProdB', 1)):
+        p = Productos.objects.create(nombre=nombre, categoria='CatA', precio=10.0, stock=10, costo=6.0,
+                                     vendidos=0, tendencias=Productos.TENDENCIA_BAJA,
+                                     estado=Productos.ESTADO_DISPONIBLE)
+        v = Ventas.objects.create(fecha=timezone.now(), cliente=cliente, precio_total=0,
+                                  metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_COMPLETADA)
+        VentaItem.objects.create(venta=v, producto=p, cantidad=cantidad,
+                                 precio_unitario=10.00, precio_total=10.00 * cantidad)
+
+
+class AsyncMetricsViewsTests(TestCase):
+    async def test_mismo_resultado_que_las_vistas_sincronas(self):
+        await sync_to_async(_crear_venta)()
+        for url in ('metrics/top-products/?limit=5', 'metrics/revenue-by-category/?days=30'):
+            sync_resp = await sync_to_async(self.client.get)(f'/api/{url}')
+            async_resp = await self.async_client.get(f'/api/async/{url}')
+            self.assertEqual(async_resp.status_code, 200)
+            self.assertEqual(async_resp.json(), sync_resp.json())
+        top = await self.async_client.get('/api/async/metrics/top-products/')
+        self.assertEqual([r['producto'] for r in top.json()], ['ProdA', 'ProdB'])
+
+    async def test_ingresos_por_categoria_params_invalidos(self):
+        for query in ('days=abc', 'days=0', 'year=99999'):
+            resp = await self.async_client.get(f'/api/async/metrics/revenue-by-category/?{query}')
+            self.assertEqual(resp.status_code, 400, query)
+        # Un error inesperado no se disfraza de lista vacía
+        with mock.patch('Dashboard.views._revenue_by_category_rows', side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            await self.async_client.get('/api/async/metrics/revenue-by-category/?days=30')
+
+    async def test_prefijo_legado_y_tienda_desconocida(self):
+        resp = await self.async_client.get('/api3/async/metrics/top-products/?year=2023')
+        self.assertEqual(resp.json()[0]['producto'], 'Producto Simulado A')
+        resp = await self.async_client.get('/api/s/no-existe/async/metrics/top-products/')
+        self.assertEqual(resp.status_code, 404)
+
+    async def test_slug_no_cargado_se_busca_fuera_del_event_loop(self):
+        with mock.patch.object(stores, '_load_from_table', return_value=None) as load:
+            resp = await self.async_client.get('/api/s/sin-cargar/async/metrics/top-products/')
+        self.assertEqual(resp.status_code, 404)
+        load.assert_called_once_with('sin-cargar')
+
+    async def test_token_invalido(self):
+        resp = await self.async_client.get('/api/async/metrics/top-products/',
+                                           headers={'authorization': 'Bearer nope'})
+        self.assertEqual(resp.status_code, 401)
+
+
+class AsyncAIRecommendationsTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(username='adm', password='x')
+        self.token = str(RefreshToken.for_user(self.admin).access_token)
+
+    def test_requiere_gerente_o_superuser(self):
+        resp = self.client.post('/api/async/ai/recommendations/', {}, content_type='application/json')
+        self.assertEqual(resp.status_code, 403)
+
+    def test_usa_el_cliente_async(self):
+        fake = mock.AsyncMock(return_value={'summary': 'ok'})
+        with mock.patch('Dashboard.async_views.agenerate_ai_recommendation', fake):
+            resp = self.client.post('/api/async/ai/recommendations/',
+                                    {'product_ids': ['1', 2], 'limit': '3'},
+                                    content_type='application/json',
+                                    HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {'summary': 'ok'})
+        fake.assert_awaited_once_with(product_ids=[1, 2], category=None, limit=3)
+
+
+class AsyncMetricsBundleTests(TransactionTestCase):
+    def test_metricas_en_paralelo(self):
+        _crear_venta()
+        resp = self.client.get('/api/async/metrics/bundle/?metrics=top-products,revenue-by-category')
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertFalse(body['partial'])
+        self.assertEqual(list(body['metrics']), ['top-products', 'revenue-by-category'])
+        self.assertEqual(body['metrics']['top-products']['data'],
+                         self.client.get('/api/metrics/top-products/').json())
+
+        resp = self.client.get('/api/async/metrics/bundle/?metrics=nope')
+        self.assertEqual(resp.status_code, 400)
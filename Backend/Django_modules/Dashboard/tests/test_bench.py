@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from Dashboard import bench
+from Dashboard.models import Clientes, Productos, VentaItem, Ventas
+
+ANCHOR = datetime(2025, 6, 30, tzinfo=timezone.utc)
+
+
+class SeedTests(TransactionTestCase):
+    # clear() hace TRUNCATE: no puede ir dentro de la transacción de TestCase
+    def _snapshot(self):
+        return (
+            list(Ventas.objects.order_by('id').values_list('fecha', 'precio_total', 'cliente_id')),
+            list(VentaItem.objects.order_by('id').values_list('venta_id', 'producto_id', 'cantidad')),
+            list(Productos.objects.order_by('id').values_list('nombre', 'precio', 'vendidos')),
+        )
+
+    def test_misma_semilla_mismo_dataset(self):
+        bench.clear('default')
+        items = bench.seed('default', 200, seed=7, anchor=ANCHOR)
+        first = self._snapshot()
+        self.assertEqual(Ventas.objects.count(), 200)
+        self.assertEqual(VentaItem.objects.count(), items)
+        self.assertEqual(Clientes.objects.count(), bench.dataset_sizes(200)[0])
+        self.assertTrue(all(f <= ANCHOR for f, _t, _c in first[0]))
+
+        bench.clear('default')
+        bench.seed('default', 200, seed=7, anchor=ANCHOR)
+        self.assertEqual(self._snapshot(), first)
+        self.assertEqual(bench.stored_signature('default'), bench.signature(200, 7, ANCHOR))
+
+
+class ReportTests(SimpleTestCase):
+    def test_percentil(self):
+        values = list(range(1, 101))
+        self.assertEqual(bench.percentile(values, 50), 50)
+        self.assertEqual(bench.percentile(values, 95), 95)
+        self.assertEqual(bench.percentile([3.0], 95), 3.0)
+
+    def test_comparacion(self):
+        def report(p50, queries):
+            return {'scales': {'10k': {'endpoints': {
+                'top-products': {'p50_ms': p50, 'p95_ms': p50, 'queries': queries}}}}}
+
+        rows = bench.compare(report(13.0, 3), report(10.0, 2), tolerance=0.2)
+        worse = {metric for _s, _n, metric, _b, _a, _c, is_worse in rows if is_worse}
+        self.assertEqual(worse, {'p50_ms', 'p95_ms', 'queries'})
+        rows = bench.compare(report(11.0, 2), report(10.0, 2), tolerance=0.2)
+        self.assertFalse(any(r[6] for r in rows))
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from Dashboard import coalesce, invalidation
+from Dashboard.models import Productos, Ventas
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_llamadas_concurrentes_comparten_el_calculo(self):
+        flight = coalesce.SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'valor'
+
+        with ThreadPoolExecutor(5) as pool:
+            first = pool.submit(flight.do, 'k', slow)
+            started.wait(1)
+            rest = [pool.submit(flight.do, 'k', slow) for _ in range(4)]
+            results = [first.result()] + [f.result() for f in rest]
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [('valor', False)] + [('valor', True)] * 4)
+        self.assertFalse(flight.in_flight('k'))
+
+    def test_el_error_llega_a_todos(self):
+        flight = coalesce.SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flight.do('k', lambda: 1 / 0)
+        self.assertEqual(flight.do('k', lambda: 2), (2, False))
+
+
+class AggregateCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = coalesce.AggregateCache(refresh_workers=1)
+        patcher = mock.patch.object(invalidation, 'listening', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.version = 'v1'
+
+    def _get(self):
+        return self.cache.get('k', lambda: self.version, models=[Ventas])
+
+    def _wait_refresh(self):
+        self.cache._executor.submit(lambda: None).result(timeout=5)
+
+    def test_hit_y_stale_while_revalidate(self):
+        self.assertEqual(self._get(), ('v1', 'miss'))
+        self.assertEqual(self._get(), ('v1', 'hit'))
+        self.version = 'v2'
+        with override_settings(AGGREGATE_SOFT_TTL=0, AGGREGATE_HARD_TTL=60):
+            # Pasado el TTL blando se sirve lo anterior y se recalcula aparte
+            self.assertEqual(self._get(), ('v1', 'stale'))
+            self._wait_refresh()
+        self.assertEqual(self._get(), ('v2', 'hit'))
+
+    def test_ttl_duro_recalcula_en_la_peticion(self):
+        self._get()
+        self.version = 'v2'
+        with override_settings(AGGREGATE_SOFT_TTL=0, AGGREGATE_HARD_TTL=0):
+            self.assertEqual(self._get(), ('v2', 'miss'))
+
+    def test_escritura_avisada_por_el_bus(self):
+        self._get()
+        self.version = 'v2'
+        invalidation.apply('store_b', Ventas)
+        self.assertEqual(self._get(), ('v1', 'hit'))    # otra tienda
+        invalidation.apply('default', Ventas)
+        # Sin stale: la escritura se ve en la siguiente lectura
+        self.assertEqual(self._get(), ('v2', 'miss'))
+        self.assertEqual(self._get(), ('v2', 'hit'))
+
+    def test_sin_bus_no_guarda(self):
+        with mock.patch.object(invalidation, 'listening', return_value=False):
+            self.assertEqual(self._get(), ('v1', 'miss'))
+            self.assertEqual(self._get(), ('v1', 'miss'))
+
+
+class AggregateCacheWriteTests(TestCase):
+    def setUp(self):
+        self.cache = coalesce.AggregateCache(refresh_workers=1)
+        patcher = mock.patch.object(invalidation, 'listening', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _count(self):
+        return self.cache.get('productos', Productos.objects.count, models=[Productos])
+
+    def test_escritura_publicada_se_lee_en_la_siguiente_peticion(self):
+        self.assertEqual(self._count(), (0, 'miss'))
+        self.assertEqual(self._count(), (0, 'hit'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Productos.objects.create(nombre='P', categoria='C', precio=1.0, stock=1, vendidos=0,
+                                     tendencias=Productos.TENDENCIA_BAJA)
+        self.assertEqual(self._count(), (1, 'miss'))
+
+
+class CoalescedMetricViewTests(SimpleTestCase):
+    def test_peticiones_iguales_comparten_una_agregacion(self):
+        calls = []
+
+        def slow_query(params):
+            calls.append(dict(params))
+            time.sleep(0.2)
+            return []
+
+        with mock.patch('Dashboard.views._revenue_by_category_query', slow_query), \
+                ThreadPoolExecutor(5) as pool:
+            responses = list(pool.map(
+                lambda _: self.client.get('/api/metrics/revenue-by-category/?days=30'), range(5)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(r['X-Cache'] for r in responses), ['coalesced'] * 4 + ['miss'])
+        self.assertTrue(all(r.json() == [] for r in responses))
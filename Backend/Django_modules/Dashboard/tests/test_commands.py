@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from datetime import date, datetime
+import io
+
+from Dashboard import replicas
+from Dashboard.models import Clientes, Productos, Ventas, VentaItem
+
+
+class ParticionarVentasCommandTests(TestCase):
+    def test_convertir_y_desacoplar(self):
+        cliente = Clientes.objects.create(
+            nombre='Par', apellido='Ti', cedula='21', ciudad='Z', correo='p@t.com', telefono='1', fecha_registro=date(2020, 1, 3), cantidad_compras=0
+        )
+        p = Productos.objects.create(nombre='ProdPart', categoria='Cat', precio=10.0, stock=10,
+                                     vendidos=0, tendencias=Productos.TENDENCIA_BAJA, estado=Productos.ESTADO_DISPONIBLE)
+        vieja = Ventas.objects.create(fecha=timezone.make_aware(datetime(2024, 1, 15)), cliente=cliente, precio_total=10,
+                                      metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_COMPLETADA)
+        VentaItem.objects.create(
+            venta=vieja, producto=p, cantidad=1, precio_unitario=10, precio_total=10)
+
+        call_command('particionar_ventas', convertir=True,
+                     meses_futuros=1, stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM pg_partitioned_table WHERE partrelid IN "
+                "('\"Dashboard_ventas\"'::regclass, '\"Dashboard_ventaitem\"'::regclass)")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+        # El ORM sigue funcionando sobre las tablas particionadas
+        nueva = Ventas.objects.create(fecha=timezone.now(), cliente=cliente, precio_total=5,
+                                      metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_PENDIENTE)
+        VentaItem.objects.create(
+            venta=nueva, producto=p, cantidad=1, precio_unitario=5, precio_total=5)
+        self.assertGreater(nueva.pk, vieja.pk)
+        self.assertEqual(VentaItem.objects.filter(venta=nueva).count(), 1)
+
+        call_command('particionar_ventas', desacoplar_antes='2024-02',
+                     archivar=True, stdout=io.StringIO())
+        self.assertFalse(Ventas.objects.filter(pk=vieja.pk).exists())
+        self.assertEqual(Ventas.objects.count(), 1)
+        self.assertEqual(VentaItem.objects.count(), 1)
+
+
+class RellenarCostoItemsCommandTests(TestCase):
+    def test_solo_primarios(self):
+        # Todo alias que no sea default hace de réplica de default
+        with mock.patch.object(replicas, 'primary_of', lambda alias: 'default'):
+            out = io.StringIO()
+            call_command('rellenar_costo_items', dry_run=True, stdout=out)
+            self.assertEqual(out.getvalue(), 'default: 0 items pendientes\n')
+        with mock.patch.object(replicas, 'primary_of', lambda alias: 'otra'), \
+                self.assertRaises(CommandError):
+            call_command('rellenar_costo_items', stores='default', stdout=io.StringIO())
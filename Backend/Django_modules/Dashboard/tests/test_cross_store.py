@@ -0,0 +1,81 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from Dashboard import stores
+from Dashboard.services import cross_store
+from Dashboard.stores import StoreEntry
+
+
+class CrossStoreMergeTests(SimpleTestCase):
+    def test_merge_monthly_suma_por_mes(self):
+        a = [{'month': '2026-01', 'month_label': 'Ene', 'sales_sum': 10.5, 'sales_count': 2}]
+        b = [{'month': '2026-01', 'month_label': 'Ene', 'sales_sum': 4.5, 'sales_count': 1},
+             {'month': '2025-12', 'month_label': 'Dic', 'sales_sum': 1.0, 'sales_count': 1}]
+        merged = cross_store.merge_monthly([a, b])
+        self.assertEqual([r['month'] for r in merged], ['2025-12', '2026-01'])
+        self.assertEqual(merged[1]['sales_sum'], 15.0)
+        self.assertEqual(merged[1]['sales_count'], 3)
+
+    def test_merge_by_category_recalcula_margen(self):
+        merged = cross_store.merge_by_category([
+            [{'category': 'A', 'revenue': 100.0, 'cost': 50.0, 'margin_pct': 50.0}],
+            [{'category': 'A', 'revenue': 100.0, 'cost': 90.0, 'margin_pct': 10.0}],
+        ])
+        self.assertEqual(merged, [{'category': 'A', 'revenue': 200.0, 'cost': 140.0, 'margin_pct': 30.0}])
+
+    def test_merge_top_products(self):
+        merged = cross_store.merge_top_products([
+            [{'producto': 'X', 'ventas': 10.0, 'unidades': 5}],
+            [{'producto': 'X', 'ventas': 1.0, 'unidades': 1}, {'producto': 'Y', 'ventas': 50.0, 'unidades': 2}],
+        ], sort='units', limit=1)
+        self.assertEqual(merged, [{'producto': 'X', 'ventas': 11.0, 'unidades': 6}])
+
+
+class CrossStoreFanOutTests(TransactionTestCase):
+    def test_tienda_lenta_no_bloquea_la_respuesta(self):
+        # Dos "tiendas" sobre la BD de pruebas: una responde rápido y la otra no
+        rapida = StoreEntry('rapida', 'default')
+        lenta = StoreEntry('lenta', 'default')
+
+        lock = threading.Lock()
+        calls = []
+
+        def run():
+            with lock:
+                calls.append(1)
+                slow = len(calls) == 2
+            if slow:
+                time.sleep(1.0)
+            return 'ok'
+
+        start = time.monotonic()
+        results = cross_store.fan_out([rapida, lenta], run, timeout=0.3)
+        self.assertLess(time.monotonic() - start, 0.9)
+        statuses = sorted(r['status'] for r in results.values())
+        self.assertEqual(statuses, ['ok', 'timeout'])
+        time.sleep(0.8)  # dejar terminar el hilo antes de limpiar la BD
+
+    def test_la_tienda_se_libera_cuando_termina_su_tarea(self):
+        lenta = StoreEntry('lenta', 'default')
+        finished = threading.Event()
+
+        def run():
+            time.sleep(0.5)
+            finished.set()
+            return 'ok'
+
+        with mock.patch.object(stores, 'acquire') as acquire, \
+                mock.patch.object(stores, 'release') as release:
+            results = cross_store.fan_out([lenta], run, timeout=0.1)
+            self.assertEqual(results['lenta']['status'], 'timeout')
+            acquire.assert_called_once_with(lenta)
+            # La respuesta ya salió pero el hilo sigue usando la BD
+            release.assert_not_called()
+            self.assertTrue(finished.wait(2))
+            deadline = time.monotonic() + 2
+            while not release.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.assert_called_once_with(lenta)
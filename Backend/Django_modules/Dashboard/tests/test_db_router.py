@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from Dashboard import invalidation, stores
+from Dashboard.db_router import (
+    RequestDBRouterMiddleware, StoreAwareExecutor, get_db_for_request, using_store,
+)
+from Dashboard.models import Ventas
+
+
+class UsingStoreTests(SimpleTestCase):
+    def test_using_store_anidado_y_router(self):
+        self.assertIsNone(get_db_for_request())
+        with using_store('store_b'):
+            self.assertEqual(router.db_for_read(Ventas), 'store_b')
+            with using_store('store_c'):
+                self.assertEqual(router.db_for_write(Ventas), 'store_c')
+            self.assertEqual(router.db_for_read(Ventas), 'store_b')
+        self.assertEqual(router.db_for_read(Ventas), 'default')
+
+    def test_se_propaga_a_tareas_del_executor(self):
+        with StoreAwareExecutor(max_workers=2) as pool, using_store('store_c'):
+            self.assertEqual(pool.submit(get_db_for_request).result(), 'store_c')
+        # Un executor normal no copia el contexto
+        with ThreadPoolExecutor(max_workers=1) as pool, using_store('store_c'):
+            self.assertIsNone(pool.submit(get_db_for_request).result())
+
+    def test_aislamiento_entre_corrutinas(self):
+        async def tarea(alias):
+            with using_store(alias):
+                await asyncio.sleep(0.01)
+                return router.db_for_read(Ventas)
+
+        async def main():
+            return await asyncio.gather(*(tarea(a) for a in ['store_b', 'store_c', 'default'] * 5))
+
+        self.assertEqual(asyncio.run(main()),
+                         ['store_b', 'store_c', 'default'] * 5)
+
+
+class ConcurrentRequestsRoutingTests(SimpleTestCase):
+    def test_peticiones_concurrentes_a_distintas_tiendas(self):
+        barrier = threading.Barrier(6)
+
+        def view(request):
+            # Todas las peticiones están dentro de la middleware a la vez
+            barrier.wait(timeout=5)
+            return HttpResponse(router.db_for_read(Ventas))
+
+        middleware = RequestDBRouterMiddleware(view)
+        factory = RequestFactory()
+        paths = ['/api/Productos/', '/api2/Productos/', '/api3/Productos/',
+                 '/api/s/store_b/Productos/', '/api/s/store_c/Productos/', '/api/s/default/Productos/']
+        expected = ['default', 'store_b', 'store_c', 'store_b', 'store_c', 'default']
+
+        with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+            responses = list(pool.map(
+                lambda p: middleware(factory.get(p)), paths))
+
+        self.assertEqual([r.content.decode() for r in responses], expected)
+        self.assertIsNone(get_db_for_request())
+
+
+class StorePathTests(SimpleTestCase):
+    def test_solo_se_reescribe_path_info(self):
+        def view(request):
+            return HttpResponse(f'{request.path_info} {request.build_absolute_uri()}')
+
+        response = RequestDBRouterMiddleware(view)(RequestFactory().get('/api/s/store_b/Productos/?a=1'))
+        self.assertEqual(response.content.decode(),
+                         '/api/Productos/ http://testserver/api/s/store_b/Productos/?a=1')
+
+    def test_libera_la_tienda_si_falla_el_listener(self):
+        with mock.patch.object(stores, 'acquire') as acquire, \
+                mock.patch.object(stores, 'release') as release, \
+                mock.patch.object(invalidation, 'ensure_listening', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                RequestDBRouterMiddleware(lambda r: HttpResponse())(RequestFactory().get('/api/s/store_b/Productos/'))
+        acquire.assert_called_once()
+        release.assert_called_once_with(acquire.call_args.args[0])
+
+    def test_append_slash_redirige_a_la_misma_tienda(self):
+        response = self.client.get('/api/s/store_b/Productos')
+        self.assertRedirects(response, '/api/s/store_b/Productos/', status_code=301,
+                             fetch_redirect_response=False)
@@ -0,0 +1,103 @@
+import json
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from Dashboard import fast_serializers, views
+from Dashboard.models import Clientes, Productos, Ventas, VentaItem
+
+
+class FastListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        c1 = Clientes.objects.create(nombre='Ana', apellido='Paz', cedula='1', ciudad='X', correo='a@p.com',
+                                     telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=60)
+        Clientes.objects.create(nombre='Sin', apellido='Compras', cedula='2', ciudad='Y', correo='s@c.com',
+                                telefono='2', fecha_registro=date(2021, 5, 2), cantidad_compras=0)
+        productos = [
+            Productos.objects.create(nombre=f'P{i}', categoria='Cat', precio=9.99, costo='4.50', stock=stock,
+                                     vendidos=0, tendencias=Productos.TENDENCIA_BAJA,
+                                     estado=Productos.ESTADO_DISPONIBLE)
+            for i, stock in enumerate((0, 10, 100))
+        ]
+        for dias in (3, 400):
+            v = Ventas.objects.create(fecha=timezone.now() - timedelta(days=dias), cliente=c1, precio_total='31.10',
+                                      metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_COMPLETADA)
+            for p in productos[1:]:
+                VentaItem.objects.create(venta=v, producto=p, cantidad=2,
+                                         precio_unitario='7.775', precio_total='15.55')
+
+    def _serializer_output(self, viewset_class):
+        viewset = viewset_class()
+        viewset.request = None
+        viewset.format_kwarg = None
+        data = viewset.get_serializer_class()(viewset.get_queryset(), many=True).data
+        return json.loads(JSONRenderer().render(data))
+
+    def test_mismo_json_que_los_serializers(self):
+        for url, viewset_class in (('/api/Clientes/', views.Clientes_ViewSet),
+                                   ('/api/Productos/', views.Productos_ViewSet),
+                                   ('/api/Ventas/', views.Ventas_ViewSet)):
+            fast = self.client.get(url).json()
+            slow = self._serializer_output(viewset_class)
+            for row in fast + slow:
+                row.get('items', []).sort(key=lambda it: it['id'])
+            self.assertEqual(fast, slow, url)
+        clientes = {c['cedula']: c for c in self.client.get('/api/Clientes/').json()}
+        self.assertEqual((clientes['1']['estado'], clientes['1']['segmento']), ('activo', 'vip'))
+        self.assertEqual((clientes['2']['estado'], clientes['2']['segmento']), ('inactivo', 'nuevo'))
+
+    def test_listado_parte_de_get_queryset(self):
+        class SoloConStock(views.Productos_ViewSet):
+            def get_queryset(self):
+                return super().get_queryset().filter(stock__gt=0)
+
+        view = SoloConStock.as_view({'get': 'list'})
+        for query in ('', '?fields=nombre,ventas_count'):
+            response = view(APIRequestFactory().get(f'/api/Productos/{query}'))
+            self.assertEqual(sorted(p['nombre'] for p in response.data), ['P1', 'P2'], query)
+
+    def test_ventas_sin_consultas_por_fila(self):
+        # Ventas (con JOIN a cliente) + items de todas las ventas (con JOIN a producto)
+        with self.assertNumQueries(2):
+            self.client.get('/api/Ventas/')
+
+    def test_comando_de_medicion(self):
+        out = StringIO()
+        call_command('medir_serializadores', '--repeticiones', '1', stdout=out)
+        lineas = out.getvalue().splitlines()
+        self.assertEqual([l.split()[0] for l in lineas[1:]], ['clientes', 'productos', 'ventas'])
+
+    def test_fields_e_include_podan_la_consulta(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/Clientes/?fields=nombre,id').json()
+        self.assertEqual(list(data[0]), ['id', 'nombre'])
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('"correo"', sql)
+
+        # include vacío: sin items ni segunda consulta
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/Ventas/?fields=id,fecha,items&include=').json()
+        self.assertEqual(list(data[0]), ['id', 'fecha'])
+        data = self.client.get('/api/Ventas/?fields=precio_total&include=items').json()
+        self.assertEqual(list(data[0]), ['items', 'precio_total'])
+        self.assertEqual(len(data[0]['items']), 2)
+
+        self.assertEqual(self.client.get('/api/Productos/?fields=nope').status_code, 400)
+        self.assertEqual(self.client.get('/api/Clientes/?include=items').status_code, 400)
+
+
+class ValuesReaderTests(SimpleTestCase):
+    def test_lector_sin_builders_no_se_instancia(self):
+        class SinBuilders(fast_serializers.ValuesReader):
+            pass
+        with self.assertRaises(TypeError):
+            SinBuilders()
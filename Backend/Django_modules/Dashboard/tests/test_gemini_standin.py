@@ -0,0 +1,56 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from Dashboard import prometheus
+from Dashboard.models import Productos
+from Dashboard.services import gemini_client as gc
+from Dashboard.services.gemini_standin import GeminiStandIn, answer
+
+
+class AnswerTests(SimpleTestCase):
+    def test_predicciones_por_linea_de_datos(self):
+        prompt = ('Devuelve SOLO JSON con este esquema:\n'
+                  '{"items": [{"category": string, "pred": number, "confidence": number|null}]}\n'
+                  '- hogar: 100.00\n- moda: 40.00')
+        self.assertEqual(json.loads(answer(prompt))['items'], [
+            {'category': 'hogar', 'pred': 105.0, 'confidence': 70},
+            {'category': 'moda', 'pred': 42.0, 'confidence': 70},
+        ])
+
+
+class StandInTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.producto = Productos.objects.create(
+            nombre='Café', categoria='Cat', precio=10.0, stock=5, vendidos=3,
+            tendencias=Productos.TENDENCIA_BAJA)
+
+    def _recommend(self, **behaviour):
+        with GeminiStandIn(latency=0, **behaviour) as standin, \
+                override_settings(GEMINI_BASE_URL=standin.url), \
+                mock.patch.object(prometheus, 'gemini_fallback') as fallback:
+            result = gc.generate_ai_recommendation(limit=5)
+        self.assertEqual(standin.counts['requests'], 1)
+        return result['card'], fallback
+
+    def test_respuesta_valida_por_el_sdk(self):
+        card, fallback = self._recommend()
+        self.assertEqual(card['title'], 'Campaña para Café')
+        self.assertEqual(card['product_id'], self.producto.id)
+        fallback.assert_not_called()
+
+    def test_429_usa_el_fallback_de_cuota(self):
+        card, fallback = self._recommend(rate_429=1)
+        fallback.assert_called_once_with('recommendation', 'quota')
+        self.assertNotEqual(card['title'], 'Campaña para Café')
+
+    def test_json_roto_usa_el_fallback(self):
+        _card, fallback = self._recommend(rate_malformed=1)
+        fallback.assert_called_once_with('recommendation', 'invalid_output')
+
+    async def test_cliente_async(self):
+        with GeminiStandIn(latency=0) as standin, override_settings(GEMINI_BASE_URL=standin.url):
+            text = await gc._agenerate(gc._get_client(), '- 2025-01: 10.00\n"label": "YYYY-MM"', 'test')
+        self.assertEqual(json.loads(text)['items'][0]['label'], '2025-01')
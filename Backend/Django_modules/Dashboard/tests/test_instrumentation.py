@@ -0,0 +1,80 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from Dashboard import instrumentation
+from Dashboard.models import Productos
+
+
+@override_settings(REQUEST_TIMING_FLAG_TTL=0)
+class RequestTimingTests(TestCase):
+    databases = {'default', 'store_b'}
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Productos.objects.create(nombre=f'P{i}', categoria='Cat', precio=1.0, stock=1, vendidos=0,
+                                     tendencias=Productos.TENDENCIA_BAJA)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.flag = Path(tmp.name) / 'timing'
+        settings_patch = override_settings(REQUEST_TIMING_FLAG=str(self.flag))
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    @override_settings(REQUEST_TIMING=True)
+    def test_cabeceras_y_log_de_la_peticion(self):
+        with self.assertLogs('Dashboard.timing', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/Productos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Query-Count'], str(len(queries)))
+        timing = response['Server-Timing']
+        for metric in ('sql;dur=', f'desc="{len(queries)} queries"', 'sql-max;dur=',
+                       'serialize;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['path'], '/api/Productos/')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['queries'], len(queries))
+        self.assertEqual(line['db_aliases'], ['default'])
+        self.assertIn('Dashboard_productos', line['slowest_sql'])
+
+    def test_alias_de_la_tienda(self):
+        with self.settings(REQUEST_TIMING=True), self.assertLogs('Dashboard.timing', 'INFO') as logs:
+            self.client.get('/api2/Productos/')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['store'], 'store_b')
+        self.assertEqual(line['db_aliases'], ['store_b'])
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_desactivado_no_mide(self):
+        response = self.client.get('/api/Productos/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('X-Query-Count', response)
+
+    def test_interruptor_en_caliente(self):
+        call_command('instrumentacion', '--activar', stdout=StringIO())
+        self.assertIn('X-Query-Count', self.client.get('/api/Productos/'))
+        with self.settings(REQUEST_TIMING=True):
+            call_command('instrumentacion', '--desactivar', stdout=StringIO())
+            self.assertNotIn('X-Query-Count', self.client.get('/api/Productos/'))
+            out = StringIO()
+            call_command('instrumentacion', '--restablecer', stdout=out)
+            self.assertFalse(self.flag.exists())
+            self.assertIn('activa', out.getvalue())
+            self.assertIn('X-Query-Count', self.client.get('/api/Productos/'))
+
+    def test_sin_peticion_no_registra(self):
+        self.assertIsNone(instrumentation.current())
+        Productos.objects.count()
+        self.assertIsNone(instrumentation.current())
@@ -0,0 +1,94 @@
+import json
+import time
+from datetime import date
+from unittest import mock
+
+import psycopg
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from Dashboard import invalidation, stores
+from Dashboard.models import Productos, Store, Tasa
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class GenerationTests(TestCase):
+    def test_escrituras_invalidan_al_confirmar(self):
+        productos, tasa = invalidation.generation('default', [Productos, Tasa])
+        otra_tienda = invalidation.generation('store_b', [Productos])
+        with self.captureOnCommitCallbacks(execute=True):
+            Tasa.objects.create(fecha=date(2024, 1, 1), tasa='36.5')
+        self.assertEqual(invalidation.generation('default', [Productos, Tasa]), (productos, tasa + 1))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Productos.objects.create(nombre='P', categoria='C', precio=1.0, stock=1, vendidos=0,
+                                     tendencias=Productos.TENDENCIA_BAJA)
+            # Antes de confirmar la generación no cambia
+            self.assertEqual(invalidation.generation('default', [Productos]), (productos,))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(invalidation.generation('default', [Productos]), (productos + 1,))
+        self.assertEqual(invalidation.generation('store_b', [Productos]), otra_tienda)
+
+    def test_un_aviso_por_modelo_y_transaccion(self):
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            for i in range(3):
+                Productos.objects.create(nombre=f'P{i}', categoria='C', precio=1.0, stock=1, vendidos=0,
+                                         tendencias=Productos.TENDENCIA_BAJA)
+            Tasa.objects.create(fecha=date(2024, 1, 1), tasa='36.5')
+            Tasa.objects.create(fecha=date(2024, 1, 2), tasa='36.6')
+        notifies = [q['sql'] for q in queries.captured_queries if 'pg_notify' in q['sql']]
+        self.assertEqual(len(notifies), 2)
+        self.assertEqual([cb.args[1] for cb in callbacks], ['Dashboard.Productos', 'Dashboard.Tasa'])
+
+    def test_savepoint_deshecho_vuelve_a_publicar(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Tasa.objects.create(fecha=date(2024, 1, 1), tasa='36.5')
+                raise RuntimeError
+            Tasa.objects.create(fecha=date(2024, 1, 2), tasa='36.6')
+        self.assertEqual([cb.args[1] for cb in callbacks], ['Dashboard.Tasa'])
+
+    def test_store_de_otro_worker_refresca_el_registro(self):
+        with mock.patch.object(stores, 'invalidate') as invalidate:
+            invalidation.apply('default', Store, 99)
+            invalidation.apply('store_b', Productos, 100)
+        invalidate.assert_called_once_with()
+
+
+class BusTests(TransactionTestCase):
+    def setUp(self):
+        invalidation._enabled = True
+        self.addCleanup(invalidation.stop)
+        self.entry = stores.store_for_alias('default')
+        invalidation.ensure_listening(self.entry)
+        self.assertTrue(_wait(lambda: invalidation.listening('default')))
+
+    def test_aviso_de_otro_nodo_sube_la_generacion(self):
+        before = invalidation.generation('default', [Productos])[0]
+        # Otro nodo escribe en la misma BD
+        payload = json.dumps({'alias': 'default', 'model': 'Dashboard.Productos', 'version': 1})
+        with psycopg.connect(autocommit=True, **stores.connection_params(self.entry)) as conn:
+            conn.execute('SELECT pg_notify(%s, %s)', [invalidation.CHANNEL, payload])
+        self.assertTrue(_wait(lambda: invalidation.generation('default', [Productos])[0] > before))
+
+    def test_escritura_publica_una_vez_por_transaccion(self):
+        received = []
+
+        def receiver(alias, model, version):
+            received.append((model, version))
+        invalidation.subscribe(receiver)
+        self.addCleanup(invalidation.unsubscribe, receiver)
+        Productos.objects.create(nombre='P', categoria='C', precio=1.0, stock=1, vendidos=0,
+                                 tendencias=Productos.TENDENCIA_BAJA)
+        # Aplicado al confirmar en este worker y luego por su propio NOTIFY
+        self.assertTrue(_wait(lambda: len(received) == 2))
+        self.assertEqual(received[0], received[1])
+        self.assertEqual(received[0][0], 'Dashboard.Productos')
@@ -0,0 +1,166 @@
+import asyncio
+import json
+from datetime import date
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Dashboard import live, stores
+from Dashboard.models import Clientes, Productos, Ventas, VentaItem
+
+
+def _venta(estado=Ventas.ESTADO_COMPLETADA):
+    cliente = Clientes.objects.create(nombre='Li', apellido='Ve', cedula='9', ciudad='X', correo='l@v.com',
+                                      telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=0)
+    producto = Productos.objects.create(nombre='Vivo', categoria='Cat', precio=5.0, stock=10, vendidos=0,
+                                        tendencias=Productos.TENDENCIA_BAJA, estado=Productos.ESTADO_DISPONIBLE)
+    venta = Ventas.objects.create(fecha=timezone.now(), cliente=cliente, precio_total='10.00',
+                                  metodo_compra=Ventas.METODO_EFECTIVO, estado=estado)
+    VentaItem.objects.create(venta=venta, producto=producto, cantidad=2,
+                             precio_unitario='5.00', precio_total='10.00')
+    return venta, producto
+
+
+def _events(sql):
+    return [json.loads(q['sql'].split("pg_notify('dashboard_live', '")[1].rsplit("')", 1)[0])
+            for q in sql if "pg_notify('dashboard_live'" in q['sql']]
+
+
+class NotifyTests(TestCase):
+    def test_escrituras_de_ventas_publican_eventos(self):
+        with CaptureQueriesContext(connection) as ctx:
+            venta, producto = _venta(Ventas.ESTADO_PENDIENTE)
+            venta.estado = Ventas.ESTADO_COMPLETADA
+            venta.save()
+            producto.stock = 8
+            producto.save()
+            producto.nombre = 'Otro'
+            producto.save()
+        self.assertEqual([e['t'] for e in _events(ctx.captured_queries)],
+                         ['venta', 'item', 'estado', 'stock'])
+        self.assertEqual(_events(ctx.captured_queries)[-1], {'t': 'stock', 'id': producto.id,
+                                                               'stock': 8, 'antes': 10})
+
+    @override_settings(LIVE_EVENTS=False)
+    def test_desactivado(self):
+        with CaptureQueriesContext(connection) as ctx:
+            _venta()
+        self.assertEqual(_events(ctx.captured_queries), [])
+
+    def test_metricas_del_dia_y_delta(self):
+        _venta()
+        actual = live.today_metrics('default')
+        self.assertEqual((str(actual['ingresos_hoy']), actual['ventas_hoy']), ('10.00', 1))
+        self.assertEqual(actual['top'][0]['producto'], 'Vivo')
+        previo = dict(actual, ingresos_hoy=actual['ingresos_hoy'] - 4, ventas_hoy=0)
+        delta = live.metrics_delta(previo, actual)['delta']
+        self.assertEqual(delta, {'ingresos_hoy': '4.00', 'ventas_hoy': 1, 'top': False})
+
+
+class LiveHubTests(SimpleTestCase):
+    async def test_un_listener_para_varios_suscriptores(self):
+        entry = stores.store_for_alias('default')
+        hub = live.LiveHub()
+        with mock.patch.object(hub, '_listen', mock.AsyncMock()) as listen, \
+                override_settings(LIVE_METRICS_DEBOUNCE=60):
+            a, b = hub.subscribe(entry), hub.subscribe(entry)
+            await asyncio.sleep(0)
+            listen.assert_awaited_once()
+            hub.dispatch('default', '{"t": "venta", "id": 1}')
+            self.assertEqual(a.get_nowait(), (1, 'change', {'t': 'venta', 'id': 1}))
+            self.assertEqual(b.get_nowait()[2], {'t': 'venta', 'id': 1})
+            # Cliente lento: se descarta su cola y recibe resync
+            for i in range(live.QUEUE_SIZE + 1):
+                hub.dispatch('default', json.dumps({'t': 'item', 'n': i}))
+            self.assertEqual(a.get_nowait()[1], 'resync')
+            hub.unsubscribe(entry, a)
+            hub.unsubscribe(entry, b)
+            self.assertEqual(hub.subscribers('default'), 0)
+
+
+class LiveMetricsRefreshTests(SimpleTestCase):
+    async def test_notify_durante_el_recalculo_vuelve_a_calcular(self):
+        entry = stores.store_for_alias('default')
+        hub = live.LiveHub()
+        ventas = [1]
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_metrics(entry):
+            # Lee antes de que se confirme la segunda venta
+            seen = ventas[0]
+            started.set()
+            await release.wait()
+            return {'ingresos_hoy': 0, 'ventas_hoy': seen, 'top': []}
+
+        with mock.patch.object(hub, '_listen', mock.AsyncMock()), \
+                mock.patch.object(live, 'sync_to_async', lambda fn: slow_metrics), \
+                override_settings(LIVE_METRICS_DEBOUNCE=0):
+            queue = hub.subscribe(entry)
+            hub.dispatch('default', '{"t": "venta", "id": 1}')
+            await asyncio.wait_for(started.wait(), 1)
+            started.clear()
+            ventas[0] = 2
+            hub.dispatch('default', '{"t": "venta", "id": 2}')
+            release.set()
+            await asyncio.wait_for(started.wait(), 1)
+            await asyncio.sleep(0)
+            metrics = []
+            while not queue.empty():
+                _id, kind, data = queue.get_nowait()
+                if kind == 'metrics':
+                    metrics.append(data['ventas_hoy'])
+            self.assertEqual(metrics, [1, 2])
+            hub.unsubscribe(entry, queue)
+
+
+class LiveStreamTests(TransactionTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='vivo', password='x')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    async def test_requiere_autenticacion(self):
+        response = await self.async_client.get('/api/live/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_solo_asgi(self):
+        response = self.client.get('/api/live/', headers=self.auth)
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(LIVE_METRICS_DEBOUNCE=0.05)
+    async def test_stream_sse_de_punta_a_punta(self):
+        response = await self.async_client.get('/api/live/', headers=self.auth)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = asyncio.Queue()
+
+        async def consume():
+            async for chunk in response.streaming_content:
+                await chunks.put(chunk.decode())
+        reader = asyncio.create_task(consume())
+
+        async def next_event(kind):
+            while True:
+                chunk = await asyncio.wait_for(chunks.get(), 5)
+                if f'event: {kind}\n' in chunk:
+                    return json.loads(chunk.split('data: ', 1)[1])
+
+        self.assertEqual(await chunks.get(), 'retry: 3000\n\n')
+        # Métricas iniciales al conectar el LISTEN
+        self.assertEqual((await next_event('metrics'))['ventas_hoy'], 0)
+        await sync_to_async(_venta)()
+        self.assertEqual((await next_event('change'))['t'], 'venta')
+        metrics = await next_event('metrics')
+        self.assertEqual(metrics['delta'], {'ingresos_hoy': '10.00', 'ventas_hoy': 1, 'top': True})
+        self.assertEqual(live.hub().subscribers('default'), 1)
+
+        # Desconexión del cliente: el servidor ASGI cancela la respuesta
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(live.hub().subscribers('default'), 0)
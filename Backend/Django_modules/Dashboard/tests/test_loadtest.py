@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase
+
+from Dashboard import invalidation, loadtest
+from Dashboard.models import Productos
+
+
+class MixTests(SimpleTestCase):
+    def test_mezcla(self):
+        self.assertEqual(loadtest.parse_mix('dashboard=6, ia=1'), {'dashboard': 6.0, 'ia': 1.0})
+        for text in ('dashboard', 'nada=1', 'ia=0'):
+            with self.assertRaises(ValueError):
+                loadtest.parse_mix(text)
+
+
+class LoadTestTests(TransactionTestCase):
+    # El servidor atiende en sus propios hilos: los datos tienen que estar confirmados
+    def test_carga_contra_servidor_en_proceso(self):
+        Productos.objects.create(nombre='P', categoria='Cat', precio=10.0, stock=5, vendidos=1,
+                                 tendencias=Productos.TENDENCIA_BAJA)
+        get_user_model().objects.create_superuser('carga', 'carga@test.local', 'clave-123')
+        # wsgi.py arranca los listeners de invalidación
+        self.addCleanup(invalidation.stop)
+        with loadtest.serve({'latency': 0}) as (url, standin):
+            target = loadtest.Target(url)
+            target.token_source = loadtest.password_token(target, 'carga', 'clave-123')
+            target.cookie = loadtest.admin_session(target, 'carga', 'clave-123')
+            result = loadtest.run(target, {'dashboard': 1, 'ia': 1, 'exportaciones': 1},
+                                  users=2, duration=1.5, think=0, seed=3)
+        self.assertGreater(result['total']['count'], 0)
+        self.assertEqual({name: row['status'] for name, row in result['endpoints'].items()
+                          if row['errors']}, {})
+        self.assertIn('profile', result['endpoints'])
+        self.assertEqual(set(result['actions']) - {'dashboard', 'ia', 'exportaciones'}, set())
+        self.assertEqual(standin.counts['requests'], result['endpoints']['ai-recommendations']['count'])
+        dashboard = result['actions']['dashboard']
+        self.assertGreaterEqual(dashboard['p95_ms'], dashboard['p50_ms'])
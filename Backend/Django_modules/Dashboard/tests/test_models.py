@@ -1,6 +1,12 @@
-from django.test import TestCase
+import threading
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from Dashboard import display_ids
 from Dashboard.models import Clientes, Productos, Ventas, VentaItem
 from datetime import date, datetime
+from django.utils import timezone
 
 
 class ClientesModelTests(TestCase):
@@ -8,11 +14,53 @@ class ClientesModelTests(TestCase):
         c1 = Clientes.objects.create(
             nombre='A', apellido='B', cedula='1', ciudad='X', correo='a@b.com', telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=0
         )
-        self.assertEqual(c1.display_id, 1000)
+        # La secuencia no se revierte entre tests: solo se garantiza el orden
+        self.assertGreaterEqual(c1.display_id, 1000)
         c2 = Clientes.objects.create(
             nombre='C', apellido='D', cedula='2', ciudad='Y', correo='c@d.com', telefono='2', fecha_registro=date(2020, 1, 2), cantidad_compras=0
         )
-        self.assertEqual(c2.display_id, 1001)
+        self.assertEqual(c2.display_id, c1.display_id + 1)
+
+    def test_bulk_create_reserva_display_ids_en_bloque(self):
+        clientes = [Clientes(nombre=f'N{i}', apellido='B', cedula=str(i), ciudad='X', correo='n@b.com',
+                             telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=0)
+                    for i in range(5)]
+        clientes.append(Clientes(nombre='Fijo', apellido='B', cedula='9', ciudad='X', correo='f@b.com',
+                                 telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=0,
+                                 display_id=900000))
+        Clientes.objects.bulk_create(clientes)
+        ids = list(Clientes.objects.order_by('display_id').values_list('display_id', flat=True))
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(ids[-1], 900000)
+        # La secuencia se adelanta por encima de los ids explícitos
+        display_ids.sync_display_id_sequence()
+        self.assertGreater(display_ids.next_display_id(), 900000)
+
+
+class ClientesDisplayIdConcurrencyTests(TransactionTestCase):
+    def test_altas_concurrentes_sin_colisiones(self):
+        errors = []
+
+        def alta(n):
+            try:
+                for i in range(5):
+                    Clientes.objects.create(nombre=f'T{n}', apellido=str(i), cedula=f'{n}{i}', ciudad='X',
+                                            correo='t@b.com', telefono='1', fecha_registro=date(2020, 1, 1),
+                                            cantidad_compras=0)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=alta, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        ids = list(Clientes.objects.values_list('display_id', flat=True))
+        self.assertEqual(len(ids), 40)
+        self.assertEqual(len(set(ids)), 40)
 
 
 class VentaItemStrTests(TestCase):
@@ -29,3 +77,61 @@ class VentaItemStrTests(TestCase):
         s = str(vi)
         self.assertIn('2 x', s)
         self.assertIn('Prod1', s)
+
+
+class VentaItemDenormalizedTests(TestCase):
+    def test_copias_se_sincronizan_con_venta_y_producto(self):
+        cliente = Clientes.objects.create(
+            nombre='Den', apellido='Orm', cedula='11', ciudad='Z', correo='d@o.com', telefono='1', fecha_registro=date(2020, 1, 3), cantidad_compras=0
+        )
+        p = Productos.objects.create(nombre='ProdDen', categoria='CatA', precio=10.0, stock=10,
+                                     vendidos=0, tendencias=Productos.TENDENCIA_BAJA, estado=Productos.ESTADO_DISPONIBLE)
+        v = Ventas.objects.create(fecha=timezone.make_aware(datetime(2025, 1, 10)), cliente=cliente, precio_total=0,
+                                  metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_PENDIENTE)
+        vi = VentaItem.objects.create(
+            venta=v, producto=p, cantidad=1, precio_unitario=10.00, precio_total=10.00)
+        self.assertEqual(vi.venta_estado, Ventas.ESTADO_PENDIENTE)
+        self.assertEqual(vi.categoria, 'CatA')
+
+        # Cambios en la venta (cargada desde BD) se propagan a los items
+        v = Ventas.objects.get(pk=v.pk)
+        v.estado = Ventas.ESTADO_COMPLETADA
+        v.fecha = timezone.make_aware(datetime(2025, 2, 1))
+        v.save()
+        vi.refresh_from_db()
+        self.assertEqual(vi.venta_estado, Ventas.ESTADO_COMPLETADA)
+        self.assertEqual(vi.venta_fecha, v.fecha)
+
+        p = Productos.objects.get(pk=p.pk)
+        p.categoria = 'CatB'
+        p.save()
+        vi.refresh_from_db()
+        self.assertEqual(vi.categoria, 'CatB')
+
+    def test_guardar_producto_recien_creado_no_toca_items(self):
+        p = Productos.objects.create(nombre='ProdNuevo', categoria='CatA', precio=10.0, stock=10,
+                                     vendidos=0, tendencias=Productos.TENDENCIA_BAJA, estado=Productos.ESTADO_DISPONIBLE)
+        p.precio = 12.0
+        with CaptureQueriesContext(connection) as queries:
+            p.save()
+        self.assertFalse([q for q in queries.captured_queries if 'Dashboard_ventaitem' in q['sql']])
+
+    def test_costo_unitario_se_captura_al_vender(self):
+        cliente = Clientes.objects.create(
+            nombre='Cos', apellido='To', cedula='12', ciudad='Z', correo='c@t.com', telefono='1', fecha_registro=date(2020, 1, 3), cantidad_compras=0
+        )
+        p = Productos.objects.create(nombre='ProdCosto', categoria='CatA', precio=10.0, costo=6.00, stock=10,
+                                     vendidos=0, tendencias=Productos.TENDENCIA_BAJA, estado=Productos.ESTADO_DISPONIBLE)
+        v = Ventas.objects.create(fecha=timezone.make_aware(datetime(2025, 1, 10)), cliente=cliente, precio_total=0,
+                                  metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_COMPLETADA)
+        vi = VentaItem.objects.create(
+            venta=v, producto=p, cantidad=2, precio_unitario=10.00, precio_total=20.00)
+        self.assertEqual(float(vi.costo_unitario), 6.00)
+
+        # Un cambio posterior del costo no altera el margen histórico
+        p.costo = 8.00
+        p.save(update_fields=['costo'])
+        vi.refresh_from_db()
+        vi.save()
+        vi.refresh_from_db()
+        self.assertEqual(float(vi.costo_unitario), 6.00)
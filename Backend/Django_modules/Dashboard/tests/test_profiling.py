@@ -0,0 +1,81 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Dashboard import display_ids, profiling
+from Dashboard.models import Productos
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Productos.objects.create(nombre='P', categoria='Cat', precio=1.0, stock=1, vendidos=0,
+                                 tendencias=Productos.TENDENCIA_BAJA)
+        User = get_user_model()
+        cls.staff = User.objects.create_user(username='ops', password='x', is_staff=True)
+        cls.user = User.objects.create_user(username='ana', password='x')
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(PROFILE_DIR=tmp.name, PROFILING_ENABLED=True)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def test_sin_staff_se_ignora(self):
+        response = self._client(self.user).get('/api/Productos/', {'_profile': 'sql'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.recent(), [])
+
+    def test_sql_guarda_reporte_con_explain(self):
+        client = self._client(self.staff)
+        response = client.get('/api/metrics/top-products/', {'_profile': 'sql'},
+                              HTTP_X_REQUEST_ID='req-123')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertEqual(response['X-Profile-Id'], 'req-123')
+
+        report = client.get('/api/debug/profiles/req-123/').json()
+        self.assertEqual(report['mode'], 'sql')
+        self.assertEqual(report['user'], 'ops')
+        self.assertGreaterEqual(report['sql']['queries'], 1)
+        self.assertTrue(any('Dashboard_ventaitem' in s['sql'] for s in report['sql']['statements']))
+        self.assertIn('actual time', report['sql']['explain'][0]['plan'])
+        self.assertEqual([r['id'] for r in client.get('/api/debug/profiles/').json()], ['req-123'])
+        self.assertEqual(self._client(self.user).get('/api/debug/profiles/req-123/').status_code, 403)
+
+    def test_cpu_y_mem_en_linea(self):
+        client = self._client(self.staff)
+        report = client.get('/api/Productos/', {'_profile': 'cpu', '_profile_inline': '1'}).json()
+        self.assertEqual(report['status'], 200)
+        self.assertTrue(report['cpu']['functions'])
+        report = client.get('/api/Productos/', {'_profile': 'mem', '_profile_inline': '1'}).json()
+        self.assertGreater(report['mem']['peak_mb'], 0)
+        self.assertTrue(report['mem']['allocations'])
+        self.assertEqual(len(profiling.recent()), 2)
+
+    async def test_asgi(self):
+        token = RefreshToken.for_user(self.staff).access_token
+        response = await self.async_client.get(
+            '/api/async/metrics/top-products/', {'_profile': 'sql'},
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        report = profiling.load(response['X-Profile-Id'])
+        self.assertGreaterEqual(report['sql']['queries'], 1)
+
+    def test_explain_no_repite_efectos(self):
+        first = display_ids.next_display_id()
+        sql = 'SELECT nextval(%s) FROM generate_series(1, %s)'
+        [plan] = profiling.explain_slowest([('default', sql, [display_ids.SEQUENCE_NAME, 5], 0.1)], 5)
+        self.assertFalse(plan['analyze'])
+        self.assertNotIn('actual time', plan['plan'])
+        self.assertEqual(display_ids.next_display_id(), first + 1)
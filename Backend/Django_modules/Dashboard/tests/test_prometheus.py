@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from prometheus_client import REGISTRY
+
+from Dashboard import prometheus
+from Dashboard.models import Productos
+from Dashboard.services import gemini_client as gc
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='')
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Productos.objects.create(nombre='P', categoria='Cat', precio=1.0, stock=1, vendidos=0,
+                                 tendencias=Productos.TENDENCIA_BAJA)
+        cls.staff = get_user_model().objects.create_user(username='ops', password='x', is_staff=True)
+
+    @override_settings(REQUEST_TIMING=True, REQUEST_TIMING_FLAG=None)
+    def test_peticion_y_consultas_por_alias(self):
+        view = 'productos-list'
+        requests_before = _value('dashboard_http_requests_total', view=view, method='GET', status='200')
+        latency_before = _value('dashboard_http_request_duration_seconds_count', view=view, method='GET')
+        queries_before = _value('dashboard_db_queries_total', alias='default')
+
+        response = self.client.get('/api/Productos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_value('dashboard_http_requests_total', view=view, method='GET', status='200'),
+                         requests_before + 1)
+        self.assertEqual(_value('dashboard_http_request_duration_seconds_count', view=view, method='GET'),
+                         latency_before + 1)
+        self.assertEqual(_value('dashboard_db_queries_total', alias='default'),
+                         queries_before + int(response['X-Query-Count']))
+
+        self.client.force_login(self.staff)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('dashboard_http_request_duration_seconds_bucket{le="0.005",method="GET",view="productos-list"}',
+                      body)
+        self.assertIn('dashboard_db_query_seconds_total{alias="default"}', body)
+
+    def test_sin_token_solo_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user(username='ana', password='x'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_cache_de_agregados(self):
+        misses = _value('dashboard_cache_requests_total', cache='aggregates', result='miss')
+        self.client.get('/api/metrics/top-products/')
+        self.assertEqual(_value('dashboard_cache_requests_total', cache='aggregates', result='miss'), misses + 1)
+
+
+class GeminiMetricsTests(TestCase):
+    def test_latencia_tokens_y_fallback(self):
+        Productos.objects.create(nombre='P', categoria='Cat', precio=10.0, stock=5, vendidos=1,
+                                 tendencias=Productos.TENDENCIA_MEDIA)
+        client = mock.Mock()
+        client.models.generate_content.return_value = SimpleNamespace(
+            text='sin json', usage_metadata=SimpleNamespace(prompt_token_count=120, candidates_token_count=8))
+        op = {'operation': 'recommendation'}
+        calls = _value('dashboard_gemini_request_duration_seconds_count', outcome='ok', **op)
+        tokens = _value('dashboard_gemini_tokens_total', kind='prompt', **op)
+        fallbacks = _value('dashboard_gemini_fallbacks_total', reason='invalid_output', **op)
+
+        with mock.patch.object(gc, '_get_client', return_value=client):
+            gc.generate_ai_recommendation(limit=1)
+        self.assertEqual(_value('dashboard_gemini_request_duration_seconds_count', outcome='ok', **op), calls + 1)
+        self.assertEqual(_value('dashboard_gemini_tokens_total', kind='prompt', **op), tokens + 120)
+        self.assertEqual(_value('dashboard_gemini_fallbacks_total', reason='invalid_output', **op),
+                         fallbacks + 1)
+
+
+class MultiprocessTests(SimpleTestCase):
+    def test_suma_los_workers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=tmp)
+            script = ("from Dashboard import prometheus; "
+                      "prometheus.cache_result('mp', 'hit'); prometheus.export_jobs.labels('pdf').inc()")
+            pids = []
+            for _ in range(2):
+                worker = subprocess.Popen([sys.executable, '-c', script], cwd=BASE_DIR, env=env)
+                self.assertEqual(worker.wait(timeout=60), 0)
+                pids.append(worker.pid)
+            with mock.patch.dict(os.environ, PROMETHEUS_MULTIPROC_DIR=tmp):
+                body = prometheus.exposition().decode()
+                self.assertIn('dashboard_cache_requests_total{cache="mp",result="hit"} 2.0', body)
+                self.assertIn('dashboard_export_jobs_in_progress{kind="pdf"} 2.0', body)
+                # child_exit de gunicorn: los gauges livesum dejan de contar al worker
+                for pid in pids:
+                    prometheus.mark_process_dead(pid)
+                body = prometheus.exposition().decode()
+        self.assertIn('dashboard_cache_requests_total{cache="mp",result="hit"} 2.0', body)
+        self.assertNotIn('dashboard_export_jobs_in_progress{kind="pdf"}', body)
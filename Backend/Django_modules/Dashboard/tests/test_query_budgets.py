@@ -0,0 +1,242 @@
+"""Presupuesto de consultas SQL por ruta de Dashboard/urls.py.
+
+Cada ruta se pide en las tres tiendas (/api/, /api2/, /api3/) con dos
+tamaños de dataset. Falla si una ruta supera su presupuesto o si hace más
+consultas con el dataset grande que con el pequeño (N+1: una consulta por
+fila). Al añadir una ruta hay que registrarla en ROUTES o en EXEMPT.
+
+El conteo sale de la cabecera X-Query-Count de instrumentation.py e incluye
+la sesión y el usuario; cada medición va precedida de una petición de
+calentamiento (perfil y tienda creados en el primer GET, cachés de
+ContentType...).
+"""
+
+import io
+import tempfile
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Dashboard import bench, coalesce, profiling
+from Dashboard import urls as dashboard_urls
+from Dashboard.db_router import using_store
+from Dashboard.models import Clientes, Productos, RecomendacionIA, Store, Tasa, VentaItem, Ventas
+from Dashboard.services import gemini_client as gc
+
+PREFIXES = {'default': '/api/', 'store_b': '/api2/', 'store_c': '/api3/'}
+# ventas, (clientes, productos)
+SIZES = {'pequeño': (12, (5, 4)), 'grande': (60, (25, 20))}
+ANCHOR = bench.day_anchor()
+
+# budget: consultas máximas; params/data: dict o función(ctx); detail: modelo del pk;
+# kwargs: función(ctx) con los argumentos de la URL
+Route = namedtuple('Route', 'budget method params data detail kwargs',
+                   defaults=('get', None, None, None, None))
+
+
+def _costs_csv(ctx):
+    rows = ''.join(f'{nombre},{i + 1}.50\n' for i, nombre in enumerate(ctx.productos))
+    csv_file = io.BytesIO(f'nombre,costo\n{rows}NoExiste,1\n'.encode('utf-8'))
+    csv_file.name = 'costos.csv'
+    return {'file': csv_file}
+
+
+def _avatar(ctx):
+    avatar = io.BytesIO(b'\x89PNG\r\n\x1a\n')
+    avatar.name = 'avatar.png'
+    return {'avatar': avatar}
+
+
+def _register(ctx):
+    ctx.registered += 1
+    return {'username': f'nuevo{ctx.registered}', 'email': f'nuevo{ctx.registered}@test.local',
+            'password': 'Clave-Segura-123', 'password2': 'Clave-Segura-123'}
+
+
+# Rutas con varias variantes: '<nombre de la URL>:<variante>'
+ROUTES = {
+    'api-root': Route(1),
+    'clientes-list': Route(2),
+    'clientes-detail': Route(2, detail=Clientes),
+    'productos-list': Route(2),
+    'productos-detail': Route(2, detail=Productos),
+    'tasa-list': Route(2),
+    'tasa-detail': Route(2, detail=Tasa),
+    'ventas-list': Route(3),
+    'ventas-detail': Route(4, detail=Ventas),
+    'ventaitem-list': Route(2),
+    'ventaitem-detail': Route(2, detail=VentaItem),
+    'recomendacionia-list': Route(2),
+    'recomendacionia-detail': Route(2, detail=RecomendacionIA),
+    'stores-list': Route(2),
+    'stores-detail': Route(2, detail=Store),
+    'register': Route(5, 'post', data=_register),
+    'export-pdf:productos': Route(3, params={'tipo': 'productos'}),
+    'export-pdf:clientes': Route(3, params={'tipo': 'clientes'}),
+    'export-pdf:ventas': Route(6, params={'tipo': 'ventas'}),
+    'export-csv:productos': Route(1, params={'tipo': 'productos'}),
+    'export-csv:clientes': Route(1, params={'tipo': 'clientes'}),
+    'export-csv:ventas': Route(4, params={'tipo': 'ventas'}),
+    'export-cost-template': Route(3),
+    'import-costs': Route(4, 'post', data=_costs_csv),
+    'sales-monthly': Route(19),
+    'sales-yearly': Route(16),
+    'revenue-by-category': Route(2),
+    'top-products': Route(3),
+    'customers-monthly': Route(15),
+    'top-customers-monthly': Route(3),
+    'top-categories-monthly': Route(3),
+    'sales-heatmap': Route(1),
+    'returning-customers-rate': Route(4),
+    'products-growth': Route(4),
+    'structured-monthly': Route(2),
+    'structured-by-product': Route(3),
+    'structured-by-category': Route(2),
+    'db-pool-stats': Route(1),
+    'request-profiles': Route(1),
+    'request-profile': Route(1, kwargs=lambda ctx: {'request_id': ctx.profile_id}),
+    'ai-recommendations': Route(4, 'post', data={'limit': 10}),
+    'async-ai-recommendations': Route(4, 'post', data={'limit': 10}),
+    'async-top-products': Route(3),
+    'async-revenue-by-category': Route(2),
+    'profile': Route(5),
+    'profile:put': Route(4, 'put', data={'first_name': 'Ana', 'company': 'Tienda'}),
+    'profile-avatar': Route(3, 'post', data=_avatar),
+}
+
+EXEMPT = {
+    # Corren en hilos con conexión propia: no ven la transacción del test
+    # (cada métrica que agrupan tiene su propia entrada arriba)
+    'cross-store-metrics': 'fan-out a otras tiendas en hilos',
+    'async-metrics-bundle': 'métricas en paralelo en hilos',
+    # Stream SSE sin fin
+    'live-events': 'stream SSE',
+}
+
+
+def _route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+def _gemini_client():
+    result = SimpleNamespace(text='sin json', usage_metadata=None)
+    client = mock.Mock()
+    client.models.generate_content.return_value = result
+    client.aio.models.generate_content = mock.AsyncMock(return_value=result)
+    return client
+
+
+class RouteCoverageTests(TestCase):
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        names = set(_route_names(dashboard_urls.urlpatterns))
+        registered = {label.split(':')[0] for label in ROUTES} | set(EXEMPT)
+        self.assertEqual(names - registered, set(), 'Rutas sin presupuesto de consultas')
+        self.assertEqual(registered - names, set(), 'Presupuestos de rutas que ya no existen')
+
+
+@override_settings(REQUEST_TIMING=True, REQUEST_TIMING_FLAG=None, METRICS_ENABLED=False)
+class QueryBudgetTests(TestCase):
+    databases = set(PREFIXES)
+
+    def setUp(self):
+        coalesce.aggregates.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=Path(media.name), PROFILE_DIR=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        patcher = mock.patch.object(gc, '_get_client', side_effect=_gemini_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self, alias):
+        # Sesión (vistas Django) y JWT (DRF y vistas async); el usuario vive en la BD de la tienda
+        with using_store(alias):
+            self.user = get_user_model().objects.create_superuser('budget', 'budget@test.local', 'x')
+            client = APIClient()
+            client.force_login(self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        return client
+
+    def _seed(self, alias, sales, sizes):
+        """Dataset de bench más tasas, recomendaciones y tiendas (una por producto)."""
+        with using_store(alias):
+            bench.seed(alias, sales, seed=1, anchor=ANCHOR, sizes=sizes)
+            productos = list(Productos.objects.all())
+            Tasa.objects.bulk_create(
+                Tasa(fecha=(ANCHOR - timedelta(days=i)).date(), tasa=Decimal('36.5'))
+                for i in range(len(productos)))
+            RecomendacionIA.objects.bulk_create(
+                RecomendacionIA(producto=p, descripcion=f'Reponer {p.nombre}') for p in productos)
+            Store.objects.bulk_create(
+                Store(name=f'Tienda {i}', api_url=f'http://localhost:8000/t{i}/', owner=self.user)
+                for i in range(len(productos)))
+            profiling.save({'id': 'budget', 'mode': 'sql', 'path': '/api/'})
+            return SimpleNamespace(
+                registered=0,
+                profile_id='budget',
+                productos=[p.nombre for p in productos],
+                pk={model: model.objects.values_list('pk', flat=True).first()
+                    for model in (Clientes, Productos, Tasa, Ventas, VentaItem, RecomendacionIA, Store)})
+
+    def _path(self, alias, name, route, ctx):
+        kwargs = route.kwargs(ctx) if route.kwargs else None
+        if route.detail:
+            kwargs = {'pk': ctx.pk[route.detail]}
+        return PREFIXES[alias] + reverse(name, kwargs=kwargs).removeprefix('/api/')
+
+    def _request(self, client, path, route, ctx):
+        method = getattr(client, route.method)
+        if route.method == 'get':
+            params = route.params(ctx) if callable(route.params) else route.params
+            return method(path, params or {})
+        data = route.data(ctx) if callable(route.data) else route.data
+        if any(hasattr(v, 'read') for v in (data or {}).values()):
+            return method(path, data, format='multipart')
+        return method(path, data or {}, format='json')
+
+    def _measure(self, alias, client, ctx):
+        counts = {}
+        for label, route in ROUTES.items():
+            path = self._path(alias, label.split(':')[0], route, ctx)
+            self._request(client, path, route, ctx)
+            response = self._request(client, path, route, ctx)
+            self.assertLess(response.status_code, 400, f'{label} en {path}: {response.status_code}')
+            counts[label] = int(response['X-Query-Count'])
+        return counts
+
+    def _check_store(self, alias):
+        client = self._client(alias)
+        measured = {}
+        for size, (sales, sizes) in SIZES.items():
+            with transaction.atomic(using=alias):
+                measured[size] = self._measure(alias, client, self._seed(alias, sales, sizes))
+                transaction.set_rollback(True, using=alias)
+        for label, route in ROUTES.items():
+            small, large = measured['pequeño'][label], measured['grande'][label]
+            with self.subTest(route=label, store=PREFIXES[alias]):
+                self.assertLessEqual(large, small, f'{label}: las consultas crecen con los datos')
+                self.assertLessEqual(large, route.budget, f'{label}: supera el presupuesto')
+
+    def test_api(self):
+        self._check_store('default')
+
+    def test_api2(self):
+        self._check_store('store_b')
+
+    def test_api3(self):
+        self._check_store('store_c')
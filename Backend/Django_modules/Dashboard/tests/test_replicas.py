@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from Dashboard import replicas
+from Dashboard.db_router import using_store
+from Dashboard.models import Ventas
+
+
+@mock.patch.object(replicas, 'replica_for', lambda primary: 'store_b_replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @mock.patch.object(replicas, 'replica_healthy', lambda alias: True)
+    def test_lecturas_analiticas_van_a_la_replica(self):
+        with using_store('store_b'):
+            self.assertEqual(router.db_for_read(Ventas), 'store_b')
+            with replicas.replica_reads():
+                self.assertEqual(router.db_for_read(Ventas), 'store_b_replica')
+                # Usuarios/perfiles siempre al primario
+                self.assertEqual(router.db_for_read(get_user_model()), 'store_b')
+
+    @mock.patch.object(replicas, 'replica_healthy', lambda alias: False)
+    def test_replica_con_retraso_o_caida_usa_el_primario(self):
+        with using_store('store_b'), replicas.replica_reads():
+            self.assertEqual(router.db_for_read(Ventas), 'store_b')
+
+    @mock.patch.object(replicas, 'replica_healthy', lambda alias: True)
+    def test_read_your_writes(self):
+        request = self.factory.post('/api/Ventas/')
+        response = HttpResponse()
+        with using_store('store_b'), replicas.request_scope(request) as scope:
+            with replicas.replica_reads():
+                self.assertEqual(router.db_for_read(Ventas), 'store_b_replica')
+            router.db_for_write(Ventas)
+            with replicas.replica_reads():
+                self.assertEqual(router.db_for_read(Ventas), 'store_b')
+            scope.remember(response)
+        cookie = response.cookies['replica_sticky'].value
+
+        # La siguiente petición del mismo cliente (en cualquier worker) sigue en el primario
+        request = self.factory.get('/api/metrics/sales-monthly/')
+        request.COOKIES['replica_sticky'] = cookie
+        with using_store('store_b'), replicas.request_scope(request):
+            self.assertEqual(router.db_for_read(Ventas), 'store_b')
+        # Otro cliente (sin la cookie) o con la cookie alterada sí usa la réplica
+        for cookies in ({}, {'replica_sticky': cookie[:-2] + 'xx'}):
+            request = self.factory.get('/api/metrics/sales-monthly/')
+            request.COOKIES.update(cookies)
+            with using_store('store_b'), replicas.request_scope(request):
+                self.assertEqual(router.db_for_read(Ventas), 'store_b_replica')
+        # Otra tienda no queda afectada
+        request = self.factory.get('/api/metrics/sales-monthly/')
+        request.COOKIES['replica_sticky'] = cookie
+        with using_store('store_c'), replicas.request_scope(request):
+            self.assertEqual(router.db_for_read(Ventas), 'store_b_replica')
@@ -27,3 +27,17 @@ class GeminiClientTests(TestCase):
         out = gc.build_structured_by_product(metric='revenue', days=30)
         self.assertEqual(out['dimension'], 'product')
         self.assertIn('items', out)
+
+    async def test_agenerate_ai_recommendation_fallback_en_429(self):
+        from unittest import mock
+        from asgiref.sync import sync_to_async
+        await sync_to_async(Productos.objects.create)(
+            nombre='ProdAio', categoria='Cat', precio=10.0, stock=5, vendidos=1,
+            tendencias=Productos.TENDENCIA_MEDIA, estado=Productos.ESTADO_DISPONIBLE)
+        client = mock.Mock()
+        client.aio.models.generate_content = mock.AsyncMock(
+            side_effect=RuntimeError('429 RESOURCE_EXHAUSTED'))
+        with mock.patch.object(gc, '_get_client', return_value=client):
+            out = await gc.agenerate_ai_recommendation(limit=1)
+        self.assertEqual(out['debug']['fallback_reason'], 'quota_exceeded')
+        self.assertEqual(out['products'][0]['nombre'], 'ProdAio')
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Dashboard import display_ids, slow_queries
+from Dashboard.models import HuellaConsulta, PlanConsulta, Productos
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_literales_y_parametros_dan_la_misma_huella(self):
+        a = slow_queries.fingerprint("SELECT * FROM t WHERE id = 1 AND nombre = 'ana'")
+        b = slow_queries.fingerprint("SELECT *  FROM t\nWHERE id = 25 AND nombre = 'o''neil'")
+        c = slow_queries.fingerprint('SELECT * FROM t WHERE id = %s AND nombre = %s')
+        self.assertEqual(a, b)
+        self.assertEqual(a, c)
+        self.assertEqual(a[1], 'SELECT * FROM t WHERE id = ? AND nombre = ?')
+
+    def test_listas_in_colapsadas(self):
+        short = slow_queries.fingerprint('SELECT "t"."c1" FROM t WHERE id IN (%s, %s)')
+        long = slow_queries.fingerprint('SELECT "t"."c1" FROM t WHERE id IN (1, 2, 3, 4)')
+        self.assertEqual(short, long)
+        self.assertIn('"t"."c1"', short[1])
+        self.assertIn('IN (...)', short[1])
+
+
+@override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_MS=0, SLOW_QUERY_ASYNC=False,
+                   SLOW_QUERY_EXPLAIN_INTERVAL=300)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Productos.objects.create(nombre='P', categoria='Cat', precio=1.0, stock=1, vendidos=0,
+                                 tendencias=Productos.TENDENCIA_BAJA)
+        cls.admin = get_user_model().objects.create_superuser('root', 'root@test.local', 'x')
+
+    def setUp(self):
+        slow_queries._explained.clear()
+
+    def _get(self, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _entry(self):
+        return HuellaConsulta.objects.get(sql_normalizado__contains='FROM "Dashboard_productos"')
+
+    def test_consulta_con_vista_alias_y_plan(self):
+        self._get('/api/Productos/')
+        entry = self._entry()
+        self.assertEqual(entry.llamadas, 1)
+        self.assertEqual(entry.vistas, {'productos-list': 1})
+        self.assertEqual(entry.alias, {'default': 1})
+        plan = entry.planes.get()
+        self.assertEqual(plan.vista, 'productos-list')
+        self.assertEqual(plan.alias_explain, 'default')
+        self.assertIn('actual time', plan.plan)
+        self.assertEqual(plan.error, '')
+
+    def test_un_explain_por_huella_e_intervalo(self):
+        self._get('/api/Productos/')
+        self._get('/api/Productos/')
+        entry = self._entry()
+        self.assertEqual(entry.llamadas, 2)
+        self.assertGreaterEqual(entry.tiempo_total_ms, entry.tiempo_max_ms)
+        self.assertEqual(PlanConsulta.objects.filter(huella=entry).count(), 1)
+
+    @override_settings(SLOW_QUERY_LOG=False)
+    def test_nextval_sin_analyze(self):
+        first = display_ids.next_display_id()
+        slow_queries.record(slow_queries.SlowQuery(
+            'default', 'SELECT nextval(%s) FROM generate_series(1, %s)',
+            [display_ids.SEQUENCE_NAME, 5], 900.0, 'clientes-list'))
+        plan = PlanConsulta.objects.get(sql__contains='nextval')
+        self.assertEqual(plan.error, '')
+        self.assertNotIn('actual time', plan.plan)
+        self.assertEqual(display_ids.next_display_id(), first + 1)
+
+    @override_settings(SLOW_QUERY_LOG=False)
+    def test_desactivado(self):
+        self._get('/api/Productos/')
+        with self.assertRaises(HuellaConsulta.DoesNotExist):
+            self._entry()
+
+    def test_admin_ordenado_por_tiempo_total(self):
+        HuellaConsulta.objects.create(huella='a' * 16, sql_normalizado='SELECT ? FROM lenta',
+                                      llamadas=3, tiempo_total_ms=9000, vistas={'top-products': 3})
+        client = APIClient()
+        client.force_login(self.admin)
+        with self.settings(SLOW_QUERY_LOG=False):
+            response = client.get('/admin/Dashboard/huellaconsulta/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list)[0].huella, 'a' * 16)
+        self.assertContains(response, 'top-products')
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import TestCase, override_settings
+
+from Dashboard import stores
+from Dashboard.models import Store
+
+
+class StoreRegistryTests(TestCase):
+    def test_resolucion_por_prefijo_legado_y_cabecera(self):
+        entry, path = stores.resolve_path('/api/s/store_b/metrics/sales-monthly/')
+        self.assertEqual(entry.alias, 'store_b')
+        self.assertEqual(path, '/api/metrics/sales-monthly/')
+
+        entry, path = stores.resolve_path('/api3/metrics/top-products/')
+        self.assertEqual(entry.alias, 'store_c')
+        self.assertEqual(path, '/api/metrics/top-products/')
+
+        entry, path = stores.resolve_path('/api/Productos/', 'store_b')
+        self.assertEqual(entry.alias, 'store_b')
+        self.assertEqual(path, '/api/Productos/')
+
+        entry, _path = stores.resolve_path('/api/Productos/')
+        self.assertEqual(entry.alias, 'default')
+
+        with self.assertRaises(stores.UnknownStore):
+            stores.resolve_path('/api/s/no-existe/Productos/')
+
+    def test_tienda_desconocida_responde_404(self):
+        resp = self.client.get('/api/s/no-existe/metrics/sales-monthly/')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_tienda_de_la_tabla_store(self):
+        owner = get_user_model().objects.create_user(username='own', password='x')
+        Store.objects.create(name='Norte', api_url='http://localhost:8000/api/s/norte/',
+                             owner=owner, slug='norte', db_settings={'NAME': 'tienda_norte'})
+        entry = stores.get_store('norte')
+        self.assertTrue(entry.dynamic)
+        self.assertEqual(entry.database['NAME'], 'tienda_norte')
+        stores.invalidate('norte')
+
+    @override_settings(STORE_MAX_OPEN_ALIASES=2)
+    def test_alias_dinamicos_con_desalojo_lru(self):
+        entries = [stores.StoreEntry(f't{i}', f'store_t{i}', {'NAME': f'tienda_t{i}'})
+                   for i in range(3)]
+        try:
+            stores.acquire(entries[0])
+            for e in entries[1:]:
+                stores.acquire(e)
+                stores.release(e)
+            # t0 sigue en uso: se desaloja t1, el menos reciente sin peticiones
+            self.assertIn('store_t0', connections.settings)
+            self.assertNotIn('store_t1', connections.settings)
+            self.assertIn('store_t2', connections.settings)
+        finally:
+            stores.release(entries[0])
+            for e in entries:
+                if e.alias in stores._open:
+                    stores._open.pop(e.alias)
+                    stores._unregister_alias(e.alias)
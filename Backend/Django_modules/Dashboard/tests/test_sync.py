@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Dashboard import sync
+from Dashboard.models import Clientes, Productos, RegistroEliminado, Ventas, VentaItem
+
+
+def _cliente(cedula):
+    return Clientes.objects.create(nombre='Cli', apellido=cedula, cedula=cedula, ciudad='X', correo='c@x.com',
+                                   telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=0)
+
+
+def _producto(nombre):
+    return Productos.objects.create(nombre=nombre, categoria='Cat', precio=5.0, costo='2.00', stock=10,
+                                    vendidos=0, tendencias=Productos.TENDENCIA_BAJA,
+                                    estado=Productos.ESTADO_DISPONIBLE)
+
+
+@override_settings(SYNC_TOKEN_MARGIN_SECONDS=0)
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.c1, self.c2 = _cliente('1'), _cliente('2')
+        self.p1, self.p2 = _producto('P1'), _producto('P2')
+        self.venta = Ventas.objects.create(fecha=timezone.now(), cliente=self.c1, precio_total='10.00',
+                                           metodo_compra=Ventas.METODO_EFECTIVO,
+                                           estado=Ventas.ESTADO_COMPLETADA)
+        self.item = VentaItem.objects.create(venta=self.venta, producto=self.p1, cantidad=2,
+                                             precio_unitario='5.00', precio_total='10.00')
+        # Todo lo anterior queda "viejo"
+        hace_un_rato = timezone.now() - timedelta(hours=1)
+        for model in (Clientes, Productos, Ventas, VentaItem):
+            model.objects.update(actualizado_en=hace_un_rato)
+
+    def _delta(self, url, token):
+        sep = '&' if '?' in url else '?'
+        resp = self.client.get(f'{url}{sep}updated_since={token}')
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_solo_filas_cambiadas_y_borradas(self):
+        token = sync.new_token()
+        body = self._delta('/api/Clientes/', token)
+        self.assertEqual((body['changed'], body['deleted']), ([], []))
+
+        self.c2.ciudad = 'Y'
+        self.c2.save()
+        nuevo = _cliente('3')
+        body = self._delta('/api/Clientes/?fields=id,ciudad', token)
+        self.assertEqual(body['changed'], [{'id': self.c2.id, 'ciudad': 'Y'}, {'id': nuevo.id, 'ciudad': 'X'}])
+        self.assertGreaterEqual(body['sync_token'], token)
+
+        nuevo_id = nuevo.id
+        nuevo.delete()
+        body = self._delta('/api/Clientes/', token)
+        self.assertEqual([c['id'] for c in body['changed']], [self.c2.id])
+        self.assertEqual(body['deleted'], [nuevo_id])
+        # El JSON de cada fila es el mismo que el del listado completo
+        completo = {c['id']: c for c in self.client.get('/api/Clientes/').json()}
+        self.assertEqual(body['changed'][0], completo[self.c2.id])
+
+    def test_cambios_en_filas_hijas_marcan_al_padre(self):
+        token = sync.new_token()
+        otra = Ventas.objects.create(fecha=timezone.now(), cliente=self.c2, precio_total='5.00',
+                                     metodo_compra=Ventas.METODO_EFECTIVO, estado=Ventas.ESTADO_COMPLETADA)
+        VentaItem.objects.create(venta=otra, producto=self.p2, cantidad=1,
+                                 precio_unitario='5.00', precio_total='5.00')
+        self.assertEqual([c['id'] for c in self._delta('/api/Clientes/', token)['changed']], [self.c2.id])
+        self.assertEqual([p['id'] for p in self._delta('/api/Productos/', token)['changed']], [self.p2.id])
+
+        token = sync.new_token()
+        self.item.delete()
+        body = self._delta('/api/Ventas/?include=items', token)
+        self.assertEqual(body['changed'], [{**body['changed'][0], 'id': self.venta.id, 'items': []}])
+        self.assertEqual([p['id'] for p in self._delta('/api/Productos/', token)['changed']], [self.p1.id])
+        self.assertEqual(RegistroEliminado.objects.get().modelo, 'Dashboard.VentaItem')
+
+    def test_save_con_update_fields_sale_en_el_delta(self):
+        token = sync.new_token()
+        self.p2.stock = 7
+        self.p2.save(update_fields=['stock'])
+        self.c2.ciudad = 'Y'
+        self.c2.save(update_fields=['ciudad'])
+        self.assertEqual([p['id'] for p in self._delta('/api/Productos/', token)['changed']], [self.p2.id])
+        self.assertEqual([c['id'] for c in self._delta('/api/Clientes/', token)['changed']], [self.c2.id])
+        self.venta.estado = Ventas.ESTADO_PENDIENTE
+        self.venta.save(update_fields=['estado'])
+        self.assertEqual([v['id'] for v in self._delta('/api/Ventas/', token)['changed']], [self.venta.id])
+
+    def test_importar_costos_sale_en_el_delta(self):
+        token = sync.new_token()
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_superuser('root', 'r@x.com', 'x'))
+        csv_file = SimpleUploadedFile('costos.csv', b'nombre,costo\nP2,3.25\n', content_type='text/csv')
+        resp = client.post('/api/productos/costos/importar/', {'file': csv_file}, format='multipart')
+        self.assertEqual(resp.json(), {'updated': 1, 'errors': []})
+        self.assertEqual([p['id'] for p in self._delta('/api/Productos/', token)['changed']], [self.p2.id])
+
+    def test_token_invalido_o_vencido(self):
+        self.assertEqual(self.client.get('/api/Ventas/', {'updated_since': 'ayer'}).status_code, 400)
+        viejo = sync.new_token(timezone.now() - timedelta(days=400))
+        self.assertEqual(self.client.get('/api/Ventas/', {'updated_since': viejo}).status_code, 410)
+
+    def test_purgar_eliminados(self):
+        self.c2.delete()
+        RegistroEliminado.objects.update(eliminado_en=timezone.now() - timedelta(days=60))
+        out = StringIO()
+        call_command('purgar_eliminados', '--stores', 'default', stdout=out)
+        self.assertIn('1 lápidas borradas', out.getvalue())
+        self.assertFalse(RegistroEliminado.objects.exists())
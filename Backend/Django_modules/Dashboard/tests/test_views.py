@@ -3,6 +3,7 @@ from rest_framework.test import APIClient
 from Dashboard.models import Productos, Clientes, Ventas
 import io
 from django.utils import timezone
+from django.contrib.auth import get_user_model
 
 
 class ImportCostsViewTests(TestCase):
@@ -19,3 +20,18 @@ class ImportCostsViewTests(TestCase):
         if resp.status_code == 200:
             data = resp.json()
             self.assertIn('updated', data)
+
+
+class DBPoolStatsViewTests(TestCase):
+    def test_solo_staff(self):
+        client = APIClient()
+        resp = client.get('/api/metrics/db-pool/')
+        self.assertIn(resp.status_code, (401, 403))
+
+        staff = get_user_model().objects.create_user(
+            username='ops', password='x', is_staff=True)
+        client.force_authenticate(user=staff)
+        resp = client.get('/api/metrics/db-pool/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('default', resp.json())
+        self.assertIn('avg_wait_ms', resp.json()['default'])
@@ -8,11 +8,12 @@ class ClientesModelTests(TestCase):
         c1 = Clientes.objects.create(
             nombre='A', apellido='B', cedula='1', ciudad='X', correo='a@b.com', telefono='1', fecha_registro=date(2020, 1, 1), cantidad_compras=0
         )
-        self.assertEqual(c1.display_id, 1000)
+        # La secuencia no se revierte entre tests: solo se garantiza el orden
+        self.assertGreaterEqual(c1.display_id, 1000)
         c2 = Clientes.objects.create(
             nombre='C', apellido='D', cedula='2', ciudad='Y', correo='c@d.com', telefono='2', fecha_registro=date(2020, 1, 2), cantidad_compras=0
         )
-        self.assertEqual(c2.display_id, 1001)
+        self.assertEqual(c2.display_id, c1.display_id + 1)
 
 
 class VentaItemStrTests(TestCase):
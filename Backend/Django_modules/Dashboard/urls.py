@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework import routers
-from . import views
+from . import views, async_views
 
 router = routers.DefaultRouter()
 # Register the viewset defined in this app's views
@@ -52,9 +52,29 @@ urlpatterns = [
          views.StructuredByProductView.as_view(), name='structured-by-product'),
     path('metrics/structured-by-category/',
          views.StructuredByCategoryView.as_view(), name='structured-by-category'),
+    # Misma métrica en varias tiendas en paralelo (por tienda + consolidado)
+    path('metrics/cross-store/', views.CrossStoreMetricsView.as_view(),
+         name='cross-store-metrics'),
+    # Métricas de los pools de conexiones (staff)
+    path('metrics/db-pool/', views.DBPoolStatsView.as_view(), name='db-pool-stats'),
+    # Reportes de ?_profile=cpu|sql|mem (staff)
+    path('debug/profiles/', views.RequestProfilesView.as_view(), name='request-profiles'),
+    path('debug/profiles/<str:request_id>/', views.RequestProfilesView.as_view(),
+         name='request-profile'),
     # Recomendaciones IA (Gemini)
     path('ai/recommendations/',
          views.AIRecommendationsView.as_view(), name='ai-recommendations'),
+    # Versiones async (ASGI) de los endpoints limitados por E/S
+    path('async/ai/recommendations/', async_views.AsyncAIRecommendationsView.as_view(),
+         name='async-ai-recommendations'),
+    path('async/metrics/top-products/', async_views.AsyncTopProductsView.as_view(),
+         name='async-top-products'),
+    path('async/metrics/revenue-by-category/', async_views.AsyncRevenueByCategoryView.as_view(),
+         name='async-revenue-by-category'),
+    path('async/metrics/bundle/', async_views.AsyncMetricsBundleView.as_view(),
+         name='async-metrics-bundle'),
+    # Eventos en vivo (SSE) de la tienda: ventas, estados, stock y métricas del día
+    path('live/', async_views.LiveEventsView.as_view(), name='live-events'),
     # Perfil de usuario (autenticado)
     path('profile/', views.ProfileView.as_view(), name='profile'),
     path('profile/avatar/', views.ProfileAvatarUploadView.as_view(),
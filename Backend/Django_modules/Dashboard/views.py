@@ -17,6 +17,7 @@ from .serializer import (
     StoreSerializer,
 )
 from django.contrib.auth import get_user_model
+from django.db import router
 from django.db.models import Count, Sum, Max, Q, Exists, OuterRef
 from django.db.models import F
 from django.db.models.functions import TruncMonth
@@ -26,6 +27,7 @@ from django.views import View
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
 import io
+import copy
 import csv
 import datetime
 from django.core.files.storage import FileSystemStorage
@@ -37,6 +39,13 @@ from .services.gemini_client import (
 )
 from django.db.models import DecimalField, ExpressionWrapper
 from .models import UserProfile
+from .db_pool import pool_stats
+from .fast_serializers import ClientesReader, ProductosReader, VentasReader
+from .stores import (
+    UnknownStore, configured_stores, get_store, uses_simulated_plan,
+)
+from .services import cross_store
+from . import coalesce, invalidation, profiling, prometheus, sync
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -104,54 +113,157 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
-class Clientes_ViewSet(viewsets.ModelViewSet):
+class _Uncacheable(Exception):
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+class CoalescedMetricMixin:
+    """get() de métricas con single-flight y stale-while-revalidate (coalesce.py).
+
+    Peticiones iguales (tienda, vista y query params) comparten un cálculo; solo
+    se guardan las respuestas 200. No usar en vistas que dependan del usuario.
+    """
+    metric_models = (Ventas, VentaItem, Productos, Clientes)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Las vistas definen su propio get(): se envuelve tras autenticar, antes
+        # de que dispatch() busque el handler
+        if request.method == 'GET':
+            self.get = self._coalesced(self.get)
+
+    def _coalesced(self, handler):
+        def get(request, *args, **kwargs):
+            key = (type(self).__name__, tuple(sorted(
+                (k, tuple(v)) for k, v in request.query_params.lists())))
+
+            def compute():
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    raise _Uncacheable(response)
+                return response.data
+            try:
+                data, state = coalesce.aggregates.get(key, compute, self.metric_models)
+            except _Uncacheable as exc:
+                return exc.response
+            response = Response(data)
+            response['X-Cache'] = state
+            return response
+        return get
+
+
+class FastListMixin:
+    """list() con un lector de .values() (fast_serializers) en lugar del serializer.
+
+    Mismo JSON que el serializer; el resto de acciones no cambia. Admite
+    ?fields=a,b,c e ?include=items: la consulta solo trae las columnas y
+    anotaciones de las claves pedidas. Con ?updated_since=<sync_token> devuelve
+    solo las filas cambiadas y los ids borrados (ver sync.py).
+    """
+    list_reader = None
+    list_ordering = ('-id',)
+    # (modelo hijo, columna FK al padre): la fila cuenta como cambiada si
+    # cambió una hija (sus agregados o items están en el JSON del listado)
+    sync_dependencies = ()
+
+    def get_list_queryset(self):
+        # get_queryset() de la vista (tienda, filtros); en list no anota ni hace
+        # prefetch: el lector agrega solo lo que se pide
+        return self.get_queryset().order_by(*self.list_ordering)
+
+    def list(self, request, *args, **kwargs):
+        reader = self.list_reader
+        try:
+            fields = reader.select(request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if 'updated_since' in request.query_params:
+            return self.delta(request, fields)
+        queryset = reader.values(
+            self.filter_queryset(self.get_list_queryset()), fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.rows(page, fields))
+        return Response(reader.rows(queryset, fields))
+
+    def delta(self, request, fields):
+        """Filas cambiadas desde ?updated_since=, ids borrados y el próximo sync_token."""
+        try:
+            since = sync.parse_since(request.query_params['updated_since'])
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if sync.expired(since):
+            return Response({'detail': 'sync_token vencido: recargar el listado completo.'},
+                            status=status.HTTP_410_GONE)
+        # Token antes de leer: lo que se confirme durante la lectura entra en la próxima
+        token = sync.new_token()
+        changed = Q(actualizado_en__gte=since)
+        for child, column in self.sync_dependencies:
+            changed |= Q(pk__in=child.objects.filter(
+                actualizado_en__gte=since).values(column))
+        queryset = self.filter_queryset(self.get_list_queryset().filter(changed).order_by('id'))
+        model = self.queryset.model
+        return Response({
+            'changed': self.list_reader.rows(self.list_reader.values(queryset, fields), fields),
+            'deleted': sync.deleted_ids(model, since),
+            'sync_token': token,
+        })
+
+
+class Clientes_ViewSet(FastListMixin, viewsets.ModelViewSet):
     """ViewSet para el modelo Clientes."""
     queryset = Clientes.objects.all()
     serializer_class = Clientes_Serializers
+    list_reader = ClientesReader()
+    sync_dependencies = ((Ventas, 'cliente_id'),)
 
     def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'action', None) == 'list':
+            # El listado va por list_reader, que anota solo las claves pedidas
+            return queryset
         # Anotamos compras, gasto_total y última compra para que el serializer
-        # pueda calcular estado y devolver agregados en la lista.
-        return Clientes.objects.annotate(
-            compras=Count('ventas'),
-            gasto_total=Sum('ventas__precio_total'),
-            ultima_compra=Max('ventas__fecha')
-        ).order_by('-id')
+        # pueda calcular estado y devolver agregados.
+        return queryset.annotate(**ClientesReader.annotations).order_by('-id')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
-class Productos_ViewSet(viewsets.ModelViewSet):
+class Productos_ViewSet(FastListMixin, viewsets.ModelViewSet):
     """ViewSet para el modelo Productos"""
     queryset = Productos.objects.all()
     serializer_class = Productos_Serializers
+    list_reader = ProductosReader()
+    sync_dependencies = ((VentaItem, 'producto_id'),)
 
     def get_queryset(self):
-        # Anotamos ventas/ingresos/última venta para el dashboard de productos.
+        queryset = super().get_queryset()
+        if getattr(self, 'action', None) == 'list':
+            # El listado va por list_reader, que anota solo las claves pedidas
+            return queryset
         # Anotamos ventas/ingresos/última venta para el dashboard de productos.
         # Considerar solo items de ventas completadas para métrica consistente
         # con el endpoint de ingresos por categoría.
-        completed_filter = Q(
-            venta_items__venta__estado=Ventas.ESTADO_COMPLETADA)
-        return Productos.objects.annotate(
-            ventas_count=Count('venta_items', filter=completed_filter),
-            ingreso_total=Sum('venta_items__precio_total',
-                              filter=completed_filter),
-            vendidos_total=Sum('venta_items__cantidad',
-                               filter=completed_filter),
-            ultima_venta=Max('venta_items__venta__fecha',
-                             filter=completed_filter)
-        ).order_by('-id')
+        return queryset.annotate(**ProductosReader.annotations).order_by('-id')
     permission_classes = [IsGerenteOrReadOnly]
 
 
-class Ventas_ViewSet(viewsets.ModelViewSet):
+class Ventas_ViewSet(FastListMixin, viewsets.ModelViewSet):
     """ViewSet para el modelo de Ventas"""
     queryset = Ventas.objects.all()
     serializer_class = Ventas_Serializers
+    list_reader = VentasReader()
+    list_ordering = ('-fecha',)
+    sync_dependencies = ((VentaItem, 'venta_id'),)
 
     def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'action', None) == 'list':
+            # El listado va por list_reader (items en una consulta aparte)
+            return queryset
         # Evitar N+1: traer cliente y items + producto de cada item
-        return Ventas.objects.select_related('cliente').prefetch_related('items__producto').order_by('-fecha')
+        return queryset.select_related('cliente').prefetch_related('items__producto').order_by('-fecha')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
@@ -285,6 +397,10 @@ class VentaItem_ViewSet(viewsets.ModelViewSet):
     serializer_class = VentaItem_Serializers
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        # Evitar N+1: producto_nombre lee el producto de cada item
+        return VentaItem.objects.select_related('producto')
+
 
 class RegisterView(generics.CreateAPIView):
     """Endpoint para registrar un nuevo usuario."""
@@ -293,6 +409,34 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
 
 
+def _ai_recommendation_params(data):
+    """Normaliza el body de las recomendaciones IA: (product_ids, category, limit)."""
+    data = data or {}
+
+    # Limpiar/normalizar parámetros de entrada
+    product_ids = data.get('product_ids')
+    if isinstance(product_ids, (list, tuple)):
+        try:
+            product_ids = [int(pid) for pid in product_ids]
+        except Exception:
+            product_ids = None
+    else:
+        product_ids = None
+
+    category = data.get('category')
+    try:
+        category = str(category).strip() if category is not None else None
+    except Exception:
+        category = None
+
+    limit = data.get('limit')
+    try:
+        limit = int(limit) if limit is not None else None
+    except Exception:
+        limit = None
+    return product_ids, category, limit
+
+
 class AIRecommendationsView(APIView):
     """Genera recomendaciones de marketing y stock usando Gemini.
 
@@ -314,29 +458,7 @@ class AIRecommendationsView(APIView):
           "limit": int
         }
         """
-        data = request.data or {}
-
-        # Limpiar/normalizar parámetros de entrada
-        product_ids = data.get('product_ids')
-        if isinstance(product_ids, (list, tuple)):
-            try:
-                product_ids = [int(pid) for pid in product_ids]
-            except Exception:
-                product_ids = None
-        else:
-            product_ids = None
-
-        category = data.get('category')
-        try:
-            category = str(category).strip() if category is not None else None
-        except Exception:
-            category = None
-
-        limit = data.get('limit')
-        try:
-            limit = int(limit) if limit is not None else None
-        except Exception:
-            limit = None
+        product_ids, category, limit = _ai_recommendation_params(request.data)
 
         # Permisos: solo superuser y Gerente pueden generar recomendaciones
         user = getattr(request, 'user', None)
@@ -345,12 +467,8 @@ class AIRecommendationsView(APIView):
 
         # Invocar servicio Gemini
         try:
-            payload = {
-                'product_ids': product_ids,
-                'category': category,
-                'limit': limit,
-            }
-            result = generate_ai_recommendation(**payload)
+            result = generate_ai_recommendation(
+                product_ids=product_ids, category=category, limit=limit)
             return Response(result, status=status.HTTP_200_OK)
         except GeminiError as ge:
             return Response({'error': str(ge)}, status=status.HTTP_400_BAD_REQUEST)
@@ -358,7 +476,7 @@ class AIRecommendationsView(APIView):
             return Response({'error': f'Error al generar recomendación: {exc}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class ProductsGrowthView(APIView):
+class ProductsGrowthView(CoalescedMetricMixin, APIView):
     """Productos con mayor crecimiento reciente.
 
     Calcula crecimiento de ingresos por producto entre los últimos N días y el periodo previo.
@@ -373,31 +491,29 @@ class ProductsGrowthView(APIView):
         start_now = today - datetime.timedelta(days=days)
         start_prev = start_now - datetime.timedelta(days=days)
 
-        # Ventana actual
+        # Ventana actual (columnas desnormalizadas: sin JOIN a Ventas/Productos)
         items_now = (
-            VentaItem.objects.select_related('producto', 'venta')
-            .filter(venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=start_now, venta__fecha__lte=today)
-            .values('producto__id', 'producto__nombre')
+            VentaItem.objects
+            .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=start_now, venta_fecha__lte=today)
+            .values('producto_id')
             .annotate(revenue=Sum('precio_total'))
         )
-        now_map = {it['producto__id']: float(
+        now_map = {it['producto_id']: float(
             it.get('revenue') or 0) for it in items_now}
 
         # Ventana previa
         items_prev = (
-            VentaItem.objects.select_related('producto', 'venta')
-            .filter(venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=start_prev, venta__fecha__lt=start_now)
-            .values('producto__id', 'producto__nombre')
+            VentaItem.objects
+            .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=start_prev, venta_fecha__lt=start_now)
+            .values('producto_id')
             .annotate(revenue=Sum('precio_total'))
         )
-        prev_map = {it['producto__id']: float(
+        prev_map = {it['producto_id']: float(
             it.get('revenue') or 0) for it in items_prev}
 
         rows = []
-        product_names = {it['producto__id']
-            : it['producto__nombre'] for it in items_now}
-        product_names.update(
-            {it['producto__id']: it['producto__nombre'] for it in items_prev})
+        product_names = dict(Productos.objects.filter(
+            id__in=set(now_map) | set(prev_map)).values_list('id', 'nombre'))
 
         for pid, rev_now in now_map.items():
             rev_prev = prev_map.get(pid, 0.0)
@@ -433,77 +549,86 @@ class ProductsGrowthView(APIView):
         return Response(rows)
 
 
-class RevenueByCategoryView(APIView):
-    """Devuelve ingresos y costo por categoría en una ventana de días o por año."""
-
-    def get(self, request):
-        try:
-            from datetime import timedelta
+def _revenue_by_category_query(params):
+    """Ingresos y costo por categoría: lista vacía (años sin datos de la tienda
+    del plan) o queryset del agregado. Compartido con la versión async.
+    """
+    from datetime import timedelta
 
-            year_param = request.query_params.get('year')
-            anchor_now = timezone.now()
+    year_param = params.get('year')
+    anchor_now = timezone.now()
 
-            # Check if store_c and year specified
-            is_store_c = request.path.startswith('/api3/')
-            if is_store_c and year_param:
-                try:
-                    year = int(year_param)
-                    if year in [2024, 2023, 2022]:
-                        # For work plan years, return empty data with message handled in frontend
-                        return Response([])
-                    elif year == 2025:
-                        # 2025 must be empty
-                        return Response([])
-                    elif year != 2026:
-                        return Response([])
-                except Exception:
-                    pass
-
-            if year_param:
-                try:
-                    year = int(year_param)
-                    start = timezone.datetime(year=year, month=1, day=1)
-                    end = timezone.datetime(year=year + 1, month=1, day=1)
-                except Exception:
-                    start = anchor_now - timedelta(days=365)
-                    end = anchor_now
-            else:
-                try:
-                    days = int(request.query_params.get('days', 30))
-                except Exception:
-                    days = 30
-                end = anchor_now
-                start = end - timedelta(days=days)
-
-            qs = (
-                VentaItem.objects.select_related('venta', 'producto')
-                .filter(venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=start, venta__fecha__lt=end, venta__fecha__lte=timezone.now())
-            )
+    # Tienda con datos simulados del plan de trabajo y año especificado
+    if uses_simulated_plan() and year_param:
+        try:
+            year = int(year_param)
+            if year in [2024, 2023, 2022]:
+                # For work plan years, return empty data with message handled in frontend
+                return []
+            elif year == 2025:
+                # 2025 must be empty
+                return []
+            elif year != 2026:
+                return []
+        except Exception:
+            pass
 
-            cost_expr = ExpressionWrapper(
-                F('cantidad') * F('producto__costo'), output_field=DecimalField(max_digits=14, decimal_places=2)
-            )
+    if year_param:
+        try:
+            year = int(year_param)
+            start = timezone.datetime(year=year, month=1, day=1)
+            end = timezone.datetime(year=year + 1, month=1, day=1)
+        except Exception:
+            start = anchor_now - timedelta(days=365)
+            end = anchor_now
+    else:
+        try:
+            days = int(params.get('days', 30))
+        except Exception:
+            days = 30
+        end = anchor_now
+        start = end - timedelta(days=days)
+
+    qs = (
+        VentaItem.objects
+        .filter(venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=start, venta_fecha__lt=end, venta_fecha__lte=timezone.now())
+    )
+
+    # Costo capturado en el item al vender (no el costo actual del producto)
+    cost_expr = ExpressionWrapper(
+        F('cantidad') * F('costo_unitario'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+    return (
+        qs.values(cat=F('categoria'))
+        .annotate(revenue=Sum('precio_total'), cost=Sum(cost_expr))
+        .order_by('-revenue')
+    )
+
+
+def _revenue_by_category_rows(agg):
+    data = []
+    for row in agg:
+        revenue = float(row.get('revenue') or 0)
+        cost = float(row.get('cost') or 0)
+        margin_pct = ((revenue - cost) / revenue *
+                      100) if revenue > 0 else 0.0
+        data.append({
+            'category': row.get('cat') or 'Sin categoría',
+            'revenue': revenue,
+            'cost': cost,
+            'margin_pct': round(margin_pct, 1),
+        })
+    return data
 
-            agg = (
-                qs.values(cat=F('producto__categoria'))
-                .annotate(revenue=Sum('precio_total'), cost=Sum(cost_expr))
-                .order_by('-revenue')
-            )
 
-            data = []
-            for row in agg:
-                revenue = float(row.get('revenue') or 0)
-                cost = float(row.get('cost') or 0)
-                margin_pct = ((revenue - cost) / revenue *
-                              100) if revenue > 0 else 0.0
-                data.append({
-                    'category': row.get('cat') or 'Sin categoría',
-                    'revenue': revenue,
-                    'cost': cost,
-                    'margin_pct': round(margin_pct, 1),
-                })
+class RevenueByCategoryView(CoalescedMetricMixin, APIView):
+    """Devuelve ingresos y costo por categoría en una ventana de días o por año."""
 
-            return Response(data)
+    def get(self, request):
+        try:
+            return Response(_revenue_by_category_rows(
+                _revenue_by_category_query(request.query_params)))
         except Exception:
             return Response([])
 
@@ -547,34 +672,56 @@ class ImportCostsView(APIView):
         except Exception as exc:
             return Response({'detail': f'CSV inválido: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
 
-        updated = 0
-        errors = []
+        from decimal import Decimal, InvalidOperation
+        # Primero validar las filas; luego una consulta para todos los nombres
+        # y un único UPDATE (antes: exists() + save() por fila)
+        rows = []
         for idx, row in enumerate(reader, start=2):  # header is line 1
             name = (row.get('nombre') or row.get('producto') or '').strip()
             costo_raw = (row.get('costo') or row.get('precio') or '').strip()
             if not name:
-                errors.append(f'Fila {idx}: falta nombre')
+                rows.append((idx, None, f'Fila {idx}: falta nombre'))
                 continue
             if costo_raw == '':
                 # vacío: ignorar (permite dejar sin costo)
                 continue
             # normalizar separadores decimales
             costo_norm = costo_raw.replace(',', '.')
-            from decimal import Decimal, InvalidOperation
             try:
                 costo_val = Decimal(costo_norm)
             except InvalidOperation:
-                errors.append(f'Fila {idx}: costo inválido "{costo_raw}"')
+                rows.append((idx, None, f'Fila {idx}: costo inválido "{costo_raw}"'))
+                continue
+            rows.append((idx, name, costo_val))
+
+        by_name = {}
+        names = {name for _idx, name, _val in rows if name is not None}
+        for p in Productos.objects.filter(nombre__in=names):
+            by_name.setdefault(p.nombre, []).append(p)
+
+        updated = 0
+        errors = []
+        changed = {}
+        now = timezone.now()
+        for idx, name, value in rows:
+            if name is None:
+                errors.append(value)
                 continue
-            qs = Productos.objects.filter(nombre=name)
-            if not qs.exists():
+            matches = by_name.get(name)
+            if not matches:
                 errors.append(f'Fila {idx}: producto "{name}" no encontrado')
                 continue
             # actualizar todos los coincidientes por nombre (según requerimiento de plantilla por nombre)
-            for p in qs:
-                p.costo = costo_val
-                p.save(update_fields=['costo'])
+            for p in matches:
+                p.costo = value
+                # bulk_update no aplica auto_now: sin esto el cambio no sale en ?since=
+                p.actualizado_en = now
+                changed[p.pk] = p
                 updated += 1
+        if changed:
+            Productos.objects.bulk_update(list(changed.values()), ['costo', 'actualizado_en'])
+            # bulk_update no emite post_save: avisar a los workers
+            invalidation.publish(router.db_for_write(Productos), Productos)
 
         return Response({'updated': updated, 'errors': errors})
 
@@ -587,10 +734,9 @@ class QuantityByCategoryView(APIView):
 
     def get(self, request):
         # Considerar solo items de ventas completadas para consistencia
-        qs = VentaItem.objects.select_related('producto', 'venta').filter(
-            venta__estado=Ventas.ESTADO_COMPLETADA)
+        qs = VentaItem.objects.filter(venta_estado=Ventas.ESTADO_COMPLETADA)
         agg = (
-            qs.values(cat=F('producto__categoria'))
+            qs.values(cat=F('categoria'))
             .annotate(units=Sum('cantidad'))
             .order_by('-units')
         )
@@ -602,7 +748,74 @@ class QuantityByCategoryView(APIView):
         return Response(data)
 
 
-class TopProductsView(APIView):
+def _top_products_query(params):
+    """Top de productos: lista simulada (tienda del plan) o queryset del agregado.
+
+    Compartido por TopProductsView y su versión async.
+    """
+    limit = int(params.get('limit', 5))
+    sort = params.get('sort', 'units')
+    year_param = params.get('year')
+
+    if uses_simulated_plan():
+        if year_param and year_param not in ['2022', '2023', '2024', '2026']:
+            return []
+        elif year_param in ['2022', '2023', '2024']:
+            # Simulated data for work plan (diferenciado por año)
+            year = int(year_param)
+            factor = _plan_factor(year)
+            unit_bumps = {
+                2024: [1.2, 1.05, 0.95, 1.1, 0.9],
+                2023: [0.95, 1.15, 1.05, 0.9, 1.0],
+                2022: [0.9, 0.95, 1.1, 1.0, 1.05],
+            }
+            bumps = unit_bumps.get(year, [1, 1, 1, 1, 1])
+            base = [
+                ('Producto Simulado A', 1500.0, 75),
+                ('Producto Simulado B', 1200.0, 60),
+                ('Producto Simulado C', 1000.0, 50),
+                ('Producto Simulado D', 800.0, 40),
+                ('Producto Simulado E', 600.0, 30),
+            ]
+            simulated_data = []
+            for idx, (name, ventas, unidades) in enumerate(base):
+                units = int(round(unidades * factor * bumps[idx]))
+                revenue = ventas * factor * (1.0 + (idx * 0.03))
+                simulated_data.append({
+                    'producto': name,
+                    'ventas': round(revenue, 2),
+                    'unidades': units,
+                })
+            return simulated_data[:limit]
+        # For 2026, fall through to normal logic
+
+    qs = VentaItem.objects.filter(venta_estado=Ventas.ESTADO_COMPLETADA)
+    if year_param:
+        qs = qs.filter(venta_fecha__year=year_param)
+    qs = (
+        qs.values(producto_pk=F('producto_id'))
+        .annotate(ventas=Sum('precio_total'), unidades=Sum('cantidad'))
+    )
+    if sort == 'revenue':
+        return qs.order_by('-ventas')[:limit]
+    return qs.order_by('-unidades')[:limit]
+
+
+def _top_products_names(rows):
+    # Nombres solo para los N productos del top (evita JOIN en el agregado)
+    return Productos.objects.filter(
+        id__in=[r['producto_pk'] for r in rows]).values_list('id', 'nombre')
+
+
+def _top_products_rows(rows, names):
+    data = []
+    for item in rows:
+        data.append({'producto_id': item.get('producto_pk'), 'producto': names.get(item.get('producto_pk')), 'ventas': float(
+            item['ventas'] or 0), 'unidades': int(item['unidades'] or 0)})
+    return data
+
+
+class TopProductsView(CoalescedMetricMixin, APIView):
     """Devuelve los productos top por ingresos y unidades vendidas.
 
     Query params: ?limit=5&sort=units&year=2024
@@ -610,65 +823,15 @@ class TopProductsView(APIView):
     """
 
     def get(self, request):
-        limit = int(request.query_params.get('limit', 5))
-        sort = request.query_params.get('sort', 'units')
-        year_param = request.query_params.get('year')
+        qs = _top_products_query(request.query_params)
+        if isinstance(qs, list):
+            return Response(qs)
+        rows = list(qs)
+        names = dict(_top_products_names(rows))
+        return Response(_top_products_rows(rows, names))
 
-        if request.path.startswith('/api3/'):
-            if year_param and year_param not in ['2022', '2023', '2024', '2026']:
-                return Response([])
-            elif year_param in ['2022', '2023', '2024']:
-                # Simulated data for work plan (diferenciado por año)
-                year = int(year_param)
-                factor = _plan_factor(year)
-                unit_bumps = {
-                    2024: [1.2, 1.05, 0.95, 1.1, 0.9],
-                    2023: [0.95, 1.15, 1.05, 0.9, 1.0],
-                    2022: [0.9, 0.95, 1.1, 1.0, 1.05],
-                }
-                bumps = unit_bumps.get(year, [1, 1, 1, 1, 1])
-                base = [
-                    ('Producto Simulado A', 1500.0, 75),
-                    ('Producto Simulado B', 1200.0, 60),
-                    ('Producto Simulado C', 1000.0, 50),
-                    ('Producto Simulado D', 800.0, 40),
-                    ('Producto Simulado E', 600.0, 30),
-                ]
-                simulated_data = []
-                for idx, (name, ventas, unidades) in enumerate(base):
-                    units = int(round(unidades * factor * bumps[idx]))
-                    revenue = ventas * factor * (1.0 + (idx * 0.03))
-                    simulated_data.append({
-                        'producto': name,
-                        'ventas': round(revenue, 2),
-                        'unidades': units,
-                    })
-                return Response(simulated_data[:limit])
-            # For 2026, fall through to normal logic
 
-        qs = (
-            VentaItem.objects.select_related('producto', 'venta')
-            .filter(venta__estado=Ventas.ESTADO_COMPLETADA)
-        )
-        if year_param:
-            qs = qs.filter(venta__fecha__year=year_param)
-        qs = (
-            qs.values(producto_pk=F('producto__id'),
-                      name=F('producto__nombre'))
-            .annotate(ventas=Sum('precio_total'), unidades=Sum('cantidad'))
-        )
-        if sort == 'revenue':
-            qs = qs.order_by('-ventas')[:limit]
-        else:
-            qs = qs.order_by('-unidades')[:limit]
-        data = []
-        for item in qs:
-            data.append({'producto_id': item.get('producto_pk'), 'producto': item['name'], 'ventas': float(
-                item['ventas'] or 0), 'unidades': int(item['unidades'] or 0)})
-        return Response(data)
-
-
-class CustomersMonthlyView(APIView):
+class CustomersMonthlyView(CoalescedMetricMixin, APIView):
     """Devuelve clientes nuevos vs recurrentes por mes.
 
     Response: [{ month: 'Ene', nuevos: 12, recurrentes: 34 }, ...]
@@ -710,7 +873,7 @@ class CustomersMonthlyView(APIView):
         return Response(data)
 
 
-class TopCustomersMonthlyView(APIView):
+class TopCustomersMonthlyView(CoalescedMetricMixin, APIView):
     """Devuelve los top N clientes por gasto total y su gasto por mes.
 
     Response:
@@ -736,7 +899,7 @@ class TopCustomersMonthlyView(APIView):
         else:
             target_year = None
 
-        if request.path.startswith('/api3/'):
+        if uses_simulated_plan():
             if year_param and year_param not in ['2022', '2023', '2024', '2026']:
                 return Response({'months': [], 'months_iso': [], 'series': []})
             elif year_param in ['2022', '2023', '2024']:
@@ -850,7 +1013,7 @@ class TopCustomersMonthlyView(APIView):
         return Response({'months': months_labels, 'months_iso': months_iso, 'series': series})
 
 
-class TopCategoriesMonthlyView(APIView):
+class TopCategoriesMonthlyView(CoalescedMetricMixin, APIView):
     """Devuelve los top N categorias por unidades vendidas y su desglose mensual.
 
     Response:
@@ -865,7 +1028,7 @@ class TopCategoriesMonthlyView(APIView):
         year_param = request.query_params.get('year')
         today = timezone.now().date()
 
-        if request.path.startswith('/api3/'):
+        if uses_simulated_plan():
             if year_param and year_param not in ['2022', '2023', '2024', '2026']:
                 return Response({'months': [], 'series': []})
             elif year_param in ['2022', '2023', '2024']:
@@ -919,8 +1082,8 @@ class TopCategoriesMonthlyView(APIView):
                 year=target_year, month=1, day=1).date()
             year_end = timezone.datetime(
                 year=target_year + 1, month=1, day=1).date()
-            date_filter = Q(venta__fecha__gte=year_start,
-                            venta__fecha__lt=year_end)
+            date_filter = Q(venta_fecha__gte=year_start,
+                            venta_fecha__lt=year_end)
         else:
             # Rolling window backwards
             year = today.year
@@ -942,10 +1105,10 @@ class TopCategoriesMonthlyView(APIView):
             date_filter = Q()  # No filter
 
         qs = (
-            VentaItem.objects.select_related('venta', 'producto')
-            .filter(venta__estado=Ventas.ESTADO_COMPLETADA)
+            VentaItem.objects
+            .filter(venta_estado=Ventas.ESTADO_COMPLETADA)
             .filter(date_filter)
-            .values(cat=F('producto__categoria'))
+            .values(cat=F('categoria'))
             .annotate(total_units=Sum('cantidad'))
             .order_by('-total_units')
         )
@@ -953,18 +1116,18 @@ class TopCategoriesMonthlyView(APIView):
         top_cats = [item.get('cat') for item in top_list]
 
         monthly_qs = (
-            VentaItem.objects.select_related('venta', 'producto')
-            .filter(venta__estado=Ventas.ESTADO_COMPLETADA, producto__categoria__in=top_cats)
+            VentaItem.objects
+            .filter(venta_estado=Ventas.ESTADO_COMPLETADA, categoria__in=top_cats)
             .filter(date_filter)
-            .annotate(m=TruncMonth('venta__fecha'))
-            .values('producto__categoria', 'm')
+            .annotate(m=TruncMonth('venta_fecha'))
+            .values('categoria', 'm')
             .annotate(month_units=Sum('cantidad'))
-            .order_by('producto__categoria', 'm')
+            .order_by('categoria', 'm')
         )
 
         monthly_map = {}
         for it in monthly_qs:
-            cat = it.get('producto__categoria') or 'Sin categoría'
+            cat = it.get('categoria') or 'Sin categoría'
             mdate = it.get('m').date() if it.get('m') is not None else None
             if mdate is None:
                 continue
@@ -983,7 +1146,7 @@ class TopCategoriesMonthlyView(APIView):
         return Response({'months': months_labels, 'series': series})
 
 
-class ReturningCustomersRateView(APIView):
+class ReturningCustomersRateView(CoalescedMetricMixin, APIView):
     """Calcula el porcentaje de clientes que regresan después de su primera compra."""
 
     def get(self, request):
@@ -1017,7 +1180,7 @@ class ReturningCustomersRateView(APIView):
         })
 
 
-class SalesHeatmapView(APIView):
+class SalesHeatmapView(CoalescedMetricMixin, APIView):
     """Devuelve una matriz tipo calendario (semanas x 7) con la intensidad relativa de ventas por día del mes.
 
     Response: {
@@ -1052,7 +1215,7 @@ class SalesHeatmapView(APIView):
             revenue_raw = [[0.0 for _ in range(7)] for _ in range(6)]
             return Response({"heatmap": heatmap, "day_numbers": day_nums, "revenue_raw": revenue_raw, "month": month_param or ""})
 
-        if request.path.startswith('/api3/'):
+        if uses_simulated_plan():
             if year not in [2022, 2023, 2024, 2026]:
                 heatmap = [[0 for _ in range(7)] for _ in range(6)]
                 day_nums = [[0 for _ in range(7)] for _ in range(6)]
@@ -1117,10 +1280,10 @@ class SalesHeatmapView(APIView):
         # aggregate revenue per day using VentaItem (more reliable for revenue)
         from django.db.models.functions import TruncDate
 
-        items_qs = VentaItem.objects.select_related('venta').filter(
-            venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=start, venta__fecha__lt=next_month, venta__fecha__lte=timezone.now())
+        items_qs = VentaItem.objects.filter(
+            venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=start, venta_fecha__lt=next_month, venta_fecha__lte=timezone.now())
         items_by_date = (
-            items_qs.annotate(d=TruncDate('venta__fecha'))
+            items_qs.annotate(d=TruncDate('venta_fecha'))
             .values('d')
             .annotate(revenue=Sum('precio_total'), items_count=Count('id'), ventas_count=Count('venta', distinct=True))
         )
@@ -1327,6 +1490,7 @@ class ExportMixin:
 
 class ExportCSVView(View, ExportMixin):
     # Django View to avoid DRF content-negotiation rejecting CSV Accept header
+    @prometheus.track_export('csv')
     def get(self, request):
         # currently only supports tipo=productos
         params = getattr(request, 'GET', None) or getattr(
@@ -1444,6 +1608,7 @@ class ExportCSVView(View, ExportMixin):
 
 class ExportPDFView(View, ExportMixin):
     # Django View to avoid DRF content-negotiation rejecting PDF Accept header
+    @prometheus.track_export('pdf')
     def get(self, request):
         # Requerir autenticación
         user = getattr(request, 'user', None)
@@ -1642,11 +1807,13 @@ class ExportPDFView(View, ExportMixin):
                     total=Sum('precio_total')).get('total') or 0
                 sales_count = qs_sales.count()
 
-                qs_items = VentaItem.objects.filter(venta__in=qs_sales)
-                items_revenue = qs_items.aggregate(
-                    total=Sum('precio_total')).get('total') or 0
-                items_units = qs_items.aggregate(
-                    total=Sum('cantidad')).get('total') or 0
+                items_agg = VentaItem.objects.filter(
+                    venta_fecha__gte=start,
+                    venta_fecha__lt=end,
+                    venta_estado=Ventas.ESTADO_COMPLETADA,
+                ).aggregate(revenue=Sum('precio_total'), units=Sum('cantidad'))
+                items_revenue = items_agg.get('revenue') or 0
+                items_units = items_agg.get('units') or 0
 
                 label = MONTH_LABELS_ES[m - 1]
                 monthly.append({
@@ -1673,16 +1840,16 @@ class ExportPDFView(View, ExportMixin):
 
             # Ingresos y margen por categoría en últimos 30 días
             start_30 = _tz.now() - _td(days=30)
-            qs_cat_items = VentaItem.objects.select_related('venta', 'producto').filter(
-                venta__estado=Ventas.ESTADO_COMPLETADA,
-                venta__fecha__gte=start_30,
-                venta__fecha__lte=_tz.now(),
+            qs_cat_items = VentaItem.objects.filter(
+                venta_estado=Ventas.ESTADO_COMPLETADA,
+                venta_fecha__gte=start_30,
+                venta_fecha__lte=_tz.now(),
             )
             cost_expr = ExpressionWrapper(
-                F('cantidad') * F('producto__costo'), output_field=DecimalField(max_digits=14, decimal_places=2)
+                F('cantidad') * F('costo_unitario'), output_field=DecimalField(max_digits=14, decimal_places=2)
             )
             agg_cat = (
-                qs_cat_items.values(cat=F('producto__categoria'))
+                qs_cat_items.values(cat=F('categoria'))
                 .annotate(revenue=Sum('precio_total'), cost=Sum(cost_expr))
                 .order_by('-revenue')
             )
@@ -1706,12 +1873,14 @@ class ExportPDFView(View, ExportMixin):
                     ((c['revenue'] / max_rev) * 100) if max_rev > 0 else 0)
 
             # Top productos por unidades en últimos 30 días
-            qs_tp_items = VentaItem.objects.select_related('producto', 'venta').filter(
-                venta__estado=Ventas.ESTADO_COMPLETADA,
-                venta__fecha__gte=start_30,
-                venta__fecha__lte=_tz.now(),
-            ).values(name=F('producto__nombre')).annotate(units=Sum('cantidad')).order_by('-units')[:10]
-            top_products = [{'producto': r['name'], 'unidades': int(
+            qs_tp_items = list(VentaItem.objects.filter(
+                venta_estado=Ventas.ESTADO_COMPLETADA,
+                venta_fecha__gte=start_30,
+                venta_fecha__lte=_tz.now(),
+            ).values('producto_id').annotate(units=Sum('cantidad')).order_by('-units')[:10])
+            tp_names = dict(Productos.objects.filter(
+                id__in=[r['producto_id'] for r in qs_tp_items]).values_list('id', 'nombre'))
+            top_products = [{'producto': tp_names.get(r['producto_id']), 'unidades': int(
                 r['units'] or 0)} for r in qs_tp_items]
 
             # Heatmap del mes actual (intensidad por día)
@@ -1732,11 +1901,11 @@ class ExportPDFView(View, ExportMixin):
                     dn = pos - first_wd + 1
                     if 1 <= dn <= last_day:
                         day_nums[w][wd] = dn
-            items_qs = VentaItem.objects.select_related('venta').filter(
-                venta__estado=Ventas.ESTADO_COMPLETADA, venta__fecha__gte=start_month, venta__fecha__lt=next_month)
+            items_qs = VentaItem.objects.filter(
+                venta_estado=Ventas.ESTADO_COMPLETADA, venta_fecha__gte=start_month, venta_fecha__lt=next_month)
             from django.db.models.functions import TruncDate
             items_by_date = (
-                items_qs.annotate(d=TruncDate('venta__fecha'))
+                items_qs.annotate(d=TruncDate('venta_fecha'))
                 .values('d')
                 .annotate(revenue=Sum('precio_total'))
             )
@@ -1907,7 +2076,7 @@ class StructuredMonthlyView(APIView):
         return Response(data)
 
 
-class SalesMonthlyView(APIView):
+class SalesMonthlyView(CoalescedMetricMixin, APIView):
     """Devuelve ventas agregadas por mes.
 
     Query params:
@@ -1935,7 +2104,7 @@ class SalesMonthlyView(APIView):
         else:
             target_year = None
 
-        if request.path.startswith('/api3/'):
+        if uses_simulated_plan():
             if year_param and year_param not in ['2022', '2023', '2024', '2026']:
                 return Response([])
             elif year_param in ['2022', '2023', '2024']:
@@ -2024,12 +2193,13 @@ class SalesMonthlyView(APIView):
                 total=Sum('precio_total')).get('total') or 0
             sales_count = qs_sales.count()
 
-            qs_items = VentaItem.objects.filter(venta__in=qs_sales)
-            items_revenue = qs_items.aggregate(
-                total=Sum('precio_total')).get('total') or 0
-            items_count = qs_items.count()
-            items_units = qs_items.aggregate(
-                total=Sum('cantidad')).get('total') or 0
+            # Mismos filtros sobre las copias desnormalizadas de los items
+            items_agg = VentaItem.objects.filter(
+                **{f'venta_{k}': v for k, v in filters.items()}
+            ).aggregate(revenue=Sum('precio_total'), count=Count('id'), units=Sum('cantidad'))
+            items_revenue = items_agg.get('revenue') or 0
+            items_count = items_agg.get('count') or 0
+            items_units = items_agg.get('units') or 0
 
             label = MONTH_LABELS_ES[m - 1]
             month_iso = f"{y:04d}-{m:02d}"
@@ -2046,7 +2216,7 @@ class SalesMonthlyView(APIView):
         return Response(data)
 
 
-class SalesYearlyView(APIView):
+class SalesYearlyView(CoalescedMetricMixin, APIView):
     """Devuelve ventas agregadas por año.
 
     Query params:
@@ -2077,23 +2247,24 @@ class SalesYearlyView(APIView):
             start = timezone.datetime(year=y, month=1, day=1).date()
             end = timezone.datetime(year=y + 1, month=1, day=1).date()
 
-            qs_sales = Ventas.objects.filter(
-                fecha__gte=start,
-                fecha__lt=end,
-                fecha__lte=timezone.now(),
-                estado__in=[Ventas.ESTADO_COMPLETADA, Ventas.ESTADO_PENDIENTE],
-            )
+            filters = {
+                'fecha__gte': start,
+                'fecha__lt': end,
+                'fecha__lte': timezone.now(),
+                'estado__in': [Ventas.ESTADO_COMPLETADA, Ventas.ESTADO_PENDIENTE],
+            }
+            qs_sales = Ventas.objects.filter(**filters)
 
             sales_sum = qs_sales.aggregate(
                 total=Sum('precio_total')).get('total') or 0
             sales_count = qs_sales.count()
 
-            qs_items = VentaItem.objects.filter(venta__in=qs_sales)
-            items_revenue = qs_items.aggregate(
-                total=Sum('precio_total')).get('total') or 0
-            items_count = qs_items.count()
-            items_units = qs_items.aggregate(
-                total=Sum('cantidad')).get('total') or 0
+            items_agg = VentaItem.objects.filter(
+                **{f'venta_{k}': v for k, v in filters.items()}
+            ).aggregate(revenue=Sum('precio_total'), count=Count('id'), units=Sum('cantidad'))
+            items_revenue = items_agg.get('revenue') or 0
+            items_count = items_agg.get('count') or 0
+            items_units = items_agg.get('units') or 0
 
             data.append({
                 'year': str(y),
@@ -2164,6 +2335,116 @@ class StructuredByCategoryView(APIView):
         return Response(data)
 
 
+class CrossStoreMetricsView(APIView):
+    """Ejecuta una métrica en varias tiendas a la vez y consolida los resultados.
+
+    Query params:
+        - metric: sales-monthly | revenue-by-category | top-products (requerido)
+        - stores: slugs separados por comas (default: todas las configuradas)
+        - timeout: segundos máximos por tienda (default CROSS_STORE_TIMEOUT)
+        - el resto se pasa tal cual a la métrica (months, days, year, limit, sort...)
+    Respuesta: {
+        metric, stores, partial,
+        per_store: {slug: {status: ok|timeout|error, data?, elapsed_ms?, detail?}},
+        consolidated: [...]
+    }
+    """
+    METRICS = {
+        'sales-monthly': lambda: SalesMonthlyView,
+        'revenue-by-category': lambda: RevenueByCategoryView,
+        'top-products': lambda: TopProductsView,
+    }
+
+    def get(self, request):
+        metric = request.query_params.get('metric')
+        if metric not in self.METRICS:
+            return Response({'detail': f"metric debe ser uno de: {', '.join(self.METRICS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            timeout = float(request.query_params.get(
+                'timeout', getattr(settings, 'CROSS_STORE_TIMEOUT', 5)))
+        except ValueError:
+            timeout = getattr(settings, 'CROSS_STORE_TIMEOUT', 5)
+        timeout = min(max(timeout, 0.1), 60)
+
+        slugs = request.query_params.get('stores')
+        try:
+            targets = ([get_store(s.strip()) for s in slugs.split(',') if s.strip()]
+                       if slugs else configured_stores())
+        except UnknownStore as exc:
+            return Response({'detail': f'Tienda desconocida: {exc}'}, status=status.HTTP_404_NOT_FOUND)
+
+        view = self.METRICS[metric]().as_view()
+        django_request = request._request
+        user = request.user
+
+        def run():
+            # Copia de la petición por tienda: la vista de la métrica la envuelve de nuevo
+            sub = copy.copy(django_request)
+            sub._force_auth_user = user
+            response = view(sub)
+            if response.status_code >= 400:
+                raise RuntimeError(f'HTTP {response.status_code}')
+            return response.data
+
+        # fan_out marca cada tienda en uso hasta que su tarea termina
+        per_store = cross_store.fan_out(targets, run, timeout)
+
+        series = [r['data'] for r in per_store.values() if r['status'] == 'ok']
+        if metric == 'sales-monthly':
+            consolidated = cross_store.merge_monthly(series)
+        elif metric == 'revenue-by-category':
+            consolidated = cross_store.merge_by_category(series)
+        else:
+            try:
+                limit = int(request.query_params.get('limit', 5))
+            except ValueError:
+                limit = 5
+            consolidated = cross_store.merge_top_products(
+                series, sort=request.query_params.get('sort', 'units'), limit=limit)
+
+        return Response({
+            'metric': metric,
+            'stores': list(per_store),
+            'partial': any(r['status'] != 'ok' for r in per_store.values()),
+            'per_store': per_store,
+            'consolidated': consolidated,
+        })
+
+
+class DBPoolStatsView(APIView):
+    """Métricas de los pools de conexiones por alias (solo staff).
+
+    Incluye el tiempo acumulado y promedio de espera por una conexión libre
+    (`requests_wait_ms`, `avg_wait_ms`) y el uso actual del pool.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
+class RequestProfilesView(APIView):
+    """Reportes de `?_profile=cpu|sql|mem` (ver Dashboard/profiling.py). Solo staff.
+
+    GET /api/debug/profiles/ -> últimos reportes (resumen)
+    GET /api/debug/profiles/<id>/ -> reporte completo
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, request_id=None):
+        if request_id is None:
+            try:
+                limit = min(max(int(request.query_params.get('limit', 50)), 1), 500)
+            except ValueError:
+                limit = 50
+            return Response(profiling.recent(limit))
+        report = profiling.load(request_id)
+        if report is None:
+            return Response({'detail': 'Perfil no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(report)
+
+
 class ProfileView(APIView):
     """Obtiene/actualiza el perfil del usuario autenticado."""
     permission_classes = [permissions.IsAuthenticated]
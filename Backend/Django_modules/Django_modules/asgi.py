@@ -3,6 +3,14 @@ ASGI config for Django_modules project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Las vistas de /api/async/ (IA, métricas, bundle) solo liberan el worker
+mientras esperan si se sirven por ASGI, p. ej.:
+
+    uvicorn Django_modules.asgi:application --workers 2
+
+El stream SSE /api/live/ requiere ASGI (cada worker abre una sola conexión
+LISTEN por tienda para todos sus suscriptores).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,3 +22,17 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Django_modules.settings')
 
 application = get_asgi_application()
+
+# Calentar los pools de conexiones al iniciar el worker (DB_POOL_WARMUP=1).
+# Con gunicorn no usar --preload: los pools abren hilos que no sobreviven al fork.
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'DB_POOL_WARMUP', False):
+    from Dashboard.db_pool import warm_up
+    warm_up()
+
+# Escuchar el bus de invalidación de cachés (un hilo LISTEN por BD de tienda).
+# Con --preload el hilo del maestro no pasa al fork: el middleware lo rearranca.
+from Dashboard import invalidation  # noqa: E402
+
+invalidation.enable()
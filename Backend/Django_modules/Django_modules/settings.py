@@ -10,9 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Consultas y tiempos por petición (Server-Timing, X-Query-Count); ver REQUEST_TIMING
+    'Dashboard.instrumentation.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -57,6 +61,8 @@ MIDDLEWARE = [
     'Dashboard.db_router.RequestDBRouterMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # ?_profile=cpu|sql|mem para staff; ver PROFILING_ENABLED
+    'Dashboard.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -127,6 +133,164 @@ DATABASES['store_c'] = {
     'PORT': os.environ.get('DB_STORE_C_PORT', DATABASES['default']['PORT']),
 }
 
+# Pool de conexiones por alias (psycopg 3 + psycopg_pool). Evita abrir una conexión
+# nueva (TCP + autenticación) en cada petición. Tamaños configurables por tienda:
+# DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE son los valores por defecto y
+# DB_<ALIAS>_POOL_MIN_SIZE / DB_<ALIAS>_POOL_MAX_SIZE (ej. DB_STORE_B_POOL_MAX_SIZE)
+# los sobrescriben. Con DB_POOL_ENABLED=0 se usan conexiones persistentes.
+DB_POOL_ENABLED = os.environ.get('DB_POOL_ENABLED', '1') == '1'
+# Abrir los pools y esperar las conexiones mínimas al iniciar cada worker
+DB_POOL_WARMUP = os.environ.get('DB_POOL_WARMUP', '0') == '1'
+
+
+def _pool_options(alias):
+    prefix = f'DB_{alias.upper()}_POOL_'
+    return {
+        'name': alias,
+        'min_size': int(os.environ.get(prefix + 'MIN_SIZE', os.environ.get('DB_POOL_MIN_SIZE', 2))),
+        'max_size': int(os.environ.get(prefix + 'MAX_SIZE', os.environ.get('DB_POOL_MAX_SIZE', 10))),
+        # Segundos que una petición espera por una conexión libre antes de fallar
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        # Cerrar conexiones ociosas por encima de min_size pasados estos segundos
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+    }
+
+
+# Réplicas de lectura (opcionales) por tienda: DB_<ALIAS>_REPLICA_HOST (y si difieren
+# DB_<ALIAS>_REPLICA_NAME/_PORT/_USER/_PASSWORD) crea el alias '<alias>_replica'.
+# En tests la réplica es un espejo del primario.
+for _alias in list(DATABASES):
+    _prefix = f'DB_{_alias.upper()}_REPLICA_'
+    if not os.environ.get(_prefix + 'HOST'):
+        continue
+    _replica = dict(DATABASES[_alias], TEST={'MIRROR': _alias})
+    for _key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD'):
+        if os.environ.get(_prefix + _key):
+            _replica[_key] = os.environ[_prefix + _key]
+    DATABASES[f'{_alias}_replica'] = _replica
+
+for _alias, _db in DATABASES.items():
+    # Verifica la conexión antes de reutilizarla (con pool: al entregarla)
+    _db['CONN_HEALTH_CHECKS'] = True
+    if DB_POOL_ENABLED:
+        _db.setdefault('OPTIONS', {})['pool'] = _pool_options(_alias)
+    else:
+        _db['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+# Registro de tiendas (slug -> BD). Cada tienda se atiende en /api/s/<slug>/ o con la
+# cabecera X-Store: <slug>; /api2/ y /api3/ se mantienen por compatibilidad.
+# Tiendas adicionales sin deploy: variable STORE_REGISTRY_JSON
+# ('{"norte": {"database": {"NAME": "tienda_norte"}}}') o tabla Store (slug + db_settings).
+STORE_REGISTRY = {
+    'default': {'alias': 'default'},
+    'store_b': {'alias': 'store_b', 'legacy_prefix': 'api2'},
+    'store_c': {'alias': 'store_c', 'legacy_prefix': 'api3', 'plan_simulado': True},
+}
+STORE_REGISTRY.update(json.loads(os.environ.get('STORE_REGISTRY_JSON') or '{}'))
+for _spec in STORE_REGISTRY.values():
+    if f"{_spec.get('alias')}_replica" in DATABASES:
+        _spec.setdefault('replica', f"{_spec['alias']}_replica")
+
+# Lecturas en réplica (ver Dashboard/replicas.py): rutas GET que pueden usarla,
+# ventana read-your-writes tras una escritura de la sesión, retraso máximo
+# aceptado y cada cuánto se comprueba el estado de la réplica (segundos).
+REPLICA_READ_PATHS = ('/api/metrics/', '/api/async/metrics/', '/api/export/')
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+# Cookie firmada con los primarios en los que escribió el cliente (ver replicas.py)
+REPLICA_STICKY_COOKIE = 'replica_sticky'
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_HEALTH_TTL = float(os.environ.get('REPLICA_HEALTH_TTL', 5))
+# Máximo de BDs de tiendas dinámicas con conexiones abiertas a la vez (LRU)
+STORE_MAX_OPEN_ALIASES = int(os.environ.get('STORE_MAX_OPEN_ALIASES', 32))
+
+# Endpoint metrics/cross-store/: hilos del pool y timeout por tienda (segundos)
+CROSS_STORE_MAX_WORKERS = int(os.environ.get('CROSS_STORE_MAX_WORKERS', 8))
+CROSS_STORE_TIMEOUT = float(os.environ.get('CROSS_STORE_TIMEOUT', 5))
+
+# Listados con ?updated_since= (Dashboard/sync.py): margen del sync_token
+# (segundos) y días que se conservan las lápidas de filas borradas
+SYNC_TOKEN_MARGIN_SECONDS = int(os.environ.get('SYNC_TOKEN_MARGIN_SECONDS', 5))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+# Eventos en vivo /api/live/ (Dashboard/live.py): NOTIFY en las escrituras de
+# ventas, espera antes de recalcular las métricas del día tras una ráfaga de
+# eventos y latido del stream SSE (segundos)
+LIVE_EVENTS = os.environ.get('LIVE_EVENTS', '1') == '1'
+LIVE_METRICS_DEBOUNCE = float(os.environ.get('LIVE_METRICS_DEBOUNCE', 1.0))
+LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', 15))
+
+# Bus de invalidación de cachés en memoria entre workers/nodos
+# (Dashboard/invalidation.py, LISTEN/NOTIFY en cada BD de tienda)
+INVALIDATION_BUS = os.environ.get('INVALIDATION_BUS', '1') == '1'
+
+# Métricas agregadas (Dashboard/coalesce.py): edad (s) a partir de la cual se
+# sirve el resultado y se recalcula en segundo plano, edad máxima servible y
+# entradas por proceso
+AGGREGATE_SOFT_TTL = float(os.environ.get('AGGREGATE_SOFT_TTL', 30))
+AGGREGATE_HARD_TTL = float(os.environ.get('AGGREGATE_HARD_TTL', 300))
+AGGREGATE_CACHE_ENTRIES = int(os.environ.get('AGGREGATE_CACHE_ENTRIES', 500))
+
+# `manage.py bench` (Dashboard/bench.py): BD de trabajo que el comando crea, migra
+# y siembra. Hereda la conexión de default; por defecto <NAME de default>_bench.
+BENCH_DATABASE = {'NAME': os.environ['BENCH_DB_NAME']} if os.environ.get('BENCH_DB_NAME') else {}
+
+# Instrumentación por petición (Dashboard/instrumentation.py): cabeceras
+# Server-Timing/X-Query-Count y una línea JSON por petición en el logger
+# Dashboard.timing. El archivo REQUEST_TIMING_FLAG ('on'/'off', ver
+# `manage.py instrumentacion`) manda sobre REQUEST_TIMING sin reiniciar.
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING', '0') == '1'
+REQUEST_TIMING_FLAG = os.environ.get('REQUEST_TIMING_FLAG', str(BASE_DIR / '.request_timing'))
+REQUEST_TIMING_FLAG_TTL = float(os.environ.get('REQUEST_TIMING_FLAG_TTL', 2))
+
+# Perfilado a demanda (Dashboard/profiling.py): ?_profile=cpu|sql|mem para staff.
+# Los reportes se guardan en PROFILE_DIR (últimos PROFILE_KEEP); PROFILE_TOP
+# funciones/líneas por reporte y EXPLAIN ANALYZE de las PROFILE_EXPLAIN_TOP
+# consultas más lentas.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / '.profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', 40))
+PROFILE_EXPLAIN_TOP = int(os.environ.get('PROFILE_EXPLAIN_TOP', 5))
+
+# Log de consultas lentas (Dashboard/slow_queries.py, admin "Consultas lentas"):
+# las de SLOW_QUERY_MS o más se agrupan por huella en la BD default y se guarda
+# su EXPLAIN (ANALYZE, BUFFERS), como mucho uno por huella cada
+# SLOW_QUERY_EXPLAIN_INTERVAL segundos (últimos SLOW_QUERY_PLANS por huella).
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 500))
+SLOW_QUERY_ASYNC = os.environ.get('SLOW_QUERY_ASYNC', '1') == '1'
+SLOW_QUERY_QUEUE = int(os.environ.get('SLOW_QUERY_QUEUE', 1000))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 10_000))
+SLOW_QUERY_PLANS = int(os.environ.get('SLOW_QUERY_PLANS', 20))
+
+# /metrics en formato Prometheus (Dashboard/prometheus.py). Con METRICS_TOKEN se
+# exige `Authorization: Bearer <token>` (el scraper); sin él solo lo ven usuarios
+# staff. Con varios workers definir además PROMETHEUS_MULTIPROC_DIR (directorio
+# vacío al arrancar).
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Gemini (Dashboard/services/gemini_client.py; clave en GEMINI_API_KEY). Con
+# GEMINI_BASE_URL el SDK apunta a otro servidor con la misma API, p. ej. el
+# simulado de `manage.py gemini_simulado` (latencia, 429 y JSON roto a voluntad).
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'Dashboard.timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Router y middleware para enrutar peticiones por prefijo de URL a DBs separadas
 DATABASE_ROUTERS = [
     'Dashboard.db_router.PathRouter',
@@ -188,6 +352,10 @@ REST_FRAMEWORK = {
 
 # CORS - durante desarrollo permitir el frontend local
 CORS_ALLOW_ALL_ORIGINS = True
+# Cabecera para seleccionar la tienda (ver STORE_REGISTRY)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-store')
+# Cabeceras de diagnóstico legibles desde el frontend
+CORS_EXPOSE_HEADERS = ('Server-Timing', 'X-Query-Count', 'X-Cache', 'X-Request-ID', 'X-Profile-Id')
 # Alternativamente especifica orígenes:
 # CORS_ALLOWED_ORIGINS = [
 #     'http://localhost:5173',
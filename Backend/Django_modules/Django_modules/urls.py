@@ -21,18 +21,20 @@ from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
+from Dashboard.prometheus import metrics_view
 from Dashboard.views import CustomTokenObtainPairView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Un único árbol de rutas: la tienda (/api/s/<slug>/, /api2/, /api3/ o cabecera
+    # X-Store) la resuelve RequestDBRouterMiddleware, que reescribe la ruta a /api/
     path('api/', include('Dashboard.urls')),
-    # Montar las mismas rutas bajo /api2/ y /api3/ — el router decidirá la DB según prefijo
-    path('api2/', include('Dashboard.urls')),
-    path('api3/', include('Dashboard.urls')),
     # JWT token endpoints
     path('api/token/', CustomTokenObtainPairView.as_view(),
          name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # Métricas Prometheus (ver Dashboard/prometheus.py)
+    path('metrics', metrics_view, name='prometheus-metrics'),
 ]
 
 # Serve media files in development
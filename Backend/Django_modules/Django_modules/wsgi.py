@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Django_modules.settings')
 
 application = get_wsgi_application()
+
+# Calentar los pools de conexiones al iniciar el worker (DB_POOL_WARMUP=1).
+# Con gunicorn no usar --preload: los pools abren hilos que no sobreviven al fork.
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'DB_POOL_WARMUP', False):
+    from Dashboard.db_pool import warm_up
+    warm_up()
+
+# Escuchar el bus de invalidación de cachés (un hilo LISTEN por BD de tienda).
+# Con --preload el hilo del maestro no pasa al fork: el middleware lo rearranca.
+from Dashboard import invalidation  # noqa: E402
+
+invalidation.enable()